@@ -5,27 +5,504 @@ Minimal approach to calling:
 1) Claude 3.7 Sonnet (Anthropic-based)
 2) DeepSeek R1 (OpenAI-based approach)
 
-No streaming, no chunker, just a single .run(...) method that returns final text.
+Each client exposes an async .arun(...) coroutine that returns final text, plus
+a blocking .run(...) wrapper around it, and .astream(...) / .stream(...) for
+("thinking" | "text", delta) events. AIOrchestrator wraps a client (optionally
+hedged to a second one) behind call_llm / acall_llm. Failures raise LLMError
+(see llm_errors.py) instead of returning error strings.
+
+All async SDK clients created on the same event loop share a single bounded
+httpx connection pool. Blocking calls run on one long-lived background event
+loop (run_sync), so sync callers reuse that pool too.
 """
 
+import abc
+import asyncio
+import importlib
+import json
 import os
-import anthropic
-import openai
+import queue
+import sys
+import threading
+import time
+import weakref
+from typing import TYPE_CHECKING, List
+
+from cassette import get_cassette
+from hedging import HedgePolicy, HedgeStats, hedged_call, hedged_stream
+from metrics import get_metrics
+from thinking_controller import ThinkingBudgetController
+from tracing import span
+from llm_errors import LLMError, OverloadedError, RateLimitError, RetryableLLMError, classify_exception
+from rate_limiter import RetryPolicy, backoff_or_raise, call_with_retries, estimate_tokens, get_rate_limiter
+from response_cache import endpoint_cache_key, get_default_cache, make_cache_key
+
+if TYPE_CHECKING:
+    import httpx
+
+# Upper bound on concurrent HTTP connections per event loop, shared by all clients
+MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", "32"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("LLM_MAX_KEEPALIVE_CONNECTIONS", "16"))
+
+# Anthropic allows at most 4 cache_control breakpoints per request
+MAX_CACHE_BREAKPOINTS = 4
+
+# Provider endpoints; responses from any other base URL are cached separately
+ANTHROPIC_DEFAULT_BASE_URL = "https://api.anthropic.com"
+DEEPSEEK_DEFAULT_BASE_URL = "https://api.deepseek.com"
+
+# Anthropic accepts at most 100,000 requests per Message Batch
+MAX_BATCH_REQUESTS = 100000
+# Seconds between Message Batch status polls
+BATCH_POLL_SECONDS = float(os.environ.get("ANTHROPIC_BATCH_POLL_SECONDS", "30"))
+
+_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+_sync_loop = None
+_sync_loop_lock = threading.Lock()
+
+
+def get_http_client() -> "httpx.AsyncClient":
+    """
+    Returns the shared, bounded httpx connection pool for the running event loop.
+    httpx connections are bound to the loop that opened them, so we keep one pool per loop.
+    """
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    client = _http_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            ),
+            follow_redirects=True,
+        )
+        _http_clients[loop] = client
+    return client
 
-class Claude37SonnetClient:
+
+def _get_sync_loop() -> asyncio.AbstractEventLoop:
+    """
+    Lazily starts the background event loop used by the blocking .run(...) wrappers.
+    """
+    global _sync_loop
+    with _sync_loop_lock:
+        if _sync_loop is None:
+            _sync_loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=_sync_loop.run_forever, name="ai-clients-loop", daemon=True)
+            thread.start()
+    return _sync_loop
+
+
+def run_sync(coro):
+    """
+    Runs a coroutine on the background event loop and blocks until it finishes.
+    Safe to call from plain scripts as well as from threads that already run their own loop.
     """
-    Minimal client for Claude 3.7 Sonnet. 
+    return asyncio.run_coroutine_threadsafe(coro, _get_sync_loop()).result()
+
+
+def iter_sync(agen):
+    """
+    Drives an async generator on the background event loop and yields its items
+    to a blocking caller as soon as each one is produced.
+    """
+    items = queue.Queue()
+    done = object()
+
+    async def pump():
+        try:
+            async for item in agen:
+                items.put(item)
+        except BaseException as e:
+            items.put(e)
+        finally:
+            items.put(done)
+
+    asyncio.run_coroutine_threadsafe(pump(), _get_sync_loop())
+    while True:
+        item = items.get()
+        if item is done:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+
+def format_response(thinking_text: str, answer_text: str, label: str = "Thinking") -> str:
+    """
+    Combines a reasoning trace and the final answer the way .run(...) has always returned them.
+    """
+    if thinking_text:
+        return f"{label}:\n{thinking_text}\n\nAnswer:\n{answer_text}"
+    return answer_text
+
+
+def build_user_content(user_prompt: str, prompt_prefix=None):
+    """
+    Returns the user message content: the plain prompt, or, with prompt_prefix, a list of
+    text blocks (prefix segments, then the prompt) whose last prefix segments carry
+    cache_control breakpoints.
+    """
+    if not prompt_prefix:
+        return user_prompt
+    first_breakpoint = len(prompt_prefix) - MAX_CACHE_BREAKPOINTS
+    blocks = []
+    for index, segment in enumerate(prompt_prefix):
+        block = {"type": "text", "text": segment}
+        if index >= first_breakpoint:
+            block["cache_control"] = {"type": "ephemeral"}
+        blocks.append(block)
+    blocks.append({"type": "text", "text": user_prompt})
+    return blocks
+
+
+def build_messages(system_prompt: str, user_prompt: str, prompt_prefix=None) -> list:
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": build_user_content(user_prompt, prompt_prefix)}
+    ]
+
+
+def flatten_content(messages):
+    """
+    Returns messages with list-of-blocks content joined into plain strings,
+    for providers that only accept string content.
+    """
+    flat = []
+    for msg in messages:
+        content = msg["content"]
+        if isinstance(content, list):
+            content = "".join(block.get("text", "") for block in content)
+            msg = {**msg, "content": content}
+        flat.append(msg)
+    return flat
+
+
+_prewarmed = set()
+_prewarm_lock = threading.Lock()
+# The SDKs share pydantic; importing two of them on different threads at once can
+# hit a partially initialized module, so SDK imports are serialized
+_sdk_import_lock = threading.RLock()
+
+
+def _import_sdk(name: str):
+    """
+    Imports a provider SDK on first use, so a process only pays for the SDK of the
+    model it actually calls (and --help / usage stays instant).
+    """
+    with _sdk_import_lock:
+        return importlib.import_module(name)
+
+USAGE_FIELDS = ("requests", "input_tokens", "output_tokens", "cache_read_tokens", "cache_write_tokens")
+
+
+class _AsyncSDKMixin(abc.ABC):
+    """
+    Keeps one async SDK client per event loop, each bound to the shared connection pool,
+    and fronts requests with the persistent response cache (see response_cache.py) or,
+    when one is active, a record/replay cassette (see cassette.py).
+
+    Every request goes through the provider's process-wide rate limiter and is retried
+    with backoff on transient errors (see rate_limiter.py). Each attempt is traced as
+    "rate_limit" and "http" spans (see tracing.py), and each request is reported to the
+    metrics registry (see metrics.py) and added to the client's usage totals.
+
+    Subclasses implement _make_async_client.
+    """
+
+    provider = ""
+    sdk_module = ""
+
+    def prewarm(self):
+        """
+        Starts importing this client's SDK on a background thread, so the import overlaps
+        with whatever the caller does before its first request (reading input, loading files).
+        """
+        with _prewarm_lock:
+            if self.sdk_module in _prewarmed or self.sdk_module in sys.modules:
+                return
+            _prewarmed.add(self.sdk_module)
+        threading.Thread(target=_import_sdk, args=(self.sdk_module,),
+                         name=f"prewarm-{self.sdk_module}", daemon=True).start()
+
+    def _record_usage(self, input_tokens=0, output_tokens=0, cache_read_tokens=0, cache_write_tokens=0):
+        """
+        Adds one request's usage to the running totals. input_tokens excludes cache reads/writes.
+        """
+        if not hasattr(self, "_usage_lock"):
+            self._usage_lock = threading.Lock()
+        with self._usage_lock:
+            if not hasattr(self, "usage_totals"):
+                self.usage_totals = dict.fromkeys(USAGE_FIELDS, 0)
+            self.usage_totals["requests"] += 1
+            self.usage_totals["input_tokens"] += input_tokens or 0
+            self.usage_totals["output_tokens"] += output_tokens or 0
+            self.usage_totals["cache_read_tokens"] += cache_read_tokens or 0
+            self.usage_totals["cache_write_tokens"] += cache_write_tokens or 0
+
+    def usage_snapshot(self) -> dict:
+        return dict(getattr(self, "usage_totals", dict.fromkeys(USAGE_FIELDS, 0)))
+
+    def describe_usage(self, since: dict = None) -> str:
+        """
+        Human-readable provider usage, either the running totals or the change since a usage_snapshot().
+        """
+        usage = self.usage_snapshot()
+        if since is not None:
+            usage = {field: usage[field] - since.get(field, 0) for field in USAGE_FIELDS}
+        if not usage["requests"]:
+            return "no provider requests (served from the response cache)"
+        prompt_total = usage["input_tokens"] + usage["cache_read_tokens"] + usage["cache_write_tokens"]
+        hit_rate = usage["cache_read_tokens"] / prompt_total * 100 if prompt_total else 0.0
+        return (f"{usage['requests']} request(s), {prompt_total} prompt tokens "
+                f"({usage['cache_read_tokens']} cache read, {usage['cache_write_tokens']} cache write, "
+                f"{hit_rate:.0f}% from cache), {usage['output_tokens']} output tokens")
+
+    def endpoint(self):
+        """
+        The base URL requests go to, or None for the provider's default endpoint.
+        """
+        return None
+
+    def _cache_key(self, key: str) -> str:
+        return endpoint_cache_key(key, self.endpoint())
+
+    async def _cached(self, key: str, refresh: bool, call):
+        """
+        Returns the cached response for key, or awaits call() and caches its result.
+        refresh=True skips the lookup but still stores the fresh response.
+        Failed calls raise, so errors are never cached. key is the request key from
+        make_cache_key (cassettes match on it); the cache also scopes it by endpoint.
+        """
+        cassette = get_cassette()
+        if cassette is not None and cassette.replaying:
+            return await cassette.replay(key, self.provider)
+        cache = get_default_cache()
+        cache_key = self._cache_key(key)
+        # A recording must hold real calls, so it skips the lookup
+        if cache is not None and not refresh and cassette is None:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                get_metrics().observe_cache_hit(self.provider, self.model_name)
+                return cached
+        started = time.perf_counter()
+        result = await call()
+        if cassette is not None:
+            cassette.record(key, self.provider, self.model_name, result, time.perf_counter() - started)
+        if cache is not None and result:
+            cache.put(cache_key, result)
+        return result
+
+    def _observe(self, stats: dict, started: float, stream: bool = False, error: Exception = None,
+                 provider: str = None):
+        get_metrics().observe_llm_call(
+            provider or self.provider, self.model_name, time.perf_counter() - started, stream=stream,
+            ttft=stats.get("ttft"),
+            input_tokens=stats.get("input_tokens", 0),
+            output_tokens=stats.get("output_tokens", 0),
+            thinking_tokens=stats.get("thinking_tokens", 0),
+            cache_read_tokens=stats.get("cache_read_tokens", 0),
+            cache_write_tokens=stats.get("cache_write_tokens", 0),
+            stop_reason=stats.get("stop_reason"),
+            retries=stats.get("retries", 0),
+            error=type(error).__name__ if error is not None else None,
+        )
+
+    async def _limited(self, messages, max_tokens: int, call):
+        """
+        Runs one non-stream request under the provider's rate limiter, with retries.
+        call(stats) returns the text and fills stats (see _track_usage), including
+        stats["total"]; tokens reserved but not used are refunded, all of them when
+        an attempt fails.
+        """
+        limiter = get_rate_limiter(self.provider)
+        reserved = estimate_tokens(json.dumps(messages, ensure_ascii=False)) + max_tokens
+        stats = {}
+        started = time.perf_counter()
+
+        async def attempt():
+            with span("rate_limit", cat="rate_limit"):
+                await limiter.acquire(reserved)
+            try:
+                with span("http", cat="http"):
+                    text = await call(stats)
+            except Exception:
+                limiter.refund_tokens(reserved - stats.get("total", 0))
+                raise
+            if "total" in stats:
+                limiter.refund_tokens(reserved - stats["total"])
+            return text
+
+        def on_retry(attempt_number, error, delay):
+            stats["retries"] = attempt_number
+
+        try:
+            text = await call_with_retries(attempt, self.provider, on_retry=on_retry)
+        except LLMError as e:
+            self._observe(stats, started, error=e)
+            raise
+        self._observe(stats, started)
+        return text
+
+    async def _limited_stream(self, messages, max_tokens: int, open_stream):
+        """
+        Streaming counterpart of _limited. open_stream(stats) returns an async generator of
+        events and may fill stats like call(stats) above. A failed stream is only retried if
+        it had not yielded anything yet; failures mid-stream are raised to the caller.
+        """
+        limiter = get_rate_limiter(self.provider)
+        reserved = estimate_tokens(json.dumps(messages, ensure_ascii=False)) + max_tokens
+        policy = RetryPolicy()
+        attempt = 0
+        started_at = time.perf_counter()
+        stats = {}
+        thinking_chars = 0
+        error = None
+        cancelled = False
+        try:
+            while True:
+                with span("rate_limit", cat="rate_limit"):
+                    await limiter.acquire(reserved)
+                stats = {"retries": attempt}
+                attempt_started = time.perf_counter()
+                started = False
+                try:
+                    # Includes the time the consumer spends between deltas
+                    with span("http.stream", cat="http"):
+                        async for event in open_stream(stats):
+                            if not started:
+                                stats["ttft"] = time.perf_counter() - attempt_started
+                                started = True
+                            if event[0] == "thinking":
+                                thinking_chars += len(event[1])
+                            yield event
+                except Exception as exc:
+                    limiter.refund_tokens(reserved - stats.get("total", 0))
+                    if started:
+                        error = classify_exception(self.provider, exc)
+                        if error is exc:
+                            raise
+                        raise error from exc
+                    try:
+                        await backoff_or_raise(self.provider, exc, attempt, policy)
+                    except LLMError as e:
+                        error = e
+                        raise
+                    attempt += 1
+                    continue
+                if "total" in stats:
+                    limiter.refund_tokens(reserved - stats["total"])
+                return
+        except asyncio.CancelledError:
+            # e.g. the losing side of a hedged request: not a latency sample
+            cancelled = True
+            raise
+        finally:
+            if thinking_chars and not stats.get("thinking_tokens"):
+                stats["thinking_tokens"] = thinking_chars // 4 + 1
+            if not cancelled:
+                self._observe(stats, started_at, stream=True, error=error)
+
+    async def _cached_stream(self, key: str, refresh: bool, stream, label: str):
+        """
+        Streaming counterpart of _cached. A cache hit is replayed as a single "text" event;
+        otherwise deltas are passed through and the assembled response is cached at the end.
+        """
+        cassette = get_cassette()
+        if cassette is not None and cassette.replaying:
+            async for event in cassette.replay_stream(key, self.provider):
+                yield event
+            return
+        cache = get_default_cache()
+        cache_key = self._cache_key(key)
+        if cache is not None and not refresh and cassette is None:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                get_metrics().observe_cache_hit(self.provider, self.model_name)
+                yield ("text", cached)
+                return
+        thinking_parts = []
+        answer_parts = []
+        events = []
+        started = time.perf_counter()
+        async for kind, delta in stream:
+            (thinking_parts if kind == "thinking" else answer_parts).append(delta)
+            if cassette is not None:
+                events.append((time.perf_counter() - started, kind, delta))
+            yield (kind, delta)
+        result = format_response("".join(thinking_parts), "".join(answer_parts), label)
+        if cassette is not None:
+            cassette.record_stream(key, self.provider, self.model_name, events, result,
+                                   time.perf_counter() - started)
+        if cache is not None and result:
+            cache.put(cache_key, result)
+
+    def _async_client(self):
+        loop = asyncio.get_running_loop()
+        if not hasattr(self, "_async_clients"):
+            self._async_clients = weakref.WeakKeyDictionary()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = self._make_async_client(get_http_client())
+            self._async_clients[loop] = client
+        return client
+
+    @abc.abstractmethod
+    def _make_async_client(self, http_client: "httpx.AsyncClient"):
+        """
+        Returns the provider's async SDK client, sending its requests through http_client.
+        """
+
+
+class Claude37SonnetClient(_AsyncSDKMixin):
+    """
+    Minimal client for Claude 3.7 Sonnet.
     Uses environment variables:
       - ANTHROPIC_API_KEY: The key for Anthropic
       - CLAUDE_MODEL (optional, default "claude-3-7-sonnet-20250219")
+      - ANTHROPIC_BASE_URL (optional, read by the anthropic SDK itself)
+      - ANTHROPIC_BATCH_POLL_SECONDS (optional, Message Batch poll interval, default 30)
     """
 
+    provider = "anthropic"
+    sdk_module = "anthropic"
+
     def __init__(self):
         self.api_key = os.environ.get("ANTHROPIC_API_KEY", "missing-api-key")
         self.model_name = os.environ.get("CLAUDE_MODEL", "claude-3-7-sonnet-20250219")
-        self.client = anthropic.Anthropic(api_key=self.api_key)
 
-    def run(self, messages, max_tokens=4096, temperature=0.0, enable_thinking=False, thinking_budget=None):
+    def _make_async_client(self, http_client: "httpx.AsyncClient"):
+        anthropic = _import_sdk("anthropic")
+
+        # Retries are handled by rate_limiter.call_with_retries, not the SDK
+        return anthropic.AsyncAnthropic(api_key=self.api_key, http_client=http_client, max_retries=0)
+
+    def endpoint(self):
+        # The SDK picks ANTHROPIC_BASE_URL up by itself
+        base_url = os.environ.get("ANTHROPIC_BASE_URL", "").rstrip("/")
+        return base_url if base_url and base_url != ANTHROPIC_DEFAULT_BASE_URL else None
+
+    def run(self, messages, max_tokens=4096, temperature=0.0, enable_thinking=False, thinking_budget=None,
+            refresh=False, cache_conversation=False):
+        """
+        Blocking wrapper around arun(...). See arun for parameters.
+        """
+        with span("claude.run", cat="llm", model=self.model_name):
+            return run_sync(self.arun(
+                messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                enable_thinking=enable_thinking,
+                thinking_budget=thinking_budget,
+                refresh=refresh,
+                cache_conversation=cache_conversation,
+            ))
+
+    async def arun(self, messages, max_tokens=4096, temperature=0.0, enable_thinking=False, thinking_budget=None,
+                   refresh=False, cache_conversation=False):
         """
         Non-stream call to the Claude 3.7 Sonnet model.
         :param messages: list of { "role": "user"/"assistant"/"system", "content": "..."}
@@ -33,147 +510,666 @@ class Claude37SonnetClient:
         :param temperature: Controls randomness (0.0 to 1.0)
         :param enable_thinking: Whether to enable Claude's extended thinking capability
         :param thinking_budget: Number of tokens for thinking (min 1024, default to max_tokens - 1000)
+        :param refresh: Skip the response cache lookup (the new response is still cached)
+        :param cache_conversation: Put a prompt-cache breakpoint on the last message, so the
+            next turn of a growing conversation reads everything before it from the cache
         :return: final string
         """
-        try:
-            # Extract system message if present
-            system_prompt = None
-            filtered_messages = []
-            
-            for msg in messages:
-                if msg["role"] == "system":
-                    system_prompt = msg["content"]
-                else:
-                    filtered_messages.append(msg)
-            
-            # Create the request
-            params = {
-                "model": self.model_name,
-                "messages": filtered_messages,
-                "max_tokens": max_tokens,
-                "temperature": temperature
+        key = make_cache_key(
+            self.provider, self.model_name, messages, max_tokens, temperature,
+            thinking={"enabled": enable_thinking, "budget": thinking_budget},
+        )
+        with span("claude.arun", cat="llm", model=self.model_name, max_tokens=max_tokens,
+                  thinking_budget=thinking_budget if enable_thinking else None):
+            return await self._cached(key, refresh, lambda: self._limited(messages, max_tokens, lambda stats: self._arun_uncached(
+                messages, max_tokens, temperature, enable_thinking, thinking_budget, stats, cache_conversation,
+            )))
+
+    def _build_params(self, messages, max_tokens, temperature, enable_thinking, thinking_budget,
+                      cache_conversation=False):
+        # Extract system message if present
+        system_prompt = None
+        filtered_messages = []
+
+        for msg in messages:
+            if msg["role"] == "system":
+                system_prompt = msg["content"]
+            else:
+                filtered_messages.append(msg)
+
+        if cache_conversation and filtered_messages:
+            last = filtered_messages[-1]
+            content = last["content"]
+            if isinstance(content, str):
+                content = [{"type": "text", "text": content}]
+            content = content[:-1] + [{**content[-1], "cache_control": {"type": "ephemeral"}}]
+            filtered_messages[-1] = {**last, "content": content}
+
+        # Create the request
+        params = {
+            "model": self.model_name,
+            "messages": filtered_messages,
+            "max_tokens": max_tokens,
+        }
+        # Extended thinking only accepts the default temperature
+        if not enable_thinking:
+            params["temperature"] = temperature
+
+        # Add system prompt if present
+        if system_prompt:
+            params["system"] = system_prompt
+
+        # Add thinking if enabled
+        if enable_thinking:
+            # Default thinking budget is max_tokens minus a buffer, or 1024 if that would be too small
+            if thinking_budget is None:
+                thinking_budget = max(1024, max_tokens - 1000)
+
+            # Ensure minimum of 1024 tokens and less than max_tokens
+            thinking_budget = max(1024, min(thinking_budget, max_tokens - 100))
+
+            params["thinking"] = {
+                "type": "enabled",
+                "budget_tokens": thinking_budget
             }
-            
-            # Add system prompt if present
-            if system_prompt:
-                params["system"] = system_prompt
-                
-            # Add thinking if enabled
-            if enable_thinking:
-                # Default thinking budget is max_tokens minus a buffer, or 1024 if that would be too small
-                if thinking_budget is None:
-                    thinking_budget = max(1024, max_tokens - 1000)
-                
-                # Ensure minimum of 1024 tokens and less than max_tokens
-                thinking_budget = max(1024, min(thinking_budget, max_tokens - 100))
-                
-                params["thinking"] = {
-                    "type": "enabled",
-                    "budget_tokens": thinking_budget
-                }
-                
-            resp = self.client.messages.create(**params)
-            
-            # Extract content from response
-            result = ""
-            if resp.content and len(resp.content) > 0:
-                # Look for thinking content blocks first
-                has_thinking = False
-                thinking_text = ""
-                answer_text = ""
-                
-                for block in resp.content:
-                    if hasattr(block, 'type'):
-                        if block.type == "thinking":
-                            has_thinking = True
-                            thinking_text = block.thinking
-                        elif block.type == "text":
-                            answer_text += block.text
-                
-                # Format the response with thinking if available
-                if has_thinking:
-                    result = f"Thinking:\n{thinking_text}\n\nAnswer:\n{answer_text}"
-                else:
-                    result = answer_text or resp.content[0].text
-                
-                return result
-            return ""
-        except Exception as e:
-            return f"ERROR from Claude: {str(e)}"
-
-
-class DeepseekR1Client:
+        return params
+
+    def _track_usage(self, usage, stats: dict):
+        """
+        Records an Anthropic usage object into the usage totals and stats, including
+        stats["total"]: the tokens it billed against the rate limit.
+        """
+        if usage is None:
+            return
+        cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+        cache_write = getattr(usage, "cache_creation_input_tokens", None) or 0
+        self._record_usage(usage.input_tokens, usage.output_tokens, cache_read, cache_write)
+        stats.update(
+            input_tokens=usage.input_tokens,
+            output_tokens=usage.output_tokens,
+            cache_read_tokens=cache_read,
+            cache_write_tokens=cache_write,
+            total=usage.input_tokens + usage.output_tokens + cache_read + cache_write,
+        )
+
+    async def _arun_uncached(self, messages, max_tokens, temperature, enable_thinking, thinking_budget, stats,
+                             cache_conversation=False):
+        """
+        One raw request. Returns the text and fills stats.
+        """
+        params = self._build_params(messages, max_tokens, temperature, enable_thinking, thinking_budget,
+                                    cache_conversation)
+        resp = await self._async_client().messages.create(**params)
+        return self._message_text(resp, stats)
+
+    def _message_text(self, resp, stats: dict) -> str:
+        """
+        Text of a Messages API response (thinking formatted in front of the answer); fills stats.
+        """
+        self._track_usage(getattr(resp, "usage", None), stats)
+        stats["stop_reason"] = getattr(resp, "stop_reason", None)
+
+        # Extract content from response
+        result = ""
+        if resp.content and len(resp.content) > 0:
+            # Look for thinking content blocks first
+            has_thinking = False
+            thinking_text = ""
+            answer_text = ""
+
+            for block in resp.content:
+                if hasattr(block, 'type'):
+                    if block.type == "thinking":
+                        has_thinking = True
+                        thinking_text = block.thinking
+                    elif block.type == "text":
+                        answer_text += block.text
+
+            # Format the response with thinking if available
+            if has_thinking:
+                # Anthropic bills thinking as output tokens without a separate count
+                stats["thinking_tokens"] = estimate_tokens(thinking_text)
+                result = format_response(thinking_text, answer_text)
+            else:
+                result = answer_text or resp.content[0].text
+        return result
+
+    def stream(self, messages, max_tokens=4096, temperature=0.0, enable_thinking=False, thinking_budget=None,
+               refresh=False, cache_conversation=False):
+        """
+        Blocking wrapper around astream(...): yields (kind, delta) tuples as they arrive.
+        """
+        return iter_sync(self.astream(
+            messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            enable_thinking=enable_thinking,
+            thinking_budget=thinking_budget,
+            refresh=refresh,
+            cache_conversation=cache_conversation,
+        ))
+
+    async def astream(self, messages, max_tokens=4096, temperature=0.0, enable_thinking=False, thinking_budget=None,
+                      refresh=False, cache_conversation=False):
+        """
+        Streaming call to the Claude 3.7 Sonnet model. Same parameters as arun(...).
+        Yields ("thinking", delta) and ("text", delta) tuples; failures raise LLMError.
+        """
+        key = make_cache_key(
+            self.provider, self.model_name, messages, max_tokens, temperature,
+            thinking={"enabled": enable_thinking, "budget": thinking_budget},
+        )
+        stream = self._limited_stream(messages, max_tokens, lambda stats: self._astream_uncached(
+            messages, max_tokens, temperature, enable_thinking, thinking_budget, stats, cache_conversation,
+        ))
+        with span("claude.astream", cat="llm", model=self.model_name, max_tokens=max_tokens,
+                  thinking_budget=thinking_budget if enable_thinking else None):
+            async for event in self._cached_stream(key, refresh, stream, "Thinking"):
+                yield event
+
+    async def _astream_uncached(self, messages, max_tokens, temperature, enable_thinking, thinking_budget, stats,
+                                cache_conversation=False):
+        params = self._build_params(messages, max_tokens, temperature, enable_thinking, thinking_budget,
+                                    cache_conversation)
+        async with self._async_client().messages.stream(**params) as stream:
+            async for event in stream:
+                if event.type != "content_block_delta":
+                    continue
+                if event.delta.type == "thinking_delta":
+                    yield ("thinking", event.delta.thinking)
+                elif event.delta.type == "text_delta":
+                    yield ("text", event.delta.text)
+            final = await stream.get_final_message()
+            self._track_usage(final.usage, stats)
+            stats["stop_reason"] = final.stop_reason
+
+    async def arun_batch(self, requests: dict, refresh: bool = False, poll_interval: float = None) -> dict:
+        """
+        Runs many requests through the Message Batches API (half price, bulk throughput,
+        results within 24 hours). requests maps any hashable id to arun(...) keyword
+        arguments (messages, max_tokens, temperature, enable_thinking, thinking_budget).
+
+        Returns {id: text} with an LLMError instead of the text for requests that failed,
+        so one bad request doesn't sink the rest. Cached responses are served without a
+        batch; requests that fail transiently or expire are resubmitted in a new batch.
+        """
+        poll_interval = poll_interval if poll_interval is not None else BATCH_POLL_SECONDS
+        cassette = get_cassette()
+        cache = get_default_cache()
+        results = {}
+        # id -> (cache key, build_params arguments)
+        pending = {}
+        # id -> cache key, for requests served from a cassette
+        replayed = {}
+        for request_id, kwargs in requests.items():
+            call = {"max_tokens": 4096, "temperature": 0.0, "enable_thinking": False, "thinking_budget": None,
+                    **kwargs}
+            key = make_cache_key(
+                self.provider, self.model_name, call["messages"], call["max_tokens"], call["temperature"],
+                thinking={"enabled": call["enable_thinking"], "budget": call["thinking_budget"]},
+            )
+            if cassette is not None and cassette.replaying:
+                replayed[request_id] = key
+                continue
+            cached = (cache.get(self._cache_key(key))
+                      if cache is not None and not refresh and cassette is None else None)
+            if cached is not None:
+                get_metrics().observe_cache_hit(self.provider, self.model_name)
+                results[request_id] = cached
+            else:
+                pending[request_id] = (key, call)
+        if replayed:
+            # Concurrently, so recorded latencies overlap the way the batch did
+            outcomes = await asyncio.gather(*(cassette.replay(key, self.provider) for key in replayed.values()),
+                                            return_exceptions=True)
+            for request_id, outcome in zip(replayed, outcomes):
+                if isinstance(outcome, BaseException) and not isinstance(outcome, LLMError):
+                    raise outcome
+                results[request_id] = outcome
+
+        policy = RetryPolicy()
+        attempt = 0
+        while pending:
+            outcomes = {}
+            ids = list(pending)
+            submitted = time.perf_counter()
+            for start in range(0, len(ids), MAX_BATCH_REQUESTS):
+                chunk = {request_id: pending[request_id][1] for request_id in ids[start:start + MAX_BATCH_REQUESTS]}
+                outcomes.update(await self._run_message_batch(chunk, poll_interval))
+            retry = {}
+            for request_id, outcome in outcomes.items():
+                if isinstance(outcome, RetryableLLMError) and attempt < policy.max_retries:
+                    retry[request_id] = pending[request_id]
+                    continue
+                results[request_id] = outcome
+                if cassette is not None and isinstance(outcome, str):
+                    # Per-request latency isn't visible inside a batch; record the whole wait
+                    cassette.record(pending[request_id][0], self.provider, self.model_name, outcome,
+                                    time.perf_counter() - submitted)
+                if cache is not None and isinstance(outcome, str) and outcome:
+                    cache.put(self._cache_key(pending[request_id][0]), outcome)
+            pending = retry
+            attempt += 1
+            if pending:
+                print(f"Resubmitting {len(pending)} failed batch request(s)")
+        return results
+
+    async def _run_message_batch(self, requests: dict, poll_interval: float) -> dict:
+        """
+        Submits one Message Batch, polls it until it has ended and collects the results
+        as {id: text or LLMError}.
+        """
+        client = self._async_client()
+        # custom_id must match ^[a-zA-Z0-9_-]{1,64}$, so callers' ids are mapped
+        custom_ids = {f"req-{i}": request_id for i, request_id in enumerate(requests)}
+        batch_requests = [
+            {"custom_id": custom_id, "params": self._build_params(**requests[request_id])}
+            for custom_id, request_id in custom_ids.items()
+        ]
+        started = time.perf_counter()
+        with span("message_batch", cat="http", model=self.model_name, requests=len(batch_requests)) as batch_span:
+            batch = await call_with_retries(lambda: client.messages.batches.create(requests=batch_requests),
+                                            self.provider)
+            batch_id = batch.id
+            batch_span.set(batch_id=batch_id)
+            print(f"Submitted message batch {batch_id} ({len(batch_requests)} request(s))")
+            while batch.processing_status != "ended":
+                await asyncio.sleep(poll_interval)
+                batch = await call_with_retries(lambda: client.messages.batches.retrieve(batch_id), self.provider)
+        counts = batch.request_counts
+        print(f"Message batch {batch_id} ended after {time.perf_counter() - started:.1f}s: "
+              f"{counts.succeeded} succeeded, {counts.errored} errored, {counts.expired} expired")
+
+        outcomes = {}
+        decoder = await call_with_retries(lambda: client.messages.batches.results(batch_id), self.provider)
+        async for item in decoder:
+            request_id = custom_ids.get(item.custom_id)
+            if request_id is None:
+                continue
+            stats = {}
+            if item.result.type == "succeeded":
+                outcomes[request_id] = self._message_text(item.result.message, stats)
+                self._observe(stats, started, provider=f"{self.provider}-batch")
+            else:
+                outcomes[request_id] = self._batch_error(batch_id, item.result)
+                self._observe(stats, started, error=outcomes[request_id], provider=f"{self.provider}-batch")
+        for request_id in custom_ids.values():
+            outcomes.setdefault(request_id, RetryableLLMError(
+                f"{self.provider}: no result for a request in batch {batch_id}", self.provider))
+        return outcomes
+
+    def _batch_error(self, batch_id: str, result) -> LLMError:
+        """
+        Maps a failed batch result (errored / expired / canceled) to an LLMError subclass.
+        """
+        if result.type == "expired":
+            return RetryableLLMError(f"{self.provider}: request expired in batch {batch_id}", self.provider)
+        if result.type != "errored":
+            return LLMError(f"{self.provider}: request {result.type} in batch {batch_id}", self.provider)
+        kind = result.error.error.type
+        message = f"{self.provider}: {kind} in batch {batch_id}: {result.error.error.message}"
+        if kind == "rate_limit_error":
+            return RateLimitError(message, self.provider)
+        if kind == "overloaded_error":
+            return OverloadedError(message, self.provider)
+        if kind in ("api_error", "timeout_error"):
+            return RetryableLLMError(message, self.provider)
+        return LLMError(message, self.provider)
+
+
+class DeepseekR1Client(_AsyncSDKMixin):
     """
     Minimal client for DeepSeek R1 using openai library with a custom base URL.
+    DeepSeek caches repeated prompt prefixes on its own, so block content
+    (see build_user_content) is simply flattened to strings.
     Env variables:
       - DEEPSEEK_API_KEY
+      - DEEPSEEK_BASE_URL (optional, e.g. a local mock server from benchmarks/mock_llm_server.py)
     """
 
+    provider = "deepseek"
+    sdk_module = "openai"
+
     def __init__(self):
         self.api_key = os.environ.get("DEEPSEEK_API_KEY", "missing-deepseek-key")
-        # Create a proper client instance using the modern SDK pattern
-        self.client = openai.OpenAI(
-            api_key=self.api_key,
-            base_url="https://api.deepseek.com"
-        )
+        self.base_url = os.environ.get("DEEPSEEK_BASE_URL", DEEPSEEK_DEFAULT_BASE_URL)
         self.model_name = "deepseek-reasoner"
 
-    def run(self, messages, max_tokens=8000, temperature=0.0):
+    def _make_async_client(self, http_client: "httpx.AsyncClient"):
+        openai = _import_sdk("openai")
+
+        # Retries are handled by rate_limiter.call_with_retries, not the SDK
+        return openai.AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, http_client=http_client,
+                                  max_retries=0)
+
+    def endpoint(self):
+        base_url = self.base_url.rstrip("/")
+        return base_url if base_url != DEEPSEEK_DEFAULT_BASE_URL else None
+
+    def run(self, messages, max_tokens=8000, temperature=0.0, refresh=False, cache_conversation=False):
+        """
+        Blocking wrapper around arun(...). See arun for parameters.
+        """
+        with span("deepseek.run", cat="llm", model=self.model_name):
+            return run_sync(self.arun(messages, max_tokens=max_tokens, temperature=temperature, refresh=refresh))
+
+    async def arun(self, messages, max_tokens=8000, temperature=0.0, refresh=False, cache_conversation=False):
         """
         Non-stream call to DeepSeek R1
-        
+
         :param messages: list of { "role": "user"/"assistant"/"system", "content": "..."}
         :param max_tokens: limit for the generated text
         :param temperature: Controls randomness (0.0 to 2.0, lower is better for coding)
+        :param refresh: Skip the response cache lookup (the new response is still cached)
+        :param cache_conversation: Accepted for parity with the Claude client; DeepSeek's prefix cache is automatic
         :return: final string including reasoning if available
         """
-        try:
-            resp = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=messages,
-                max_tokens=max_tokens,
-                temperature=temperature,
-                stream=False
-            )
-            
-            if resp.choices and len(resp.choices) > 0:
-                # Check if reasoning content is available (deepseek-reasoner specific)
-                reasoning = getattr(resp.choices[0].message, 'reasoning_content', None)
-                content = resp.choices[0].message.content
-                
-                # If reasoning is available, prepend it to the content
-                if reasoning:
-                    return f"Reasoning:\n{reasoning}\n\nAnswer:\n{content}"
-                return content
-            return ""
-        except Exception as e:
-            return f"ERROR from DeepSeek: {str(e)}"
+        messages = flatten_content(messages)
+        key = make_cache_key(self.provider, self.model_name, messages, max_tokens, temperature)
+        with span("deepseek.arun", cat="llm", model=self.model_name, max_tokens=max_tokens):
+            return await self._cached(key, refresh, lambda: self._limited(
+                messages, max_tokens, lambda stats: self._arun_uncached(messages, max_tokens, temperature, stats),
+            ))
+
+    async def _arun_uncached(self, messages, max_tokens, temperature, stats):
+        """
+        One raw request. Returns the text and fills stats.
+        """
+        resp = await self._async_client().chat.completions.create(
+            model=self.model_name,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=False
+        )
+        self._track_usage(getattr(resp, "usage", None), stats)
+
+        if resp.choices and len(resp.choices) > 0:
+            stats["stop_reason"] = resp.choices[0].finish_reason
+            # Check if reasoning content is available (deepseek-reasoner specific)
+            reasoning = getattr(resp.choices[0].message, 'reasoning_content', None)
+            content = resp.choices[0].message.content
+
+            # If reasoning is available, prepend it to the content
+            if reasoning:
+                stats.setdefault("thinking_tokens", estimate_tokens(reasoning))
+                return format_response(reasoning, content, "Reasoning")
+            return content
+        return ""
+
+    def stream(self, messages, max_tokens=8000, temperature=0.0, refresh=False, cache_conversation=False):
+        """
+        Blocking wrapper around astream(...): yields (kind, delta) tuples as they arrive.
+        """
+        return iter_sync(self.astream(messages, max_tokens=max_tokens, temperature=temperature, refresh=refresh))
+
+    async def astream(self, messages, max_tokens=8000, temperature=0.0, refresh=False, cache_conversation=False):
+        """
+        Streaming call to DeepSeek R1. Same parameters as arun(...).
+        Yields ("thinking", delta) for reasoning_content and ("text", delta) for the answer;
+        failures raise LLMError.
+        """
+        messages = flatten_content(messages)
+        key = make_cache_key(self.provider, self.model_name, messages, max_tokens, temperature)
+        stream = self._limited_stream(messages, max_tokens, lambda stats: self._astream_uncached(
+            messages, max_tokens, temperature, stats,
+        ))
+        with span("deepseek.astream", cat="llm", model=self.model_name, max_tokens=max_tokens):
+            async for event in self._cached_stream(key, refresh, stream, "Reasoning"):
+                yield event
+
+    def _track_usage(self, usage, stats: dict):
+        """
+        Records an OpenAI-style usage object (with DeepSeek's prompt_cache_hit_tokens /
+        prompt_cache_miss_tokens) into the usage totals and stats.
+        """
+        if usage is None:
+            return
+        cache_hit = getattr(usage, "prompt_cache_hit_tokens", None) or 0
+        self._record_usage(usage.prompt_tokens - cache_hit, usage.completion_tokens, cache_hit, 0)
+        stats.update(
+            input_tokens=usage.prompt_tokens - cache_hit,
+            output_tokens=usage.completion_tokens,
+            cache_read_tokens=cache_hit,
+            total=usage.total_tokens,
+        )
+        details = getattr(usage, "completion_tokens_details", None)
+        if getattr(details, "reasoning_tokens", None):
+            stats["thinking_tokens"] = details.reasoning_tokens
+
+    async def _astream_uncached(self, messages, max_tokens, temperature, stats):
+        stream = await self._async_client().chat.completions.create(
+            model=self.model_name,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        async for chunk in stream:
+            if getattr(chunk, "usage", None) is not None:
+                self._track_usage(chunk.usage, stats)
+            if not chunk.choices:
+                continue
+            if chunk.choices[0].finish_reason:
+                stats["stop_reason"] = chunk.choices[0].finish_reason
+            delta = chunk.choices[0].delta
+            reasoning = getattr(delta, 'reasoning_content', None)
+            if reasoning:
+                yield ("thinking", reasoning)
+            if delta.content:
+                yield ("text", delta.content)
+
+
+_shared_clients = {}
+_shared_clients_lock = threading.Lock()
+
+
+def get_client(model_name: str):
+    """
+    Returns the process-wide client instance for model_name ("claude37sonnet" or "deepseekr1"),
+    so every AIOrchestrator shares the same client and connection pool.
+    """
+    model_name = model_name.lower()
+    with _shared_clients_lock:
+        client = _shared_clients.get(model_name)
+        if client is None:
+            if model_name == "claude37sonnet":
+                client = Claude37SonnetClient()
+            elif model_name == "deepseekr1":
+                client = DeepseekR1Client()
+            else:
+                raise ValueError(f"Unknown model: {model_name}")
+            _shared_clients[model_name] = client
+    return client
+
+
+def model_available(model_name: str) -> bool:
+    """
+    True if model_name's API key is configured (the clients fall back to a "missing-..." placeholder).
+    Replaying a cassette needs no key.
+    """
+    cassette = get_cassette()
+    if cassette is not None and cassette.replaying:
+        return True
+    return not get_client(model_name).api_key.startswith("missing-")
+
+
+def thinking_kwargs(client, thinking_budget: int = None) -> dict:
+    """
+    Client-specific arguments for a thinking budget. Claude thinks only when given a
+    budget; DeepSeek R1 always reasons and has no budget to set.
+    """
+    if thinking_budget and supports_thinking_budget(client):
+        return {"enable_thinking": True, "thinking_budget": thinking_budget}
+    return {}
+
+
+def supports_thinking_budget(client) -> bool:
+    return isinstance(client, Claude37SonnetClient)
 
 
 class AIOrchestrator:
     """
     A minimal orchestrator that picks either Claude3.7Sonnet or DeepseekR1
     and calls .run(...) with system+user messages.
+
+    With hedge_model, every call is hedged across two providers (see hedging.py): if
+    the primary is slower than its own latency percentile, the same call goes to the
+    secondary and the first result wins.
     """
 
-    def __init__(self, model_name: str):
+    def __init__(self, model_name: str, hedge_model: str = None, hedge_policy: HedgePolicy = None,
+                 thinking_controller: ThinkingBudgetController = None):
         """
         model_name can be "claude37sonnet" or "deepseekr1"
+        hedge_model, if given (and different), is the secondary model calls are hedged to
+        thinking_controller, if given, adapts thinking budgets (see thinking_budget_for)
         """
         self.model_name = model_name.lower()
-        if self.model_name == "claude37sonnet":
-            self.client = Claude37SonnetClient()
-        elif self.model_name == "deepseekr1":
-            self.client = DeepseekR1Client()
-        else:
-            raise ValueError(f"Unknown model: {model_name}")
+        self.client = get_client(self.model_name)
+        self.client.prewarm()
+        self.hedge_model = None
+        self.hedge_client = None
+        if hedge_model and hedge_model.lower() != self.model_name:
+            self.hedge_model = hedge_model.lower()
+            self.hedge_client = get_client(self.hedge_model)
+            self.hedge_client.prewarm()
+        self.hedge_policy = hedge_policy or HedgePolicy()
+        self.hedge_stats = HedgeStats()
+        self.thinking_controller = thinking_controller
+        self._siblings = {self.model_name: self}
+
+    def sibling(self, model_name: str) -> "AIOrchestrator":
+        """
+        Returns an orchestrator for another model with the same hedging setup (one per model),
+        for walkthroughs that route steps to different models.
+        """
+        model_name = model_name.lower()
+        sibling = self._siblings.get(model_name)
+        if sibling is None:
+            # A hedged sibling hedges back to this orchestrator's model
+            hedge_model = self.model_name if self.hedge_client is not None else None
+            sibling = AIOrchestrator(model_name, hedge_model=hedge_model, hedge_policy=self.hedge_policy,
+                                     thinking_controller=self.thinking_controller)
+            sibling.hedge_stats = self.hedge_stats
+            sibling._siblings = self._siblings
+            self._siblings[model_name] = sibling
+        return sibling
 
-    def call_llm(self, system_prompt: str, user_prompt: str, max_tokens: int = 2048) -> str:
+    def orchestrators(self) -> List["AIOrchestrator"]:
+        """
+        This orchestrator and every sibling created from it.
+        """
+        return list(self._siblings.values())
+
+    def thinking_budget_for(self, key: str, ceiling: int = None) -> int:
+        """
+        Thinking budget for a call identified by key (e.g. the step name): the controller's
+        pick, at most ceiling, or ceiling itself without a controller. Models without a
+        thinking budget (DeepSeek R1) always get ceiling, which they ignore.
+        """
+        if self.thinking_controller is None or not supports_thinking_budget(self.client):
+            return ceiling
+        return self.thinking_controller.choose(key, self.model_name, ceiling)
+
+    def observe_thinking(self, key: str, thinking_budget: int, seconds: float, quality: float):
+        """
+        Reports how a call made with thinking_budget_for(key, ...) went: latency and quality in 0..1.
+        """
+        if self.thinking_controller is not None and supports_thinking_budget(self.client):
+            self.thinking_controller.record(key, self.model_name, thinking_budget, seconds, quality)
+
+    def _hedge_outcome(self, fired: bool, secondary_won: bool):
+        self.hedge_stats.record(fired, secondary_won)
+        get_metrics().observe_hedge(self.client.model_name, self.hedge_client.model_name, fired, secondary_won)
+
+    def call_llm(self, system_prompt: str, user_prompt: str, max_tokens: int = 2048, refresh: bool = False,
+                 prompt_prefix: List[str] = None, thinking_budget: int = None) -> str:
         """
         Minimal synergy: just pass system+user messages, get final text.
+        Responses are served from the on-disk cache unless refresh=True.
+        prompt_prefix, if given, is a list of context segments sent before user_prompt
+        and marked as cacheable by the provider; keep it identical across calls that share it.
+        thinking_budget enables Claude's extended thinking with that many tokens (see thinking_kwargs).
         """
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
-        return self.client.run(messages, max_tokens=max_tokens)
+        return run_sync(self.acall_llm(system_prompt, user_prompt, max_tokens=max_tokens, refresh=refresh,
+                                       prompt_prefix=prompt_prefix, thinking_budget=thinking_budget))
+
+    async def acall_llm(self, system_prompt: str, user_prompt: str, max_tokens: int = 2048,
+                        refresh: bool = False, prompt_prefix: List[str] = None,
+                        thinking_budget: int = None) -> str:
+        """
+        Async counterpart of call_llm, for driving many walkthroughs on one event loop.
+        """
+        messages = build_messages(system_prompt, user_prompt, prompt_prefix)
+        if self.hedge_client is None:
+            return await self.client.arun(messages, max_tokens=max_tokens, refresh=refresh,
+                                          **thinking_kwargs(self.client, thinking_budget))
+        return await hedged_call(
+            lambda: self.client.arun(messages, max_tokens=max_tokens, refresh=refresh,
+                                     **thinking_kwargs(self.client, thinking_budget)),
+            lambda: self.hedge_client.arun(messages, max_tokens=max_tokens, refresh=refresh,
+                                           **thinking_kwargs(self.hedge_client, thinking_budget)),
+            self.hedge_policy.delay(self.client.provider, self.client.model_name),
+            self._hedge_outcome,
+        )
+
+    async def acall_llm_batch(self, calls: dict, refresh: bool = False, poll_interval: float = None) -> dict:
+        """
+        Runs many calls at once. calls maps an id to acall_llm(...) keyword arguments
+        (system_prompt, user_prompt, prompt_prefix, max_tokens, thinking_budget). On Claude
+        they go out as one Message Batch (see Claude37SonnetClient.arun_batch); other models
+        get concurrent regular calls. Calls are not hedged.
+        Returns {id: text}, with an LLMError in place of the text for failed calls.
+        """
+        if isinstance(self.client, Claude37SonnetClient):
+            return await self.client.arun_batch({
+                call_id: {
+                    "messages": build_messages(call["system_prompt"], call["user_prompt"], call.get("prompt_prefix")),
+                    "max_tokens": call.get("max_tokens", 2048),
+                    **thinking_kwargs(self.client, call.get("thinking_budget")),
+                }
+                for call_id, call in calls.items()
+            }, refresh=refresh, poll_interval=poll_interval)
+
+        async def one(call: dict):
+            try:
+                return await self.client.arun(
+                    build_messages(call["system_prompt"], call["user_prompt"], call.get("prompt_prefix")),
+                    max_tokens=call.get("max_tokens", 2048), refresh=refresh,
+                )
+            except LLMError as e:
+                return e
+
+        outcomes = await asyncio.gather(*(one(call) for call in calls.values()))
+        return dict(zip(calls, outcomes))
+
+    def stream_llm(self, system_prompt: str, user_prompt: str, max_tokens: int = 2048, refresh: bool = False,
+                   prompt_prefix: List[str] = None, thinking_budget: int = None):
+        """
+        Like call_llm, but yields ("thinking" | "text", delta) tuples as they arrive.
+        """
+        return iter_sync(self.astream_llm(system_prompt, user_prompt, max_tokens=max_tokens, refresh=refresh,
+                                          prompt_prefix=prompt_prefix, thinking_budget=thinking_budget))
+
+    async def astream_llm(self, system_prompt: str, user_prompt: str, max_tokens: int = 2048,
+                          refresh: bool = False, prompt_prefix: List[str] = None, thinking_budget: int = None):
+        """
+        Async counterpart of stream_llm.
+        """
+        messages = build_messages(system_prompt, user_prompt, prompt_prefix)
+        if self.hedge_client is None:
+            stream = self.client.astream(messages, max_tokens=max_tokens, refresh=refresh,
+                                         **thinking_kwargs(self.client, thinking_budget))
+        else:
+            stream = hedged_stream(
+                lambda: self.client.astream(messages, max_tokens=max_tokens, refresh=refresh,
+                                            **thinking_kwargs(self.client, thinking_budget)),
+                lambda: self.hedge_client.astream(messages, max_tokens=max_tokens, refresh=refresh,
+                                                  **thinking_kwargs(self.hedge_client, thinking_budget)),
+                self.hedge_policy.delay(self.client.provider, self.client.model_name, stream=True),
+                self._hedge_outcome,
+            )
+        async for event in stream:
+            yield event
@@ -5,10 +5,35 @@ AI Research Proposal Generator
 This module reads all files generated in the 'some_project/doc' folder,
 sends the content to an AI model, and has the AI generate a formal 
 academic research proposal paper.
+
+With --sections, each proposal section is generated by its own call, in
+parallel, from only the design documents relevant to it (PROPOSAL_SECTIONS).
+A short stitching call then returns a terminology map that is applied to the
+newly generated section bodies, so all sections use the same names for the
+same things.
+
+Sections mode is incremental: some_project/.proposal_sections.json records,
+per section, the hashes of the documents it was generated from (plus a hash
+of its prompt spec, the title and the model) and the generated body. A rerun
+regenerates only the sections whose inputs changed and splices them into the
+existing ai_research_proposal.md; --full regenerates every section.
+
+--trace-out F records the run (one span per section call) as a Chrome trace,
+see tracing.py. --record-cassette F / --replay-cassette F record the run's LLM
+calls or replay them offline (see cassette.py).
+
+Env variables:
+  - PROPOSAL_MAX_TOKENS (optional, output budget of the single-call proposal)
 """
 
+import asyncio
+import hashlib
+import json
 import os
+import re
 import sys
+import tempfile
+import time
 from pathlib import Path
 from typing import Dict, List, Optional
 import argparse
@@ -16,14 +41,16 @@ import argparse
 # Load environment variables from .env file
 try:
     from dotenv import load_dotenv
-    print("Loading environment variables from .env file...")
     load_dotenv()
-    print("Environment variables loaded successfully.")
 except ImportError:
     print("Warning: python-dotenv not installed. Trying to use existing environment variables.")
 
 # Import the existing AI clients correctly
-from ai_clients import Claude37SonnetClient, DeepseekR1Client
+from ai_clients import Claude37SonnetClient, DeepseekR1Client, LLMError, run_sync
+from context_manager import split_reasoning
+from prompt_template import compile_template
+from tracing import enable as enable_tracing, span
+from cassette import RECORD, REPLAY, get_cassette, use_cassette
 
 # Define the file order for processing
 FILE_ORDER = [
@@ -37,6 +64,78 @@ FILE_ORDER = [
     "ELABORATIONS.md"
 ]
 
+SYSTEM_PROMPT = "You are an expert academic researcher and writer specializing in creating comprehensive research proposals."
+
+# Proposal sections for --sections mode: each is generated independently from
+# only the FILE_ORDER documents listed in "sources".
+PROPOSAL_SECTIONS = [
+    {
+        "title": "Abstract",
+        "sources": ["CONTEXT_CONSTRAINTS.md", "BREAKTHROUGH_BLUEPRINT.md", "NOVELTY_CHECK.md"],
+        "instructions": "Write a single-paragraph abstract (200-300 words) covering the problem, the proposed approach, its novelty and the expected impact.",
+        "max_tokens": 1500,
+    },
+    {
+        "title": "Introduction and Problem Statement",
+        "sources": ["CONTEXT_CONSTRAINTS.md", "BREAKTHROUGH_BLUEPRINT.md"],
+        "instructions": "Introduce the domain, state the problem precisely, and explain why current approaches fall short.",
+        "max_tokens": 2500,
+    },
+    {
+        "title": "Literature Review",
+        "sources": ["CONTEXT_CONSTRAINTS.md", "DIVERGENT_SOLUTIONS.md", "NOVELTY_CHECK.md"],
+        "instructions": "Review the relevant prior work and cross-domain references, and position the proposed research against them. Cite works as (Author, Year).",
+        "max_tokens": 3000,
+    },
+    {
+        "title": "Research Questions and Objectives",
+        "sources": ["CONTEXT_CONSTRAINTS.md", "SELF_CRITIQUE_SYNERGY.md", "BREAKTHROUGH_BLUEPRINT.md"],
+        "instructions": "State 3-5 numbered research questions and the concrete, measurable objectives that answer them.",
+        "max_tokens": 2000,
+    },
+    {
+        "title": "Methodology and Technical Approach",
+        "sources": ["DEEP_DIVE_MECHANISMS.md", "BREAKTHROUGH_BLUEPRINT.md", "ELABORATIONS.md"],
+        "instructions": "Describe the technical approach, system architecture, experimental design and evaluation metrics in detail, with subsections.",
+        "max_tokens": 4000,
+    },
+    {
+        "title": "Implementation Plan and Timeline",
+        "sources": ["IMPLEMENTATION_PATH.md", "ELABORATIONS.md"],
+        "instructions": "Lay out the phases, milestones, deliverables and a month-by-month timeline (a Markdown table), plus key risks and mitigations.",
+        "max_tokens": 3000,
+    },
+    {
+        "title": "Expected Results and Impact",
+        "sources": ["BREAKTHROUGH_BLUEPRINT.md", "SELF_CRITIQUE_SYNERGY.md", "NOVELTY_CHECK.md"],
+        "instructions": "Describe the expected results, how success will be measured, and the scientific, practical and societal impact.",
+        "max_tokens": 2500,
+    },
+    {
+        "title": "Conclusion",
+        "sources": ["BREAKTHROUGH_BLUEPRINT.md", "NOVELTY_CHECK.md"],
+        "instructions": "Conclude in 2-3 paragraphs: restate the contribution and why it merits funding.",
+        "max_tokens": 1500,
+    },
+    {
+        "title": "References",
+        "sources": ["CONTEXT_CONSTRAINTS.md", "DIVERGENT_SOLUTIONS.md", "NOVELTY_CHECK.md"],
+        "instructions": "List the references mentioned in the source documents as a numbered bibliography in APA style. Do not invent references that the documents do not support.",
+        "max_tokens": 2000,
+    },
+]
+
+# Upper bound on the term -> canonical term map returned by the stitching call
+STITCH_MAX_TOKENS = 1024
+
+# max_tokens for the single-call proposal per model (override with PROPOSAL_MAX_TOKENS
+# or --max-tokens); each model's output limit with room for a long proposal
+DEFAULT_PROPOSAL_MAX_TOKENS = {"claude": 20000, "deepseek": 8000}
+
+PROPOSAL_NAME = "ai_research_proposal.md"
+SECTIONS_MANIFEST = ".proposal_sections.json"
+SECTIONS_MANIFEST_VERSION = 1
+
 def read_file_content(file_path: Path) -> str:
     """Read and return the content of a file."""
     try:
@@ -57,9 +156,8 @@ def get_project_title(doc_folder: Path) -> str:
                 return line.replace('# ', '')
     return "NeuroCognitive Architecture (NCA): A Brain-Inspired LLM Framework"
 
-def prepare_prompt(file_contents: Dict[str, str], project_title: str) -> str:
-    """Prepare the prompt for the AI model."""
-    prompt = f"""
+# Single-call proposal prompt; {sources} is the design documents in FILE_ORDER
+PROPOSAL_TEMPLATE = compile_template("""
 Create a formal academic research proposal for a project titled "{project_title}".
 
 Use the following content from previous design documents to create a comprehensive, well-structured academic research proposal. Format it according to standard academic conventions with proper sections, citations, and academic tone.
@@ -78,24 +176,245 @@ The research proposal should include:
 
 Below are the source documents to synthesize into the proposal:
 
-"""
-    
-    # Add each file's content to the prompt
-    for file_name in FILE_ORDER:
-        if file_name in file_contents:
-            section_name = file_name.replace('.md', '').replace('_', ' ').title()
-            prompt += f"\n===== {section_name} =====\n"
-            prompt += file_contents[file_name]
-            prompt += "\n\n"
-
-    prompt += """
+{sources}
 Create a cohesive, professionally formatted academic research proposal that integrates these materials. 
 Use formal academic language and structure. Ensure proper citation of external works where appropriate.
 Focus on presenting this as a serious, innovative research initiative with clear methodology and expected outcomes.
 The proposal should be comprehensive enough for submission to a major research funding organization.
+""", allowed="project_title|sources", name="proposal")
+
+def prepare_prompt(file_contents: Dict[str, str], project_title: str) -> str:
+    """Prepare the prompt for the AI model."""
+    sources = []
+    for file_name in FILE_ORDER:
+        if file_name in file_contents:
+            section_name = file_name.replace('.md', '').replace('_', ' ').title()
+            sources += [f"\n===== {section_name} =====\n", file_contents[file_name], "\n\n"]
+    return PROPOSAL_TEMPLATE.render({"project_title": project_title, "sources": sources})
+
+def format_sources(file_contents: Dict[str, str], file_names: List[str]) -> str:
+    """Format the given design documents (in FILE_ORDER) as prompt sections."""
+    parts = []
+    for file_name in FILE_ORDER:
+        if file_name in file_names and file_name in file_contents:
+            section_name = file_name.replace('.md', '').replace('_', ' ').title()
+            parts.append(f"\n===== {section_name} =====\n{file_contents[file_name]}\n")
+    return "\n".join(parts)
+
+def prepare_section_prompt(section: dict, file_contents: Dict[str, str], project_title: str) -> str:
+    """Prepare the prompt for one proposal section (--sections mode)."""
+    return f"""
+You are writing one section of a formal academic research proposal for a project titled "{project_title}".
+The other sections are written separately, so cover only this section.
+
+Section: {section["title"]}
+{section["instructions"]}
+
+Write the section body in Markdown using formal academic language. Do not repeat the section
+heading and do not add a preamble; start directly with the content. Use ### for any subsections.
+
+Below are the source documents relevant to this section:
+{format_sources(file_contents, section["sources"])}
 """
 
-    return prompt
+def prepare_stitch_prompt(sections: Dict[str, str], project_title: str) -> str:
+    """Prepare the terminology-unification prompt for the drafted sections."""
+    drafts = "\n\n".join(f"===== {title} =====\n{body}" for title, body in sections.items())
+    return f"""
+The sections below were drafted independently for the research proposal "{project_title}".
+Find terms, component names, acronyms and spellings that refer to the same thing but are
+written differently across sections, and pick one canonical form for each.
+
+Reply with only a JSON object mapping each variant to its canonical form, for example
+{{"neuro-cognitive architecture": "NeuroCognitive Architecture", "NCA framework": "NCA"}}.
+Include only variants that actually occur in the text; reply {{}} if the terminology is already consistent.
+
+{drafts}
+"""
+
+def parse_terminology_map(response: str) -> Dict[str, str]:
+    """Extract the {variant: canonical} JSON object from the stitching response ({} if none)."""
+    _, answer = split_reasoning(response)
+    start, end = answer.find("{"), answer.rfind("}")
+    if start == -1 or end < start:
+        return {}
+    try:
+        mapping = json.loads(answer[start:end + 1])
+    except ValueError:
+        return {}
+    if not isinstance(mapping, dict):
+        return {}
+    return {k: v for k, v in mapping.items()
+            if isinstance(k, str) and isinstance(v, str) and k.strip() and k != v}
+
+def apply_terminology(text: str, mapping: Dict[str, str]) -> str:
+    """Replace every variant in mapping with its canonical form in one pass (longest variants first)."""
+    if not mapping:
+        return text
+    patterns = []
+    for variant in sorted(mapping, key=len, reverse=True):
+        pattern = re.escape(variant)
+        # Only match whole words where the variant starts/ends with a word character
+        if re.match(r"\w", variant):
+            pattern = r"\b" + pattern
+        if re.search(r"\w$", variant):
+            pattern += r"\b"
+        patterns.append(pattern)
+    return re.sub("|".join(patterns), lambda m: mapping.get(m.group(0), m.group(0)), text)
+
+async def agenerate_sections(client, file_contents: Dict[str, str], project_title: str,
+                             max_concurrency: int, sections: List[dict] = None) -> Dict[str, str]:
+    """
+    Generates the given sections (default: all of PROPOSAL_SECTIONS) in parallel,
+    at most max_concurrency calls in flight. Returns {title: section body} in order.
+    """
+    sections = PROPOSAL_SECTIONS if sections is None else sections
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def generate(section: dict) -> str:
+        async with semaphore:
+            with span(section["title"], cat="step", step=section["title"]):
+                started = time.time()
+                messages = [
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": prepare_section_prompt(section, file_contents, project_title)},
+                ]
+                response = await client.arun(messages, max_tokens=section["max_tokens"])
+                print(f"Section '{section['title']}' done in {time.time() - started:.1f}s")
+                return split_reasoning(response)[1].strip()
+
+    bodies = await asyncio.gather(*(generate(section) for section in sections))
+    return {section["title"]: body for section, body in zip(sections, bodies)}
+
+def assemble_proposal(sections: Dict[str, str], project_title: str) -> str:
+    """Join section bodies under numbered headings, after a title heading."""
+    parts = [f"# {project_title}\n\n*A Research Proposal*"]
+    for number, (title, body) in enumerate(sections.items(), start=1):
+        parts.append(f"## {number}. {title}\n\n{body}")
+    return "\n\n".join(parts) + "\n"
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def section_inputs(section: dict, file_contents: Dict[str, str], project_title: str, model_name: str) -> dict:
+    """
+    Everything a section's text depends on: the hash of each source document
+    (None if missing) and a hash of its prompt spec, the project title and the model.
+    """
+    spec = json.dumps([section["title"], section["instructions"], section["max_tokens"], project_title, model_name])
+    return {
+        "sources": {name: text_hash(file_contents[name]) if name in file_contents else None
+                    for name in section["sources"]},
+        "spec": text_hash(spec),
+    }
+
+def load_sections_manifest(path: Path) -> Dict[str, dict]:
+    """Returns {section title: {"inputs": ..., "body": ...}} from the manifest ({} if missing or stale)."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get("version") != SECTIONS_MANIFEST_VERSION:
+        return {}
+    return data.get("sections", {})
+
+def save_sections_manifest(path: Path, sections: Dict[str, dict]) -> None:
+    """Writes the manifest atomically (temp file + rename)."""
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({"version": SECTIONS_MANIFEST_VERSION, "sections": sections}, f, indent=1)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"Could not save {path}: {e}")
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+
+def splice_sections(proposal: str, bodies: Dict[str, str]) -> Optional[str]:
+    """
+    Replaces the body under each "## N. Title" heading named in bodies, keeping
+    everything else in proposal as is. Returns None if a heading can't be found.
+    """
+    headings = list(re.finditer(r"^## \d+\. (.+?)[ \t]*$", proposal, re.MULTILINE))
+    spans = {}
+    for i, match in enumerate(headings):
+        end = headings[i + 1].start() if i + 1 < len(headings) else len(proposal)
+        spans[match.group(1)] = (match.end(), end)
+    if any(title not in spans for title in bodies):
+        return None
+    parts, pos = [], 0
+    for title, (start, end) in sorted(((t, spans[t]) for t in bodies), key=lambda item: item[1][0]):
+        trailing = "\n\n" if end < len(proposal) else "\n"
+        parts += [proposal[pos:start], f"\n\n{bodies[title]}{trailing}"]
+        pos = end
+    parts.append(proposal[pos:])
+    return "".join(parts)
+
+def generate_sectioned_proposal(client, file_contents: Dict[str, str], project_title: str,
+                                max_concurrency: int = len(PROPOSAL_SECTIONS),
+                                output_folder: Optional[Path] = None, full: bool = False) -> str:
+    """
+    --sections mode: parallel per-section calls, then one short stitching call
+    whose terminology map is applied to the newly generated section bodies.
+
+    With output_folder, only sections whose inputs changed since the last run
+    (per SECTIONS_MANIFEST) are regenerated and spliced into the existing
+    proposal there; full=True regenerates everything.
+    """
+    manifest_path = output_folder / SECTIONS_MANIFEST if output_folder else None
+    proposal_path = output_folder / PROPOSAL_NAME if output_folder else None
+    previous = {} if full or manifest_path is None else load_sections_manifest(manifest_path)
+    existing = read_file_content(proposal_path) if proposal_path and proposal_path.exists() else None
+
+    inputs = {section["title"]: section_inputs(section, file_contents, project_title, client.model_name)
+              for section in PROPOSAL_SECTIONS}
+    stale = []
+    for section in PROPOSAL_SECTIONS:
+        known = previous.get(section["title"])
+        if known and known.get("inputs") == inputs[section["title"]]:
+            continue
+        if known:
+            old_sources = known.get("inputs", {}).get("sources", {})
+            changed = [name for name, digest in inputs[section["title"]]["sources"].items()
+                       if old_sources.get(name) != digest] or ["prompt, title or model"]
+            print(f"Regenerating '{section['title']}' (changed: {', '.join(changed)})")
+        stale.append(section)
+
+    if not stale and existing is not None:
+        print(f"All {len(PROPOSAL_SECTIONS)} sections are up to date; nothing to regenerate.")
+        return existing
+
+    started = time.time()
+    new_bodies = run_sync(agenerate_sections(client, file_contents, project_title, max_concurrency, stale))
+    print(f"{len(new_bodies)} of {len(PROPOSAL_SECTIONS)} sections generated in {time.time() - started:.1f}s")
+    sections = {title: new_bodies[title] if title in new_bodies else previous[title]["body"] for title in inputs}
+
+    stitch_messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prepare_stitch_prompt(sections, project_title)},
+    ]
+    mapping = parse_terminology_map(client.run(stitch_messages, max_tokens=STITCH_MAX_TOKENS))
+    print(f"Stitching pass: unified {len(mapping)} term(s)")
+    # Only the new bodies are mapped: kept bodies were mapped when they were generated,
+    # and the rest of an existing proposal (title, edits outside sections) stays as is
+    new_bodies = {title: apply_terminology(body, mapping) for title, body in new_bodies.items()}
+    sections.update(new_bodies)
+
+    proposal = None
+    if existing is not None and len(new_bodies) < len(sections):
+        proposal = splice_sections(existing, new_bodies)
+        if proposal is None:
+            print(f"Section headings in {PROPOSAL_NAME} changed; rebuilding the whole proposal.")
+    if proposal is None:
+        proposal = assemble_proposal(sections, project_title)
+
+    if manifest_path is not None:
+        save_sections_manifest(manifest_path, {title: {"inputs": inputs[title], "body": sections[title]}
+                                               for title in sections})
+    return proposal
 
 def save_proposal(content: str, output_path: Path) -> None:
     """Save the generated proposal to a file."""
@@ -122,22 +441,58 @@ def check_environment_variables():
         print(f"✓ DEEPSEEK_API_KEY is set: {key_preview}")
     else:
         print("❌ DEEPSEEK_API_KEY is not set in environment variables")
-        
-    # List all environment variables (for debugging)
-    print("\nDebug: All environment variable names:")
-    for i, (key, _) in enumerate(os.environ.items()):
-        print(f"  {key}")
-        if i >= 20:  # Limit to first 20 to avoid overwhelming output
-            print(f"  ... and {len(os.environ) - 20} more")
-            break
-
-def generate_ai_proposal(model: str = "claude") -> None:
+
+def get_proposal_client(model: str, max_tokens: Optional[int] = None):
+    """
+    Returns (client, max_tokens for a single-call proposal) for 'claude' or 'deepseek',
+    or None after printing why the model can't be used. max_tokens defaults to
+    PROPOSAL_MAX_TOKENS, else to the model's entry in DEFAULT_PROPOSAL_MAX_TOKENS.
+    """
+    if model.lower() == "claude":
+        print("Using Claude 3.7 Sonnet to generate research proposal...")
+        client, missing_key, env_var = Claude37SonnetClient(), "missing-api-key", "ANTHROPIC_API_KEY"
+    elif model.lower() == "deepseek":
+        print("Using DeepSeek R1 to generate research proposal...")
+        client, missing_key, env_var = DeepseekR1Client(), "missing-deepseek-key", "DEEPSEEK_API_KEY"
+    else:
+        print(f"Error: Unsupported model '{model}'. Please use 'claude' or 'deepseek'.")
+        return None
+    if max_tokens is None:
+        max_tokens = int(os.environ.get("PROPOSAL_MAX_TOKENS") or DEFAULT_PROPOSAL_MAX_TOKENS[model.lower()])
+
+    # Print the API key status (just the beginning and end for security)
+    api_key = client.api_key
+    cassette = get_cassette()
+    if cassette is not None and cassette.replaying:
+        print(f"Replaying LLM calls from {cassette.path}")
+        return client, max_tokens
+    if api_key == missing_key:
+        print(f"\nERROR: API key is set to the default '{missing_key}' value.")
+        print(f"Please ensure {env_var} is correctly set in your .env file.")
+        return None
+
+    masked_key = api_key[:6] + "..." + api_key[-4:] if len(api_key) > 10 else "***"
+    print(f"Using API key: {masked_key}")
+    return client, max_tokens
+
+def generate_ai_proposal(model: str = "claude", sections: bool = False,
+                         max_concurrency: int = len(PROPOSAL_SECTIONS), full: bool = False,
+                         max_tokens: Optional[int] = None) -> None:
     """
     Generate a research proposal using AI.
     
     Args:
         model: The AI model to use ('claude' or 'deepseek')
+        sections: Generate the sections in parallel and stitch them (see PROPOSAL_SECTIONS)
+        max_concurrency: Maximum section calls in flight in sections mode
+        full: In sections mode, regenerate every section even if its inputs are unchanged
+        max_tokens: Output budget of the single-call proposal (see get_proposal_client)
     """
+    with span("generate_ai_proposal", cat="run", model=model, sections=sections):
+        _generate_ai_proposal(model, sections, max_concurrency, full, max_tokens)
+
+def _generate_ai_proposal(model: str, sections: bool, max_concurrency: int, full: bool,
+                          max_tokens: Optional[int] = None) -> None:
     # Check environment variables
     check_environment_variables()
     
@@ -161,8 +516,13 @@ def generate_ai_proposal(model: str = "claude") -> None:
     # Get project title
     project_title = get_project_title(doc_folder)
     
-    # Prepare the prompt
-    prompt = prepare_prompt(file_contents, project_title)
+    # Prepare the prompt(s)
+    if sections:
+        prompt = "\n\n".join(f"##### Section: {section['title']} #####\n"
+                              f"{prepare_section_prompt(section, file_contents, project_title)}"
+                              for section in PROPOSAL_SECTIONS)
+    else:
+        prompt = prepare_prompt(file_contents, project_title)
     
     # Save the prompt for reference
     with open(output_folder / "ai_prompt.txt", 'w', encoding='utf-8') as f:
@@ -172,70 +532,36 @@ def generate_ai_proposal(model: str = "claude") -> None:
     # Call the appropriate AI client directly with the correct method
     ai_response = None
     try:
-        if model.lower() == "claude":
-            print("Using Claude 3.7 Sonnet to generate research proposal...")
-            claude = Claude37SonnetClient()
-            
-            # Print the API key status (just the beginning and end for security)
-            api_key = claude.api_key
-            if api_key == "missing-api-key":
-                print("\nERROR: API key is set to the default 'missing-api-key' value.")
-                print("Please ensure ANTHROPIC_API_KEY is correctly set in your .env file.")
-                return
-            
-            masked_key = api_key[:6] + "..." + api_key[-4:] if len(api_key) > 10 else "***"
-            print(f"Using API key: {masked_key}")
-            
-            # Format the messages correctly for the run method
-            messages = [
-                {"role": "system", "content": "You are an expert academic researcher and writer specializing in creating comprehensive research proposals."},
-                {"role": "user", "content": prompt}
-            ]
-            
-            # Call the run method directly with messages
-            ai_response = claude.run(messages, max_tokens=20000)
-            
-        elif model.lower() == "deepseek":
-            print("Using DeepSeek R1 to generate research proposal...")
-            deepseek = DeepseekR1Client()
-            
-            # Print the API key status (just the beginning and end for security)
-            api_key = deepseek.api_key
-            if api_key == "missing-deepseek-key":
-                print("\nERROR: API key is set to the default 'missing-deepseek-key' value.")
-                print("Please ensure DEEPSEEK_API_KEY is correctly set in your .env file.")
-                return
-                
-            masked_key = api_key[:6] + "..." + api_key[-4:] if len(api_key) > 10 else "***"
-            print(f"Using API key: {masked_key}")
-            
+        selected = get_proposal_client(model, max_tokens)
+        if selected is None:
+            return
+        client, max_tokens = selected
+
+        if sections:
+            ai_response = generate_sectioned_proposal(client, file_contents, project_title, max_concurrency,
+                                                      output_folder=output_folder, full=full)
+        else:
             # Format the messages correctly for the run method
             messages = [
-                {"role": "system", "content": "You are an expert academic researcher and writer specializing in creating comprehensive research proposals."},
+                {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": prompt}
             ]
-            
+
             # Call the run method directly with messages
-            ai_response = deepseek.run(messages, max_tokens=8000)
-            
-        else:
-            print(f"Error: Unsupported model '{model}'. Please use 'claude' or 'deepseek'.")
-            return
+            ai_response = client.run(messages, max_tokens=max_tokens)
             
+    except LLMError as e:
+        print(f"AI API returned an error: {e}")
+        print("\nPlease run cursor_proposal_generator.py instead")
+        return
     except Exception as e:
         print(f"Error calling AI API: {e}")
         print("\nSuggestion: Use cursor_proposal_generator.py instead which doesn't require API keys")
         return
     
     if ai_response:
-        # Check if the response is an error message
-        if ai_response.startswith("ERROR from"):
-            print(f"AI API returned an error: {ai_response}")
-            print("\nPlease run cursor_proposal_generator.py instead")
-            return
-            
         # Save the generated proposal
-        save_proposal(ai_response, output_folder / "ai_research_proposal.md")
+        save_proposal(ai_response, output_folder / PROPOSAL_NAME)
         print("Success! Research proposal generated successfully.")
     else:
         print("Failed to generate research proposal.")
@@ -245,6 +571,29 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Generate an AI-written research proposal")
     parser.add_argument('--model', choices=['claude', 'deepseek'], default='claude', 
                         help='AI model to use (claude or deepseek)')
+    parser.add_argument('--sections', action='store_true',
+                        help='Generate the proposal sections as parallel calls, then unify their terminology')
+    parser.add_argument('--concurrency', type=int, default=len(PROPOSAL_SECTIONS),
+                        help='Maximum parallel section calls with --sections')
+    parser.add_argument('--full', action='store_true',
+                        help='With --sections, regenerate every section instead of only those whose documents changed')
+    parser.add_argument('--max-tokens', type=int,
+                        help='Output token budget of the single-call proposal '
+                             '(default PROPOSAL_MAX_TOKENS, else 20000 for claude / 8000 for deepseek)')
+    parser.add_argument('--trace-out', help='Write a Chrome trace of the run to this JSON file (open in ui.perfetto.dev)')
+    parser.add_argument('--record-cassette', help='Record every LLM call and its timing to this cassette file')
+    parser.add_argument('--replay-cassette', help='Serve LLM calls from this cassette file instead of the network')
+    parser.add_argument('--replay-latency', action='store_true',
+                        help='With --replay-cassette, replay at the recorded latencies instead of full speed')
     args = parser.parse_args()
+    if args.trace_out:
+        enable_tracing(args.trace_out)
+    if args.record_cassette:
+        use_cassette(args.record_cassette, RECORD)
+    elif args.replay_cassette:
+        use_cassette(args.replay_cassette, REPLAY, recorded_timing=args.replay_latency)
     
-    generate_ai_proposal(args.model) 
\ No newline at end of file
+    generate_ai_proposal(args.model, sections=args.sections, max_concurrency=args.concurrency, full=args.full,
+                         max_tokens=args.max_tokens)
+    if get_cassette() is not None:
+        print(get_cassette().describe()) 
\ No newline at end of file
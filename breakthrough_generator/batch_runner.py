@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+batch_runner.py
+
+Headless batch mode: runs many domain challenges through the Breakthrough-Idea
+Walkthrough concurrently on one event loop.
+
+Input is a JSONL file, one job per line:
+  {"id": "optional-job-id", "challenge": "Describe the domain or challenge...", "model": "deepseekr1"}
+("vision" is accepted as an alias for "challenge"; "model" defaults to --model.)
+
+Each job writes into its own isolated directory, <output-dir>/<job-id>/some_project/,
+and the batch ends with <output-dir>/summary.json listing per-job status and timings.
+
+With --message-batches, jobs advance in lockstep instead: every step whose inputs
+are ready is run for all jobs at once, with Claude calls submitted as a single
+Anthropic Message Batch (half price, bulk throughput, but minutes to hours per
+round). Results are fanned back into each job's step outputs before the next
+round. Meant for overnight runs of many challenges.
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from ai_clients import AIOrchestrator
+from context_manager import DEFAULT_INPUT_TOKEN_BUDGET, StepContextManager
+from metrics import get_metrics
+from orchestrator import (DEFAULT_STEP_MAX_TOKENS, STEPS, aapply_step_output, aprepare_outputs, build_step_request,
+                          observe_step, orchestrator_for_step, read_project_files, run_walkthrough_async)
+from step_scheduler import step_dependencies
+
+
+def load_jobs(path: str) -> List[Dict]:
+    """
+    Reads the JSONL job file. Blank lines are skipped; jobs without an id get "job-<line>".
+    """
+    jobs = []
+    seen = set()
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            job = json.loads(line)
+            challenge = job.get("challenge") or job.get("vision")
+            if not challenge:
+                raise ValueError(f"Line {line_no}: job has no 'challenge'")
+            job_id = re.sub(r"[^A-Za-z0-9._-]+", "_", str(job.get("id", f"job-{line_no}")))
+            if job_id in seen:
+                raise ValueError(f"Line {line_no}: duplicate job id {job_id!r}")
+            seen.add(job_id)
+            jobs.append({"id": job_id, "challenge": challenge, "model": job.get("model")})
+    return jobs
+
+
+async def run_job(job: Dict, output_dir: Path, default_model: str, semaphore: asyncio.Semaphore,
+                  fan_out: bool = False, debug_io: bool = False) -> Dict:
+    """
+    Runs one walkthrough in its own project directory and returns its summary record.
+    """
+    async with semaphore:
+        project_dir = output_dir / job["id"] / "some_project"
+        (project_dir / "doc").mkdir(parents=True, exist_ok=True)
+        model_name = job["model"] or default_model
+        record = {"id": job["id"], "model": model_name, "project_dir": str(project_dir)}
+        started = time.perf_counter()
+        print(f"[{job['id']}] started ({model_name})")
+        try:
+            orchestrator = AIOrchestrator(model_name)
+            file_map = read_project_files(str(project_dir))
+            # Same context handling as an interactive run's defaults
+            context_manager = StepContextManager(input_token_budget=DEFAULT_INPUT_TOKEN_BUDGET,
+                                                 archive_dir=str(project_dir / "reasoning"))
+            scheduler = await run_walkthrough_async(
+                orchestrator, job["challenge"], str(project_dir), file_map,
+                debug_io=debug_io, fan_out=fan_out, context_manager=context_manager, prompt_cache=True,
+            )
+            path, _ = scheduler.critical_path()
+            record.update({
+                "status": "ok",
+                "step_seconds": {str(i): round(d, 3) for i, d in sorted(scheduler.durations().items())},
+                "critical_path": path,
+            })
+        except Exception as e:
+            record.update({"status": "error", "error": f"{type(e).__name__}: {e}"})
+        record["seconds"] = round(time.perf_counter() - started, 3)
+        print(f"[{job['id']}] {record['status']} in {record['seconds']:.1f}s")
+        return record
+
+
+async def run_batch(jobs: List[Dict], output_dir: Path, default_model: str, concurrency: int,
+                    fan_out: bool = False, debug_io: bool = False) -> Dict:
+    """
+    Runs all jobs with at most `concurrency` walkthroughs in flight, and writes summary.json.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+    records = await asyncio.gather(*(
+        run_job(job, output_dir, default_model, semaphore, fan_out=fan_out, debug_io=debug_io)
+        for job in jobs
+    ))
+    summary = {
+        "jobs": len(records),
+        "ok": sum(1 for r in records if r["status"] == "ok"),
+        "failed": sum(1 for r in records if r["status"] != "ok"),
+        "concurrency": concurrency,
+        "seconds": round(time.perf_counter() - started, 3),
+        "results": records,
+    }
+    with open(output_dir / "summary.json", 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def step_rounds(steps: List[Dict]) -> List[List[int]]:
+    """
+    Groups 1-based step indices into rounds: each round holds every step whose
+    {stepN} inputs were all produced by earlier rounds.
+    """
+    deps = step_dependencies(steps)
+    done = set()
+    rounds = []
+    while len(done) < len(steps):
+        ready = [i for i in sorted(deps) if i not in done and deps[i] <= done]
+        rounds.append(ready)
+        done.update(ready)
+    return rounds
+
+
+async def run_lockstep(jobs: List[Dict], output_dir: Path, default_model: str, poll_interval: float = None,
+                       debug_io: bool = False) -> Dict:
+    """
+    Message Batches mode: advances all jobs through STEPS round by round (see step_rounds).
+    Each round's calls are grouped by model and sent with AIOrchestrator.acall_llm_batch,
+    i.e. one Message Batch per round for Claude. A job whose call fails stops there;
+    the others carry on. Writes summary.json like run_batch.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    started = time.perf_counter()
+    base_orchestrators = {}
+    states = []
+    for job in jobs:
+        project_dir = output_dir / job["id"] / "some_project"
+        (project_dir / "doc").mkdir(parents=True, exist_ok=True)
+        model_name = job["model"] or default_model
+        if model_name not in base_orchestrators:
+            base_orchestrators[model_name] = AIOrchestrator(model_name)
+        states.append({
+            "job": job,
+            "orchestrator": base_orchestrators[model_name],
+            "project_dir": project_dir,
+            "file_map": read_project_files(str(project_dir)),
+            "step_outputs": {},
+            "apply_lock": asyncio.Lock(),
+            "context_manager": StepContextManager(input_token_budget=DEFAULT_INPUT_TOKEN_BUDGET,
+                                                  archive_dir=str(project_dir / "reasoning")),
+            "record": {"id": job["id"], "model": model_name, "project_dir": str(project_dir), "status": "ok"},
+        })
+
+    round_seconds = []
+    try:
+        for round_no, indices in enumerate(step_rounds(STEPS), start=1):
+            active = [state for state in states if state["record"]["status"] == "ok"]
+            if not active:
+                break
+            round_started = time.perf_counter()
+            # model -> (orchestrator, {(job position, step index): acall_llm kwargs})
+            groups = {}
+            for position, state in enumerate(states):
+                if state["record"]["status"] != "ok":
+                    continue
+                for index in indices:
+                    step = STEPS[index - 1]
+                    prompt_outputs = await aprepare_outputs(index, step, state["job"]["challenge"],
+                                                            state["step_outputs"], state["context_manager"])
+                    system_prompt, user_prompt, prompt_prefix = build_step_request(step, state["job"]["challenge"],
+                                                                                   prompt_outputs)
+                    orchestrator = orchestrator_for_step(state["orchestrator"], step)
+                    groups.setdefault(orchestrator.model_name, (orchestrator, {}))[1][(position, index)] = {
+                        "system_prompt": system_prompt, "user_prompt": user_prompt, "prompt_prefix": prompt_prefix,
+                        "max_tokens": step.get("max_tokens", DEFAULT_STEP_MAX_TOKENS),
+                        "thinking_budget": step.get("thinking_budget"),
+                    }
+            print(f"\n=== Round {round_no}: steps {indices} for {len(active)} job(s) ===")
+            outcomes = {}
+            results = await asyncio.gather(*(
+                orchestrator.acall_llm_batch(calls, poll_interval=poll_interval)
+                for orchestrator, calls in groups.values()
+            ), return_exceptions=True)
+            for (orchestrator, calls), result in zip(groups.values(), results):
+                if isinstance(result, BaseException):
+                    if not isinstance(result, Exception):
+                        raise result
+                    # Creating or polling the batch failed: every call in it fails, other models' calls don't
+                    print(f"Batch for {orchestrator.model_name} failed: {type(result).__name__}: {result}")
+                    result = dict.fromkeys(calls, result)
+                outcomes.update(result)
+
+            applies = []
+            for (position, index), outcome in sorted(outcomes.items()):
+                state = states[position]
+                record = state["record"]
+                if record["status"] != "ok":
+                    continue
+                if isinstance(outcome, Exception):
+                    record.update({"status": "error", "error": f"step {index}: {type(outcome).__name__}: {outcome}"})
+                    print(f"[{record['id']}] failed at step {index}: {outcome}")
+                    continue
+                applies.append((state, index, outcome))
+
+            async def apply(state: Dict, index: int, outcome: str):
+                step = STEPS[index - 1]
+                applied = time.time()
+                try:
+                    written = await aapply_step_output(str(state["project_dir"]), step, outcome, state["file_map"],
+                                                       state["apply_lock"], debug_io=debug_io)
+                except Exception as e:
+                    state["record"].update({"status": "error", "error": f"step {index}: {type(e).__name__}: {e}"})
+                    print(f"[{state['record']['id']}] failed writing step {index}: {e}")
+                    return
+                observe_step(step, orchestrator_for_step(state["orchestrator"], step).model_name, applied,
+                             state["file_map"], written)
+                state["step_outputs"][index] = outcome
+
+            # Parsing and file writes of different jobs overlap on worker threads
+            await asyncio.gather(*(apply(*item) for item in applies))
+            round_seconds.append(round(time.perf_counter() - round_started, 3))
+            print(f"Round {round_no} done in {round_seconds[-1]:.1f}s")
+    finally:
+        # Written even if a round raised, so finished jobs are still accounted for
+        elapsed = round(time.perf_counter() - started, 3)
+        records = []
+        for state in states:
+            state["record"]["seconds"] = elapsed
+            state["record"]["steps_completed"] = len(state["step_outputs"])
+            records.append(state["record"])
+        summary = {
+            "jobs": len(records),
+            "ok": sum(1 for r in records if r["status"] == "ok"),
+            "failed": sum(1 for r in records if r["status"] != "ok"),
+            "mode": "message_batches",
+            "round_seconds": round_seconds,
+            "seconds": elapsed,
+            "results": records,
+        }
+        with open(output_dir / "summary.json", 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many domain challenges through the walkthrough concurrently")
+    parser.add_argument('jobs', help='JSONL file with one {"challenge": ...} object per line')
+    parser.add_argument('--model', choices=['claude37sonnet', 'deepseekr1'], default='claude37sonnet',
+                        help='Model for jobs that do not specify one')
+    parser.add_argument('--concurrency', type=int, default=4, help='Maximum walkthroughs in flight')
+    parser.add_argument('--output-dir', default='batch_runs', help='Directory for per-job projects and summary.json')
+    parser.add_argument('--fan-out', action='store_true', help='Deep-dive each Step 2 solution in parallel')
+    parser.add_argument('--debug-io', action='store_true', help='Print per-file DEBUG write verification')
+    parser.add_argument('--message-batches', action='store_true',
+                        help='Advance all jobs in lockstep, one Anthropic Message Batch per round')
+    parser.add_argument('--poll-interval', type=float, default=None,
+                        help='Seconds between Message Batch status polls (default ANTHROPIC_BATCH_POLL_SECONDS or 30)')
+    parser.add_argument('--metrics-out', help='Write call/step metrics here (.prom = Prometheus text, else JSON lines)')
+    args = parser.parse_args()
+
+    jobs = load_jobs(args.jobs)
+    if not jobs:
+        print(f"No jobs found in {args.jobs}")
+        sys.exit(1)
+
+    output_dir = Path(args.output_dir)
+    if args.message_batches:
+        if args.fan_out:
+            print("--fan-out is not supported with --message-batches; running step 3 as a single call.")
+        print(f"Running {len(jobs)} job(s) in lockstep with message batches into {output_dir}/")
+        summary = asyncio.run(run_lockstep(jobs, output_dir, args.model, poll_interval=args.poll_interval,
+                                           debug_io=args.debug_io))
+    else:
+        print(f"Running {len(jobs)} job(s) with concurrency {args.concurrency} into {output_dir}/")
+        summary = asyncio.run(run_batch(
+            jobs, output_dir, args.model, max(1, args.concurrency),
+            fan_out=args.fan_out, debug_io=args.debug_io,
+        ))
+
+    print("\n=== Batch Summary ===")
+    for record in summary["results"]:
+        detail = record.get("error", "")
+        print(f"  {record['id']}: {record['status']} ({record['seconds']:.1f}s) {detail}")
+    print(f"{summary['ok']}/{summary['jobs']} succeeded in {summary['seconds']:.1f}s")
+    print(f"Summary written to {output_dir / 'summary.json'}")
+    print(get_metrics().summary())
+    if args.metrics_out:
+        get_metrics().write(args.metrics_out)
+        print(f"Metrics written to {args.metrics_out}")
+    sys.exit(0 if summary["failed"] == 0 else 2)
+
+
+if __name__ == "__main__":
+    main()
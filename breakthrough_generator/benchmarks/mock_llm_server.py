@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+mock_llm_server.py
+
+A local stand-in for the LLM providers, so the pipeline's own overhead can be
+measured offline. It speaks enough of two protocols for the SDKs in ai_clients.py:
+
+  - Anthropic Messages:     POST /v1/messages           (JSON or SSE streaming)
+  - Anthropic Message Batches: POST /v1/messages/batches,
+                             GET /v1/messages/batches/<id>[/results]
+  - OpenAI chat completions: POST /chat/completions,
+                             POST /v1/chat/completions   (JSON or SSE streaming)
+
+Point the clients at it with:
+  ANTHROPIC_BASE_URL=http://127.0.0.1:<port>  DEEPSEEK_BASE_URL=http://127.0.0.1:<port>
+
+Responses are synthetic, but shaped like walkthrough output. Each one has
+"Solution A/B/C" sections (so fan-out has something to split) and one
+"=== File: doc/MOCK_<n>.md ===" block (so the parser and writer have work).
+
+Knobs: time to first byte, tokens per second, response size, and the share of
+requests that fail with 429 (Retry-After: 0) or 500. A message batch stays
+"in_progress" for batch_latency seconds; its failed requests come back as
+"errored" results instead of HTTP errors. GET /stats returns
+request and error counters (and when the first request arrived) as JSON.
+"""
+
+import argparse
+import datetime
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Tokens per streamed delta
+CHUNK_TOKENS = 8
+
+
+class MockConfig:
+    def __init__(self, latency: float = 0.05, tokens_per_second: float = 0.0, response_tokens: int = 600,
+                 rate_429: float = 0.0, rate_500: float = 0.0, seed: int = None, batch_latency: float = 0.5):
+        self.latency = latency
+        # 0 means "as fast as possible"
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.rate_429 = rate_429
+        self.rate_500 = rate_500
+        self.random = random.Random(seed)
+        self.batch_latency = batch_latency
+
+
+def synthetic_response(request_no: int, response_tokens: int):
+    """
+    Returns (reasoning, answer) of roughly response_tokens tokens (~4 characters each).
+    """
+    filler = "The mechanism couples sensing, actuation and feedback in an unusual loop. "
+    target = max(1, response_tokens) * 4
+    body = (filler * (target // len(filler) + 1))[:target]
+    third = len(body) // 3
+    answer = (
+        f"Solution A: {body[:third]}\n\n"
+        f"Solution B: {body[third:2 * third]}\n\n"
+        f"=== File: doc/MOCK_{request_no}.md ===\n"
+        f"# Mock artifact {request_no}\n\nSolution C: {body[2 * third:]}\n"
+    )
+    return "Weighing options against the constraints.", answer
+
+
+def anthropic_message(config: MockConfig, body: dict, request_no: int, prompt_tokens: int) -> dict:
+    """
+    A complete (non-streamed) Anthropic Messages response for a request body.
+    """
+    thinking, answer = synthetic_response(request_no, config.response_tokens)
+    thinking_on = (body.get("thinking") or {}).get("type") == "enabled"
+    content = [{"type": "thinking", "thinking": thinking, "signature": "mock"}] if thinking_on else []
+    content.append({"type": "text", "text": answer})
+    return {
+        "id": f"msg_mock_{request_no}", "type": "message", "role": "assistant",
+        "model": body.get("model", "mock"), "content": content,
+        "stop_reason": "end_turn", "stop_sequence": None,
+        "usage": {"input_tokens": prompt_tokens,
+                  "output_tokens": len(answer) // 4 + (len(thinking) // 4 if thinking_on else 0),
+                  "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0},
+    }
+
+
+def _iso(ts: float) -> str:
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).isoformat()
+
+
+def _chunks(text: str):
+    size = CHUNK_TOKENS * 4
+    for i in range(0, len(text), size):
+        yield text[i:i + size]
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "MockLLM/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    # -- plumbing ---------------------------------------------------------
+
+    def _send_json(self, status: int, payload: dict, headers: dict = None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _start_sse(self):
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("cache-control", "no-cache")
+        self.send_header("connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+    def _sse(self, data: dict, event: str = None):
+        prefix = f"event: {event}\n" if event else ""
+        self.wfile.write(f"{prefix}data: {json.dumps(data)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def _pace(self, tokens: int):
+        rate = self.server.config.tokens_per_second
+        if rate > 0:
+            time.sleep(tokens / rate)
+
+    def _injected_error(self, anthropic_style: bool) -> bool:
+        config = self.server.config
+        roll = config.random.random()
+        if roll < config.rate_429:
+            status, kind, headers = 429, "rate_limit_error", {"retry-after": "0"}
+        elif roll < config.rate_429 + config.rate_500:
+            status, kind, headers = 500, "api_error", {}
+        else:
+            return False
+        self.server.count("errors")
+        if anthropic_style:
+            payload = {"type": "error", "error": {"type": kind, "message": "injected by mock server"}}
+        else:
+            payload = {"error": {"type": kind, "message": "injected by mock server", "code": status}}
+        self._send_json(status, payload, headers)
+        return True
+
+    # -- routes -----------------------------------------------------------
+
+    def do_GET(self):
+        path = self.path.split("?")[0].rstrip("/")
+        if path == "/stats":
+            self._send_json(200, self.server.snapshot())
+        elif "/v1/messages/batches/" in path:
+            batch_id, _, rest = path.split("/v1/messages/batches/", 1)[1].partition("/")
+            batch = self.server.batches.get(batch_id)
+            if batch is None:
+                self._send_json(404, {"type": "error", "error": {"type": "not_found_error",
+                                                                 "message": f"no batch {batch_id}"}})
+            elif rest == "results":
+                self._batch_results(batch)
+            else:
+                self._send_json(200, self._batch_object(batch))
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("content-length", 0))
+        raw = self.rfile.read(length)
+        try:
+            body = json.loads(raw or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": "invalid json"})
+            return
+        if self.path.rstrip("/").endswith("/v1/messages/batches"):
+            self._create_batch(body)
+            return
+        request_no = self.server.count("requests")
+        prompt_tokens = len(raw) // 4 + 1
+        if self.path.rstrip("/").endswith("/v1/messages"):
+            if not self._injected_error(True):
+                self._anthropic(body, request_no, prompt_tokens)
+        elif self.path.rstrip("/").endswith("/chat/completions"):
+            if not self._injected_error(False):
+                self._openai(body, request_no, prompt_tokens)
+        else:
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+
+    def _create_batch(self, body: dict):
+        """
+        Accepts a message batch. Every request is answered (or failed) up front; the
+        batch only reports them once batch_latency has passed.
+        """
+        config = self.server.config
+        results = []
+        for request in body.get("requests", []):
+            request_no = self.server.count("requests")
+            roll = config.random.random()
+            if roll < config.rate_429 + config.rate_500:
+                self.server.count("errors")
+                kind = "rate_limit_error" if roll < config.rate_429 else "api_error"
+                result = {"type": "errored", "error": {"type": "error", "error": {
+                    "type": kind, "message": "injected by mock server"}}}
+            else:
+                params = request.get("params", {})
+                prompt_tokens = len(json.dumps(params)) // 4 + 1
+                result = {"type": "succeeded",
+                          "message": anthropic_message(config, params, request_no, prompt_tokens)}
+            results.append({"custom_id": request.get("custom_id"), "result": result})
+        batch = self.server.add_batch(results)
+        self._send_json(200, self._batch_object(batch))
+
+    def _batch_object(self, batch: dict) -> dict:
+        ended = time.time() >= batch["created"] + self.server.config.batch_latency
+        counts = dict.fromkeys(("processing", "succeeded", "errored", "canceled", "expired"), 0)
+        if ended:
+            for item in batch["results"]:
+                counts[item["result"]["type"]] += 1
+        else:
+            counts["processing"] = len(batch["results"])
+        return {
+            "id": batch["id"], "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": counts,
+            "created_at": _iso(batch["created"]),
+            "expires_at": _iso(batch["created"] + 24 * 3600),
+            "ended_at": _iso(batch["created"] + self.server.config.batch_latency) if ended else None,
+            "cancel_initiated_at": None, "archived_at": None,
+            "results_url": f"{self.server.base_url}/v1/messages/batches/{batch['id']}/results" if ended else None,
+        }
+
+    def _batch_results(self, batch: dict):
+        data = "".join(json.dumps(item) + "\n" for item in batch["results"]).encode("utf-8")
+        self.send_response(200)
+        self.send_header("content-type", "application/binary")
+        self.send_header("content-length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _anthropic(self, body: dict, request_no: int, prompt_tokens: int):
+        config = self.server.config
+        message = anthropic_message(config, body, request_no, prompt_tokens)
+        thinking, answer = synthetic_response(request_no, config.response_tokens)
+        thinking_on = (body.get("thinking") or {}).get("type") == "enabled"
+        usage = message["usage"]
+        output_tokens = usage["output_tokens"]
+        time.sleep(config.latency)
+
+        if not body.get("stream"):
+            self._pace(output_tokens)
+            self._send_json(200, message)
+            return
+
+        self._start_sse()
+        self._sse({"type": "message_start", "message": {
+            "id": f"msg_mock_{request_no}", "type": "message", "role": "assistant",
+            "model": body.get("model", "mock"), "content": [], "stop_reason": None, "stop_sequence": None,
+            "usage": {**usage, "output_tokens": 1},
+        }}, "message_start")
+        blocks = ([("thinking", thinking)] if thinking_on else []) + [("text", answer)]
+        for index, (kind, text) in enumerate(blocks):
+            start = {"type": "thinking", "thinking": "", "signature": ""} if kind == "thinking" \
+                else {"type": "text", "text": ""}
+            self._sse({"type": "content_block_start", "index": index, "content_block": start},
+                      "content_block_start")
+            for piece in _chunks(text):
+                self._pace(CHUNK_TOKENS)
+                delta = {"type": "thinking_delta", "thinking": piece} if kind == "thinking" \
+                    else {"type": "text_delta", "text": piece}
+                self._sse({"type": "content_block_delta", "index": index, "delta": delta}, "content_block_delta")
+            if kind == "thinking":
+                self._sse({"type": "content_block_delta", "index": index,
+                           "delta": {"type": "signature_delta", "signature": "mock"}}, "content_block_delta")
+            self._sse({"type": "content_block_stop", "index": index}, "content_block_stop")
+        self._sse({"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                   "usage": {"output_tokens": output_tokens}}, "message_delta")
+        self._sse({"type": "message_stop"}, "message_stop")
+
+    def _openai(self, body: dict, request_no: int, prompt_tokens: int):
+        config = self.server.config
+        reasoning, answer = synthetic_response(request_no, config.response_tokens)
+        completion_tokens = (len(answer) + len(reasoning)) // 4
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens,
+                 "prompt_cache_hit_tokens": 0, "prompt_cache_miss_tokens": prompt_tokens,
+                 "completion_tokens_details": {"reasoning_tokens": len(reasoning) // 4}}
+        base = {"id": f"chatcmpl-mock-{request_no}", "created": int(time.time()), "model": body.get("model", "mock")}
+        time.sleep(config.latency)
+
+        if not body.get("stream"):
+            self._pace(completion_tokens)
+            self._send_json(200, {**base, "object": "chat.completion", "choices": [{
+                "index": 0, "finish_reason": "stop",
+                "message": {"role": "assistant", "content": answer, "reasoning_content": reasoning},
+            }], "usage": usage})
+            return
+
+        self._start_sse()
+        chunk = {**base, "object": "chat.completion.chunk"}
+        for field, text in (("reasoning_content", reasoning), ("content", answer)):
+            for piece in _chunks(text):
+                self._pace(CHUNK_TOKENS)
+                self._sse({**chunk, "choices": [{"index": 0, "delta": {field: piece}, "finish_reason": None}]})
+        self._sse({**chunk, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if (body.get("stream_options") or {}).get("include_usage"):
+            self._sse({**chunk, "choices": [], "usage": usage})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config: MockConfig):
+        super().__init__(address, MockLLMHandler)
+        self.config = config
+        self.counters = {"requests": 0, "errors": 0, "batches": 0}
+        self.batches = {}
+        # time.time() of the first request, for startup-to-first-call measurements
+        self.first_request_at = None
+        self._lock = threading.Lock()
+
+    def count(self, name: str) -> int:
+        with self._lock:
+            if name == "requests" and self.first_request_at is None:
+                self.first_request_at = time.time()
+            self.counters[name] += 1
+            return self.counters[name]
+
+    def add_batch(self, results: list) -> dict:
+        batch_no = self.count("batches")
+        batch = {"id": f"msgbatch_mock_{batch_no}", "created": time.time(), "results": results}
+        with self._lock:
+            self.batches[batch["id"]] = batch
+        return batch
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.counters, "first_request_at": self.first_request_at}
+
+    def reset(self):
+        with self._lock:
+            self.counters = dict.fromkeys(self.counters, 0)
+            self.batches = {}
+            self.first_request_at = None
+
+    def handle_error(self, request, client_address):
+        # Benchmarks kill clients mid-request; a dropped connection is not worth a traceback
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_mock_server(config: MockConfig = None, host: str = "127.0.0.1", port: int = 0) -> MockLLMServer:
+    """
+    Starts the server on a background thread (port 0 picks a free port) and returns it.
+    Call .shutdown() to stop it.
+    """
+    server = MockLLMServer((host, port), config or MockConfig())
+    threading.Thread(target=server.serve_forever, name="mock-llm-server", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock of the Anthropic and OpenAI-compatible LLM APIs")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds before the first byte')
+    parser.add_argument('--tokens-per-second', type=float, default=0.0, help='Generation speed (0 = unthrottled)')
+    parser.add_argument('--response-tokens', type=int, default=600, help='Approximate answer size in tokens')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='Fraction of requests answered with 429')
+    parser.add_argument('--rate-500', type=float, default=0.0, help='Fraction of requests answered with 500')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--batch-latency', type=float, default=0.5,
+                        help='Seconds a message batch stays in progress')
+    args = parser.parse_args()
+
+    config = MockConfig(args.latency, args.tokens_per_second, args.response_tokens,
+                        args.rate_429, args.rate_500, args.seed, args.batch_latency)
+    server = MockLLMServer((args.host, args.port), config)
+    print(f"Mock LLM server on {server.base_url}")
+    print(f"  export ANTHROPIC_BASE_URL={server.base_url} DEEPSEEK_BASE_URL={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+parser_benchmark.py
+
+Micro-benchmark for StreamingFileParser on synthetic multi-megabyte responses.
+
+For each response size it times:
+  - whole     - parse_ai_response_and_apply(text), the non-streaming path
+  - chunks_N  - parse_ai_response_chunks() with the text cut into N-character
+                chunks, like streamed deltas (small N = many tiny deltas)
+  - lines_*   - the previous line-list parser (split every chunk into lines,
+                buffer them, "\\n".join per file) on the same input, kept here
+                as the reference
+
+and reports MB/s plus the peak Python allocation during the parse (tracemalloc).
+The response text exists before tracing starts, so the peak is the parsed file
+contents plus the parser's own buffers. Each result is also checked against the
+reference parser's file map.
+
+Usage (from breakthrough_generator/):
+  python benchmarks/parser_benchmark.py --sizes-mb 1 8 32 --repeat 3
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+
+from orchestrator import parse_ai_response_and_apply, parse_ai_response_chunks  # noqa: E402
+
+MARKER = "=== File: "
+
+
+def line_list_parse(chunks, file_map: dict):
+    """
+    The line-based parser this benchmark compares against (content only, no ProjectFile).
+    """
+    current, lines, partial = None, [], ""
+
+    def handle(line):
+        nonlocal current, lines
+        if line.startswith(MARKER):
+            if current:
+                file_map[current] = "\n".join(lines)
+            current = line.replace(MARKER, "").strip()
+            if current.endswith("==="):
+                current = current[:-3].rstrip()
+            lines = []
+        else:
+            lines.append(line)
+
+    for chunk in chunks:
+        parts = (partial + chunk).split("\n")
+        partial = parts.pop()
+        for line in parts:
+            handle(line.rstrip("\r"))
+    if partial:
+        handle(partial.rstrip("\r"))
+    if current:
+        file_map[current] = "\n".join(lines)
+
+
+def synthetic_response(size_mb: float, file_kb: int) -> str:
+    line = "- component detail that the step elaborates on, with `code` and **emphasis**\n"
+    body = line * max(1, file_kb * 1024 // len(line))
+    files = max(1, int(size_mb * 1024 * 1024) // len(body))
+    return "Intro text before any file.\n" + "".join(
+        f"=== File: doc/gen/FILE_{i}.md ===\n# File {i}\n{body}" for i in range(files)
+    )
+
+
+def split_chunks(text: str, size: int) -> list:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def measure(parse, repeat: int) -> tuple:
+    """
+    Returns (best seconds, peak traced bytes, file map of the last run).
+    """
+    best = float("inf")
+    peak = 0
+    file_map = {}
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(repeat):
+            file_map = {}
+            started = time.perf_counter()
+            parse(file_map)
+            best = min(best, time.perf_counter() - started)
+        # Memory is measured on a separate run: tracing slows allocation down
+        file_map = {}
+        tracemalloc.start()
+        parse(file_map)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return best, peak, file_map
+
+
+def bench_size(size_mb: float, file_kb: int, chunk_sizes, repeat: int) -> dict:
+    text = synthetic_response(size_mb, file_kb)
+    actual_mb = len(text) / (1024 * 1024)
+    reference = {}
+    line_list_parse([text], reference)
+
+    cases = {
+        "whole": lambda fm: parse_ai_response_and_apply(text, fm),
+        "lines_whole": lambda fm: line_list_parse([text], fm),
+    }
+    chunk_lists = {}
+    for size in chunk_sizes:
+        chunk_lists[size] = split_chunks(text, size)
+        cases[f"chunks_{size}"] = lambda fm, c=chunk_lists[size]: parse_ai_response_chunks(c, fm)
+        cases[f"lines_{size}"] = lambda fm, c=chunk_lists[size]: line_list_parse(c, fm)
+
+    result = {"response_mb": round(actual_mb, 2), "files": len(reference), "cases": {}}
+    for name, parse in cases.items():
+        seconds, peak, file_map = measure(parse, repeat)
+        contents = {k.replace(os.path.sep, "/"): getattr(v, "content", v) for k, v in file_map.items()}
+        if contents != reference:
+            raise RuntimeError(f"{name}: parsed files differ from the reference parser")
+        result["cases"][name] = {
+            "ms": round(seconds * 1000, 2),
+            "mb_per_second": round(actual_mb / seconds, 1) if seconds else 0.0,
+            "peak_alloc_mb": round(peak / (1024 * 1024), 2),
+        }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="StreamingFileParser micro-benchmark")
+    parser.add_argument('--sizes-mb', type=float, nargs='+', default=[1, 8, 32],
+                        help='Synthetic response sizes in MB')
+    parser.add_argument('--file-kb', type=int, default=64, help='Size of each file block in KB')
+    parser.add_argument('--chunk-sizes', type=int, nargs='+', default=[64, 4096],
+                        help='Chunk sizes (characters) for the streaming cases')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per case (best is reported)')
+    parser.add_argument('--json', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    results = []
+    for size_mb in args.sizes_mb:
+        result = bench_size(size_mb, args.file_kb, args.chunk_sizes, max(1, args.repeat))
+        results.append(result)
+        print(f"\n{result['response_mb']:.1f} MB response, {result['files']} files:")
+        print(f"  {'case':<14}{'ms':>10}{'MB/s':>10}{'peak alloc MB':>16}")
+        for name, case in result["cases"].items():
+            print(f"  {name:<14}{case['ms']:>10.1f}{case['mb_per_second']:>10.1f}{case['peak_alloc_mb']:>16.2f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+replay_benchmark.py
+
+Deterministic offline regression runs from a recorded cassette (see cassette.py).
+
+Records one walkthrough (`orchestrator.py --auto-yes`) and one sectioned proposal
+against the mock LLM server (or against the real APIs with --live), then replays
+the same runs from the cassette with the network out of the picture: each replay
+gets a fresh project dir and serves every LLM call from the cassette. Replays at
+full speed measure pure pipeline time (parsing, file I/O, prompt building); with
+--recorded-latency they reproduce the recorded call timings, so scheduling changes
+(parallelism, streaming) can be compared on identical responses.
+
+A replayed run must produce the same files as the recorded one; any difference
+is reported and makes the run exit with 1.
+
+Usage (from breakthrough_generator/):
+  python benchmarks/replay_benchmark.py --runs 5
+  python benchmarks/replay_benchmark.py --cassette run.jsonl.gz --record --latency 1
+  python benchmarks/replay_benchmark.py --cassette run.jsonl.gz --runs 10 --orchestrator-args="--parallel"
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+PACKAGE_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(BENCH_DIR))
+
+from mock_llm_server import MockConfig, start_mock_server  # noqa: E402
+from run_benchmarks import CHALLENGE, mock_env  # noqa: E402
+
+
+def replay_env() -> dict:
+    env = dict(os.environ)
+    env.update({
+        # Nothing should reach the network; an unrecorded call fails instead
+        "ANTHROPIC_BASE_URL": "http://127.0.0.1:9",
+        "DEEPSEEK_BASE_URL": "http://127.0.0.1:9",
+        "LLM_CACHE_DISABLE": "1",
+        "PYTHONDONTWRITEBYTECODE": "1",
+    })
+    env.pop("LLM_CASSETTE", None)
+    return env
+
+
+def tree_digest(project_dir: Path) -> dict:
+    """
+    {relative path: sha256} of the generated files, run bookkeeping excluded.
+    """
+    digests = {}
+    for path in sorted(project_dir.rglob("*")):
+        rel = path.relative_to(project_dir).as_posix()
+        if path.is_file() and not rel.startswith(".") and "/." not in rel:
+            digests[rel] = hashlib.sha256(path.read_bytes()).hexdigest()
+    return digests
+
+
+def run_once(workdir: Path, env: dict, cassette_args, model: str, orchestrator_args, proposal_args) -> dict:
+    """
+    One walkthrough plus one proposal in workdir. Returns the wall time of each.
+    """
+    provider = "deepseek" if model == "deepseekr1" else "claude"
+    commands = {
+        "walkthrough": [sys.executable, str(PACKAGE_DIR / "orchestrator.py"), "--auto-yes", "--no-debug-io",
+                        *cassette_args, *orchestrator_args, model, CHALLENGE],
+        "proposal": [sys.executable, str(PACKAGE_DIR / "ai_proposal_generator.py"), "--model", provider,
+                     *cassette_args, *proposal_args],
+    }
+    timings = {}
+    for name, cmd in commands.items():
+        started = time.perf_counter()
+        proc = subprocess.run(cmd, cwd=workdir, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        timings[name] = time.perf_counter() - started
+        if proc.returncode != 0:
+            raise RuntimeError(f"{name} exited {proc.returncode}:\n{proc.stdout[-2000:]}")
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record a run to a cassette, then replay it offline")
+    parser.add_argument("--cassette", help="Cassette path (default: a temporary file, always recorded)")
+    parser.add_argument("--record", action="store_true", help="Record --cassette even if it already exists")
+    parser.add_argument("--live", action="store_true", help="Record against the real APIs instead of the mock server")
+    parser.add_argument("--runs", type=int, default=3, help="Replays to time")
+    parser.add_argument("--model", default="claude37sonnet")
+    parser.add_argument("--latency", type=float, default=0.5, help="Mock server seconds per call while recording")
+    parser.add_argument("--recorded-latency", action="store_true", help="Replay at the recorded latencies")
+    parser.add_argument("--orchestrator-args", default="", help="Extra orchestrator.py flags, e.g. \"--parallel\"")
+    parser.add_argument("--proposal-args", default="--sections", help="Extra ai_proposal_generator.py flags")
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    orchestrator_args = args.orchestrator_args.split()
+    proposal_args = args.proposal_args.split()
+    scratch = Path(tempfile.mkdtemp(prefix="bench_replay_"))
+    cassette = Path(args.cassette).resolve() if args.cassette else scratch / "cassette.jsonl.gz"
+    results = {}
+    failed = False
+    try:
+        recorded_tree = None
+        if args.record or not cassette.exists():
+            if cassette.exists():
+                cassette.unlink()
+            workdir = scratch / "record"
+            workdir.mkdir()
+            if args.live:
+                env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+                timings = run_once(workdir, env, ["--record-cassette", str(cassette)], args.model,
+                                   orchestrator_args, proposal_args)
+            else:
+                server = start_mock_server(MockConfig(latency=args.latency))
+                try:
+                    timings = run_once(workdir, mock_env(server.base_url), ["--record-cassette", str(cassette)],
+                                       args.model, orchestrator_args, proposal_args)
+                finally:
+                    server.shutdown()
+            results["recorded"] = timings
+            recorded_tree = tree_digest(workdir / "some_project")
+            print(f"Recorded {cassette}: walkthrough {timings['walkthrough']:.2f}s, "
+                  f"proposal {timings['proposal']:.2f}s")
+
+        replay_args = ["--replay-cassette", str(cassette)] + (["--replay-latency"] if args.recorded_latency else [])
+        samples = []
+        for run in range(args.runs):
+            workdir = scratch / f"replay{run}"
+            workdir.mkdir()
+            samples.append(run_once(workdir, replay_env(), replay_args, args.model, orchestrator_args, proposal_args))
+            tree = tree_digest(workdir / "some_project")
+            reference = recorded_tree if recorded_tree is not None else tree
+            recorded_tree = reference
+            changed = sorted(set(tree.items()) ^ set(reference.items()))
+            if changed:
+                failed = True
+                print(f"Replay {run + 1} differs from the reference run in: "
+                      f"{', '.join(sorted({path for path, _ in changed}))}")
+        for name in ("walkthrough", "proposal"):
+            values = [s[name] for s in samples]
+            results[f"replay_{name}"] = {"runs": len(values), "seconds_mean": sum(values) / len(values),
+                                         "seconds_min": min(values)}
+            print(f"Replay {name}: mean {sum(values) / len(values):.2f}s, min {min(values):.2f}s "
+                  f"over {len(values)} run(s)")
+            if "recorded" in results:
+                print(f"  (recorded run: {results['recorded'][name]:.2f}s)")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+run_benchmarks.py
+
+Offline end-to-end benchmarks against the local mock LLM server (mock_llm_server.py).
+
+Suites:
+  walkthrough - runs `orchestrator.py --auto-yes` end to end (subprocess, fresh
+                project dir per run). Reports runs/second, mock LLM time, pipeline
+                overhead per step (step wall time minus LLM time) and startup cost.
+                The per-step overhead only applies to sequential runs. With
+                --parallel / --fan-out, LLM calls overlap and the figure can go
+                negative.
+  proposal    - runs `ai_proposal_generator.py` on a finished walkthrough's docs.
+  parse_write - parses a large multi-file response and flushes it to disk
+                in-process, to isolate parse/write cost (MB/s).
+  scan        - read_project_files on a generated tree of --scan-files files:
+                a cold scan (no manifest) vs. a warm scan (manifest reused).
+
+Every suite reports peak RSS. --json writes the results, and --baseline compares
+them with an earlier --json file. Any time metric that got more than --tolerance
+slower is flagged and makes the run exit with 1.
+
+Usage (from breakthrough_generator/):
+  python benchmarks/run_benchmarks.py --runs 5 --model claude37sonnet --json bench.json
+  python benchmarks/run_benchmarks.py --suite walkthrough --orchestrator-args="--stream" --baseline bench.json
+  python benchmarks/run_benchmarks.py --suite proposal --proposal-args="--sections" --latency 2
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+PACKAGE_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(PACKAGE_DIR))
+sys.path.insert(0, str(BENCH_DIR))
+
+from mock_llm_server import MockConfig, start_mock_server  # noqa: E402
+
+CHALLENGE = "Cut the energy cost of desalination for small coastal towns by half"
+
+
+def mock_env(base_url: str) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "ANTHROPIC_BASE_URL": base_url,
+        "DEEPSEEK_BASE_URL": base_url,
+        "ANTHROPIC_API_KEY": "mock-anthropic-key",
+        "DEEPSEEK_API_KEY": "mock-deepseek-key",
+        "LLM_CACHE_DISABLE": "1",
+        "LLM_RETRY_BASE_DELAY": "0.05",
+        "PYTHONDONTWRITEBYTECODE": "1",
+    })
+    env.pop("LLM_METRICS_JSONL", None)
+    return env
+
+
+def children_peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def self_peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_walkthrough_once(workdir: Path, env: dict, model: str, extra_args) -> dict:
+    """
+    One `orchestrator.py -y` run in workdir. Returns wall time and the split from its metrics file.
+    """
+    metrics_path = workdir / "metrics.jsonl"
+    cmd = [sys.executable, str(PACKAGE_DIR / "orchestrator.py"), "--auto-yes", "--no-debug-io",
+           "--metrics-out", str(metrics_path), *extra_args, model, CHALLENGE]
+    started = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=workdir, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    wall = time.perf_counter() - started
+    if proc.returncode != 0:
+        raise RuntimeError(f"orchestrator.py exited {proc.returncode}:\n{proc.stdout[-2000:]}")
+
+    events = [json.loads(line) for line in metrics_path.read_text(encoding="utf-8").splitlines() if line]
+    llm_seconds = sum(e["seconds"] for e in events if e["type"] == "llm_call")
+    steps = [e for e in events if e["type"] == "step"]
+    step_seconds = sum(e["seconds"] for e in steps)
+    return {
+        "wall": wall,
+        "llm": llm_seconds,
+        "steps": len(steps),
+        "step_total": step_seconds,
+        "bytes_written": sum(e["bytes_written"] for e in steps),
+        "retries": sum(e.get("retries", 0) for e in events if e["type"] == "llm_call"),
+    }
+
+
+def bench_walkthrough(base_url: str, runs: int, model: str, extra_args) -> tuple:
+    env = mock_env(base_url)
+    samples = []
+    last_project = None
+    for _ in range(runs):
+        workdir = Path(tempfile.mkdtemp(prefix="bench_walkthrough_"))
+        samples.append(run_walkthrough_once(workdir, env, model, extra_args))
+        last_project = workdir
+    total_wall = sum(s["wall"] for s in samples)
+    steps = sum(s["steps"] for s in samples) or 1
+    result = {
+        "runs": runs,
+        "runs_per_second": runs / total_wall,
+        "run_seconds_mean": total_wall / runs,
+        "llm_seconds_mean": sum(s["llm"] for s in samples) / runs,
+        "step_overhead_ms": sum(s["step_total"] - s["llm"] for s in samples) / steps * 1000,
+        "startup_and_exit_seconds_mean": sum(s["wall"] - s["step_total"] for s in samples) / runs,
+        "bytes_written_per_run": sum(s["bytes_written"] for s in samples) // runs,
+        "retries": sum(s["retries"] for s in samples),
+        "peak_rss_mb": children_peak_rss_mb(),
+    }
+    return result, last_project
+
+
+def bench_proposal(base_url: str, project_workdir: Path, runs: int, model: str, extra_args=()) -> dict:
+    env = mock_env(base_url)
+    provider = "deepseek" if model == "deepseekr1" else "claude"
+    cmd = [sys.executable, str(PACKAGE_DIR / "ai_proposal_generator.py"), "--model", provider, *extra_args]
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        proc = subprocess.run(cmd, cwd=project_workdir, env=env, stdout=subprocess.PIPE,
+                              stderr=subprocess.STDOUT, text=True)
+        timings.append(time.perf_counter() - started)
+        if proc.returncode != 0 or not (project_workdir / "some_project" / "ai_research_proposal.md").exists():
+            raise RuntimeError(f"ai_proposal_generator.py failed:\n{proc.stdout[-2000:]}")
+    return {
+        "runs": runs,
+        "run_seconds_mean": sum(timings) / runs,
+        "peak_rss_mb": children_peak_rss_mb(),
+    }
+
+
+def bench_parse_write(files: int, file_kb: int, repeat: int) -> dict:
+    from orchestrator import flush_project_files, parse_ai_response_and_apply
+
+    line = "- component detail that the step elaborates on in a list item\n"
+    body = line * (file_kb * 1024 // len(line) + 1)
+    response = "Intro text before any file.\n" + "".join(
+        f"=== File: doc/gen/FILE_{i}.md ===\n# File {i}\n{body}" for i in range(files)
+    )
+    size_mb = len(response.encode("utf-8")) / (1024 * 1024)
+    parse_seconds = 0.0
+    write_seconds = 0.0
+    for _ in range(repeat):
+        root = tempfile.mkdtemp(prefix="bench_parse_write_")
+        file_map = {}
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            started = time.perf_counter()
+            parse_ai_response_and_apply(response, file_map)
+            parse_seconds += time.perf_counter() - started
+        started = time.perf_counter()
+        flush_project_files(root, file_map, debug_io=False)
+        write_seconds += time.perf_counter() - started
+    return {
+        "response_mb": size_mb,
+        "parse_ms": parse_seconds / repeat * 1000,
+        "write_ms": write_seconds / repeat * 1000,
+        "parse_mb_per_second": size_mb * repeat / parse_seconds if parse_seconds else 0.0,
+        "write_mb_per_second": size_mb * repeat / write_seconds if write_seconds else 0.0,
+        "peak_rss_mb": self_peak_rss_mb(),
+    }
+
+
+def bench_scan(files: int, repeat: int) -> dict:
+    from orchestrator import read_project_files
+
+    root = Path(tempfile.mkdtemp(prefix="bench_scan_"))
+    text = "generated project file\n" * 40
+    for i in range(files):
+        path = root / f"dir_{i % 50}" / f"file_{i}.md"
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+    cold = warm = 0.0
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(repeat):
+            (root / ".scan_manifest.json").unlink(missing_ok=True)
+            started = time.perf_counter()
+            read_project_files(str(root))
+            cold += time.perf_counter() - started
+            started = time.perf_counter()
+            read_project_files(str(root))
+            warm += time.perf_counter() - started
+    return {"files": files, "cold_scan_ms": cold / repeat * 1000, "warm_scan_ms": warm / repeat * 1000}
+
+
+# Metrics where larger is worse, compared against --baseline
+TIME_METRICS = ("run_seconds_mean", "step_overhead_ms", "startup_and_exit_seconds_mean", "parse_ms", "write_ms",
+                "cold_scan_ms", "warm_scan_ms")
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for suite, metrics in results.items():
+        for name in TIME_METRICS:
+            old = baseline.get(suite, {}).get(name)
+            new = metrics.get(name)
+            if old and new is not None and new > old * (1 + tolerance):
+                regressions.append(f"{suite}.{name}: {old:.3f} -> {new:.3f} (+{(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks against the mock LLM server")
+    parser.add_argument('--suite', action='append', choices=['walkthrough', 'proposal', 'parse_write', 'scan'],
+                        help='Suite(s) to run (default: all)')
+    parser.add_argument('--model', choices=['claude37sonnet', 'deepseekr1'], default='claude37sonnet')
+    parser.add_argument('--runs', type=int, default=3, help='End-to-end runs per suite')
+    parser.add_argument('--latency', type=float, default=0.0, help='Mock time to first byte (seconds)')
+    parser.add_argument('--tokens-per-second', type=float, default=0.0, help='Mock generation speed (0 = unthrottled)')
+    parser.add_argument('--response-tokens', type=int, default=600, help='Mock response size in tokens')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='Fraction of mock requests failing with 429')
+    parser.add_argument('--rate-500', type=float, default=0.0, help='Fraction of mock requests failing with 500')
+    parser.add_argument('--orchestrator-args', default='',
+                        help='Extra orchestrator.py flags, e.g. --orchestrator-args="--parallel --fan-out"')
+    parser.add_argument('--proposal-args', default='',
+                        help='Extra ai_proposal_generator.py flags, e.g. --proposal-args="--sections"')
+    parser.add_argument('--files', type=int, default=200, help='parse_write: file blocks per response')
+    parser.add_argument('--file-kb', type=int, default=8, help='parse_write: size of each file block')
+    parser.add_argument('--scan-files', type=int, default=5000, help='scan: files in the generated tree')
+    parser.add_argument('--json', help='Write results to this JSON file')
+    parser.add_argument('--baseline', help='Compare against an earlier --json file')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown vs. baseline (0.2 = 20%%)')
+    args = parser.parse_args()
+    suites = args.suite or ['walkthrough', 'proposal', 'parse_write', 'scan']
+
+    server = start_mock_server(MockConfig(args.latency, args.tokens_per_second, args.response_tokens,
+                                          args.rate_429, args.rate_500, seed=1))
+    print(f"Mock LLM server on {server.base_url}")
+    results = {}
+    try:
+        project = None
+        if 'walkthrough' in suites or 'proposal' in suites:
+            runs = args.runs if 'walkthrough' in suites else 1
+            results_walk, project = bench_walkthrough(server.base_url, runs, args.model,
+                                                      args.orchestrator_args.split())
+            if 'walkthrough' in suites:
+                results['walkthrough'] = results_walk
+        if 'proposal' in suites:
+            results['proposal'] = bench_proposal(server.base_url, project, args.runs, args.model,
+                                                 args.proposal_args.split())
+        if 'parse_write' in suites:
+            results['parse_write'] = bench_parse_write(args.files, args.file_kb, max(1, args.runs))
+        if 'scan' in suites:
+            results['scan'] = bench_scan(args.scan_files, max(1, args.runs))
+        results['mock_server'] = server.snapshot()
+    finally:
+        server.shutdown()
+
+    for suite, metrics in results.items():
+        print(f"\n[{suite}]")
+        for name, value in metrics.items():
+            print(f"  {name}: {value:.3f}" if isinstance(value, float) else f"  {name}: {value}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nREGRESSIONS vs. baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\nNo regressions vs. baseline.")
+
+
+if __name__ == "__main__":
+    main()
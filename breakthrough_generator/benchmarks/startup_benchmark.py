@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+startup_benchmark.py
+
+Measures how fast the entry points start:
+
+  - import time of each module (cumulative, from `python -X importtime`)
+  - which provider SDKs get imported by `import orchestrator` (should be none)
+  - `orchestrator.py --help` and `ai_proposal_generator.py --help` wall time
+  - time from launching `orchestrator.py --auto-yes` until its first LLM request
+    reaches the local mock server (mock_llm_server.py), per model
+
+Each figure is the median of --runs runs.
+
+Usage (from breakthrough_generator/):
+  python benchmarks/startup_benchmark.py --runs 5
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+PACKAGE_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(BENCH_DIR))
+
+from mock_llm_server import MockConfig, start_mock_server  # noqa: E402
+from run_benchmarks import CHALLENGE, mock_env  # noqa: E402
+
+MODULES = ("ai_clients", "orchestrator", "ai_proposal_generator", "batch_runner")
+SDK_MODULES = ("anthropic", "openai", "httpx")
+
+
+def import_time_ms(module: str) -> float:
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=PACKAGE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    for line in reversed(proc.stderr.splitlines()):
+        parts = [p.strip() for p in line.split("|")]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1]) / 1000
+    raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+
+def imported_sdks() -> list:
+    code = f"import sys, orchestrator; print(' '.join(m for m in {SDK_MODULES!r} if m in sys.modules))"
+    proc = subprocess.run([sys.executable, "-c", code], cwd=PACKAGE_DIR, stdout=subprocess.PIPE, text=True)
+    return proc.stdout.split()
+
+
+def wall_ms(cmd) -> float:
+    started = time.perf_counter()
+    subprocess.run(cmd, cwd=PACKAGE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return (time.perf_counter() - started) * 1000
+
+
+def first_request_ms(server, model: str) -> float:
+    """
+    Launches a walkthrough and returns ms until the mock server saw its first request.
+    """
+    server.reset()
+    workdir = tempfile.mkdtemp(prefix="bench_startup_")
+    cmd = [sys.executable, str(PACKAGE_DIR / "orchestrator.py"), "--auto-yes", "--no-debug-io", model, CHALLENGE]
+    started = time.time()
+    proc = subprocess.Popen(cmd, cwd=workdir, env=mock_env(server.base_url),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while server.first_request_at is None and proc.poll() is None:
+            time.sleep(0.002)
+    finally:
+        proc.kill()
+        proc.wait()
+    if server.first_request_at is None:
+        raise RuntimeError(f"orchestrator.py ({model}) exited without calling the LLM")
+    return (server.first_request_at - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time and startup-time benchmark")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--json', help='Write results to this JSON file')
+    args = parser.parse_args()
+    runs = max(1, args.runs)
+
+    results = {"import_ms": {}, "help_ms": {}, "first_request_ms": {}}
+    for module in MODULES:
+        results["import_ms"][module] = statistics.median(import_time_ms(module) for _ in range(runs))
+    results["sdks_imported_by_orchestrator"] = imported_sdks()
+    for script in ("orchestrator.py", "ai_proposal_generator.py"):
+        results["help_ms"][script] = statistics.median(
+            wall_ms([sys.executable, script, "--help"]) for _ in range(runs))
+
+    server = start_mock_server(MockConfig(latency=0.0, response_tokens=50))
+    try:
+        for model in ("claude37sonnet", "deepseekr1"):
+            results["first_request_ms"][model] = statistics.median(
+                first_request_ms(server, model) for _ in range(runs))
+    finally:
+        server.shutdown()
+
+    print("Import time (cumulative, median ms):")
+    for module, ms in results["import_ms"].items():
+        print(f"  {module}: {ms:.1f}")
+    print(f"SDKs imported by 'import orchestrator': {', '.join(results['sdks_imported_by_orchestrator']) or 'none'}")
+    print("--help wall time (median ms):")
+    for script, ms in results["help_ms"].items():
+        print(f"  {script}: {ms:.1f}")
+    print("Launch to first LLM request (median ms):")
+    for model, ms in results["first_request_ms"].items():
+        print(f"  {model}: {ms:.1f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+template_benchmark.py
+
+Micro-benchmark for the precompiled prompt templates (prompt_template.py).
+
+For every walkthrough step (and the single-call proposal prompt) it renders the
+prompt from synthetic prior outputs of --output-kb each and times:
+  - replace   - the previous approach, kept here as the reference: one
+                str.replace pass over the template per placeholder (steps),
+                or a chain of += (proposal)
+  - compiled  - build_prompt_parts / prepare_prompt, which render a template
+                parsed once into literal and slot pieces with a single join
+  - compile   - parsing the template from scratch (what a cache miss costs)
+
+Rendered prompts are checked against the reference. The per-slot byte/token
+report of the last step is printed as well.
+
+Usage (from breakthrough_generator/):
+  python benchmarks/template_benchmark.py --output-kb 4 32 128 --repeat 200
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+
+from ai_proposal_generator import FILE_ORDER, prepare_prompt  # noqa: E402
+from orchestrator import CONTEXT_SECTION, STEP_SLOTS, STEPS, build_prompt_parts, prompt_slot_report  # noqa: E402
+from prompt_template import PromptTemplate, describe_report  # noqa: E402
+from step_scheduler import STEP_PLACEHOLDER  # noqa: E402
+
+
+def replace_fill(template: str, user_vision: str, step_outputs: dict) -> str:
+    prompt = template.replace("{vision}", user_vision)
+    for i in sorted({int(n) for n in STEP_PLACEHOLDER.findall(template)}):
+        prompt = prompt.replace(f"{{step{i}}}", step_outputs.get(i, "(No output)"))
+    return prompt
+
+
+def replace_parts(step_info: dict, user_vision: str, step_outputs: dict):
+    """
+    The str.replace-based build_prompt_parts this benchmark compares against.
+    """
+    template = step_info["user_prompt_template"]
+    segments = []
+    pos = 0
+    while True:
+        match = CONTEXT_SECTION.match(template, pos)
+        if not match:
+            break
+        segments.append(replace_fill(match.group(), user_vision, step_outputs))
+        pos = match.end()
+    return segments, replace_fill(template[pos:], user_vision, step_outputs)
+
+
+def concat_proposal_prompt(file_contents: dict, project_title: str) -> str:
+    """
+    The += version of prepare_prompt (same text, built by repeated concatenation).
+    """
+    empty = prepare_prompt({}, project_title)
+    split = empty.index("\nCreate a cohesive")
+    prompt = empty[:split]
+    for file_name in FILE_ORDER:
+        if file_name in file_contents:
+            section_name = file_name.replace('.md', '').replace('_', ' ').title()
+            prompt += f"\n===== {section_name} =====\n"
+            prompt += file_contents[file_name]
+            prompt += "\n\n"
+    prompt += empty[split:]
+    return prompt
+
+
+def synthetic_output(index: int, kb: int) -> str:
+    line = f"- step {index} detail with `code`, **emphasis** and a {{brace}} or two\n"
+    return line * max(1, kb * 1024 // len(line))
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(3):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        best = min(best, (time.perf_counter() - started) / repeat)
+    return best
+
+
+def bench(output_kb: int, repeat: int) -> dict:
+    vision = "Cut the energy cost of desalination for small coastal towns by half. " * 4
+    outputs = {i: synthetic_output(i, output_kb) for i in range(1, len(STEPS) + 1)}
+    cases = {"replace": 0.0, "compiled": 0.0, "compile": 0.0}
+    for step in STEPS:
+        if replace_parts(step, vision, outputs) != build_prompt_parts(step, vision, outputs):
+            raise RuntimeError(f"{step['phase_name']}: compiled prompt differs from the reference")
+        template = step["user_prompt_template"]
+        cases["replace"] += best_of(lambda: replace_parts(step, vision, outputs), repeat)
+        cases["compiled"] += best_of(lambda: build_prompt_parts(step, vision, outputs), repeat)
+        cases["compile"] += best_of(lambda: PromptTemplate(template, STEP_SLOTS), repeat)
+
+    documents = {name: synthetic_output(i, output_kb) for i, name in enumerate(FILE_ORDER)}
+    if concat_proposal_prompt(documents, "Title") != prepare_prompt(documents, "Title"):
+        raise RuntimeError("proposal: compiled prompt differs from the += reference")
+    cases["proposal_concat"] = best_of(lambda: concat_proposal_prompt(documents, "Title"), repeat)
+    cases["proposal_compiled"] = best_of(lambda: prepare_prompt(documents, "Title"), repeat)
+
+    report = prompt_slot_report(STEPS[-1], vision, outputs)
+    return {"output_kb": output_kb, "us": {name: round(seconds * 1e6, 1) for name, seconds in cases.items()},
+            "last_step_slots": report}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt template micro-benchmark")
+    parser.add_argument('--output-kb', type=int, nargs='+', default=[4, 32, 128],
+                        help='Size of each synthetic prior step output / design document in KB')
+    parser.add_argument('--repeat', type=int, default=200, help='Renders per timing (best of 3 is reported)')
+    parser.add_argument('--json', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    results = []
+    for kb in args.output_kb:
+        result = bench(kb, max(1, args.repeat))
+        results.append(result)
+        print(f"\n{kb} KB per output (all {len(STEPS)} steps; microseconds per render):")
+        for name, us in result["us"].items():
+            print(f"  {name:<18}{us:>12.1f}")
+        print(f"  last step slots: {describe_report(result['last_step_slots'])}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
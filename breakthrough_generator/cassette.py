@@ -0,0 +1,172 @@
+"""
+cassette.py
+
+Record/replay of LLM interactions, for deterministic offline runs.
+
+In record mode every request the clients send (Claude and DeepSeek, plain,
+streamed or batched) is appended to a cassette file together with its response
+and timing: total seconds, and for streams each delta's offset from the start
+of the call. Recording skips response-cache lookups, so every entry is a real
+call with real timing.
+
+In replay mode the clients serve responses from the cassette instead of the
+network, either at full speed or with the recorded latencies (streams are
+replayed delta by delta at their recorded offsets). Requests are matched on
+the same key as the response cache (provider, model, messages and sampling
+settings); a request with no recorded response raises LLMError. A key recorded
+several times (e.g. a retried step) is replayed in recording order, and its
+last response is reused after that. Replayed calls don't touch the response
+cache, the rate limiter or the provider usage totals.
+
+A cassette is JSON lines, one interaction per line; a path ending in .gz is
+gzip-compressed. Recording appends, so the programs of one pipeline (a
+walkthrough, then its proposal) can share a cassette; delete the file to start
+a fresh recording.
+
+Env variables:
+  - LLM_CASSETTE (optional, cassette path; enables record/replay)
+  - LLM_CASSETTE_MODE (optional, "record" or "replay", default "replay")
+  - LLM_CASSETTE_TIMING (optional, "fast" or "recorded", default "fast")
+"""
+
+import asyncio
+import gzip
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from llm_errors import LLMError
+
+RECORD = "record"
+REPLAY = "replay"
+
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+class Cassette:
+    def __init__(self, path: str, mode: str = REPLAY, recorded_timing: bool = False):
+        """
+        mode is RECORD (appending to the file) or REPLAY; recorded_timing replays
+        with the recorded latencies instead of at full speed.
+        """
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"Unknown cassette mode {mode!r} (use {RECORD!r} or {REPLAY!r})")
+        self.path = path
+        self.mode = mode
+        self.recorded_timing = recorded_timing
+        self.entries: Dict[str, deque] = {}
+        self.recorded = 0
+        self.replayed = 0
+        self._lock = threading.Lock()
+        if mode == RECORD:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        else:
+            self._load()
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == REPLAY
+
+    def _load(self):
+        with _open(self.path, 'r') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                self.entries.setdefault(entry["key"], deque()).append(entry)
+
+    def _append(self, entry: dict):
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            with _open(self.path, 'a') as f:
+                f.write(line)
+            self.recorded += 1
+
+    def record(self, key: str, provider: str, model: str, text: str, seconds: float):
+        """
+        Appends a completed non-stream interaction.
+        """
+        self._append({"key": key, "provider": provider, "model": model, "seconds": round(seconds, 4),
+                      "text": text})
+
+    def record_stream(self, key: str, provider: str, model: str, events: List[list], text: str, seconds: float):
+        """
+        Appends a completed stream: events are [offset seconds, kind, delta]; text is the
+        assembled response, served when the entry is replayed as a non-stream call.
+        """
+        self._append({"key": key, "provider": provider, "model": model, "seconds": round(seconds, 4),
+                      "text": text, "events": [[round(t, 4), kind, delta] for t, kind, delta in events]})
+
+    def _next(self, key: str, provider: str) -> dict:
+        with self._lock:
+            queue = self.entries.get(key)
+            if not queue:
+                raise LLMError(f"{provider}: no cassette entry for this request in {self.path}", provider)
+            entry = queue.popleft() if len(queue) > 1 else queue[0]
+            self.replayed += 1
+        return entry
+
+    async def replay(self, key: str, provider: str) -> str:
+        entry = self._next(key, provider)
+        if self.recorded_timing:
+            await asyncio.sleep(entry["seconds"])
+        return entry["text"]
+
+    async def replay_stream(self, key: str, provider: str):
+        """
+        Yields the recorded (kind, delta) events; a non-stream entry is one "text" event.
+        """
+        entry = self._next(key, provider)
+        events = entry.get("events") or [[entry["seconds"], "text", entry["text"]]]
+        started = time.perf_counter()
+        for offset, kind, delta in events:
+            if self.recorded_timing:
+                wait = offset - (time.perf_counter() - started)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            yield (kind, delta)
+
+    def describe(self) -> str:
+        if self.mode == RECORD:
+            return f"Cassette {self.path}: recorded {self.recorded} interaction(s)"
+        timing = "recorded latency" if self.recorded_timing else "full speed"
+        return f"Cassette {self.path}: replayed {self.replayed} interaction(s) at {timing}"
+
+
+_cassette: Optional[Cassette] = None
+_env_checked = False
+_cassette_lock = threading.Lock()
+
+
+def use_cassette(path: str, mode: str = REPLAY, recorded_timing: bool = False) -> Cassette:
+    """
+    Makes every client in this process record to / replay from the cassette at path.
+    """
+    global _cassette, _env_checked
+    with _cassette_lock:
+        _env_checked = True
+        _cassette = Cassette(path, mode, recorded_timing)
+    return _cassette
+
+
+def get_cassette() -> Optional[Cassette]:
+    """
+    The process-wide cassette (set by use_cassette or LLM_CASSETTE), or None.
+    """
+    global _env_checked
+    if not _env_checked:
+        path = os.environ.get("LLM_CASSETTE")
+        if path:
+            use_cassette(path, os.environ.get("LLM_CASSETTE_MODE", REPLAY).lower(),
+                         os.environ.get("LLM_CASSETTE_TIMING", "fast").lower() == "recorded")
+        _env_checked = True
+    return _cassette
@@ -0,0 +1,214 @@
+"""
+context_manager.py
+
+Keeps the prior-step context carried into later prompts within a token budget.
+
+For every step, StepContextManager:
+1) strips the "Thinking:" / "Reasoning:" preambles the clients prepend, archiving
+   those traces separately (they are useful to read, not to re-send),
+2) if the prompt would still exceed the step's input-token budget, compacts the
+   largest prior outputs first - by extractive trimming (headings, list items
+   and leading sentences are kept first) or, when a summarizer is given, by a
+   cheap summarization pass,
+3) records how many tokens that saved.
+
+A prior output whose share of the budget would be under MIN_CARRIED_TOKENS is
+dropped (replaced by a short note) rather than compacted to a few meaningless
+tokens; a budget of 0 drops all carried context. The step's report and
+describe() line say how many outputs were dropped.
+
+Token counts are estimates (~4 characters per token), see rate_limiter.estimate_tokens.
+"""
+
+import re
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from rate_limiter import estimate_tokens
+from step_scheduler import STEP_PLACEHOLDER
+
+DEFAULT_INPUT_TOKEN_BUDGET = 24000
+
+# Smallest allowance a prior output is compacted to; below it, the output is dropped
+MIN_CARRIED_TOKENS = 64
+DROPPED_OUTPUT = "(Omitted: over the context budget)"
+
+_REASONING_PREAMBLE = re.compile(r"\A(Thinking|Reasoning):\n(.*?)\n\nAnswer:\n", re.S)
+_LIST_OR_HEADING = re.compile(r"^\s*(#{1,6}\s|[-*+]\s|\d+[.)]\s|\*\*)")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def split_reasoning(text: str) -> Tuple[str, str]:
+    """
+    Returns (reasoning_trace, answer). reasoning_trace is "" if the text has no preamble.
+    """
+    match = _REASONING_PREAMBLE.match(text)
+    if not match:
+        return "", text
+    return match.group(2), text[match.end():]
+
+
+def extractive_trim(text: str, max_tokens: int) -> str:
+    """
+    Shrinks text to roughly max_tokens by keeping the most structural pieces first:
+    headings and list items, then the first sentence of each paragraph, then the rest,
+    always emitted in their original order. Falls back to head/tail truncation.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    # (priority, paragraph index, unit index, unit text, joiner)
+    units = []
+    for p_index, paragraph in enumerate(re.split(r"\n\s*\n", text.strip())):
+        lines = paragraph.splitlines()
+        if any(_LIST_OR_HEADING.match(line) for line in lines):
+            for u_index, line in enumerate(lines):
+                priority = 0 if _LIST_OR_HEADING.match(line) else 2
+                units.append((priority, p_index, u_index, line[:300], "\n"))
+        else:
+            for u_index, sentence in enumerate(_SENTENCE_END.split(" ".join(l.strip() for l in lines))):
+                units.append((1 if u_index == 0 else 2, p_index, u_index, sentence, " "))
+
+    chosen = []
+    used = 0
+    for unit in sorted(units, key=lambda u: (u[0], u[1], u[2])):
+        cost = estimate_tokens(unit[3])
+        if used + cost > max_tokens:
+            continue
+        chosen.append(unit)
+        used += cost
+
+    if not chosen:
+        chars = max(0, max_tokens * 4)
+        head, tail = text[:chars * 2 // 3], text[-(chars // 3):] if chars >= 3 else ""
+        return f"{head}\n[... trimmed ...]\n{tail}"
+
+    paragraphs: Dict[int, List[tuple]] = {}
+    for unit in sorted(chosen, key=lambda u: (u[1], u[2])):
+        paragraphs.setdefault(unit[1], []).append(unit)
+    rendered = []
+    for p_index in sorted(paragraphs):
+        group = paragraphs[p_index]
+        rendered.append(group[0][4].join(u[3] for u in group))
+    dropped = len(units) - len(chosen)
+    return "\n\n".join(rendered) + f"\n\n[... condensed: {dropped} less essential passages omitted ...]"
+
+
+class StepContextManager:
+    """
+    Prepares the {stepN} values for a step's prompt within its input-token budget.
+
+    summarizer, if given, is an async callable (text, target_tokens) -> summary used
+    instead of extractive trimming. Budgets can be overridden per step with an
+    "input_token_budget" key in the STEPS entry.
+    """
+
+    def __init__(self, input_token_budget: int = DEFAULT_INPUT_TOKEN_BUDGET,
+                 summarizer: Optional[Callable[[str, int], Awaitable[str]]] = None,
+                 archive_dir: Optional[str] = None, strip_reasoning: bool = True):
+        self.input_token_budget = input_token_budget
+        self.summarizer = summarizer
+        self.archive_dir = Path(archive_dir) if archive_dir else None
+        self.strip_reasoning = strip_reasoning
+        self.reasoning_archive: Dict[int, str] = {}
+        self.reports: Dict[int, dict] = {}
+        self._compacted: Dict[Tuple[int, int, int], str] = {}
+
+    def carry_forward(self, step_index: int, output: str) -> str:
+        """
+        Returns the part of a step output worth carrying into later prompts, archiving its reasoning.
+        """
+        if not self.strip_reasoning:
+            return output
+        reasoning, answer = split_reasoning(output)
+        if reasoning and step_index not in self.reasoning_archive:
+            self.reasoning_archive[step_index] = reasoning
+            if self.archive_dir is not None:
+                self.archive_dir.mkdir(parents=True, exist_ok=True)
+                (self.archive_dir / f"STEP_{step_index}_REASONING.md").write_text(
+                    f"# Step {step_index} reasoning trace\n\n{reasoning}", encoding="utf-8")
+        return answer
+
+    async def _compact(self, step_index: int, text: str, target_tokens: int) -> str:
+        key = (step_index, hash(text), target_tokens)
+        if key not in self._compacted:
+            if self.summarizer is not None:
+                self._compacted[key] = await self.summarizer(text, target_tokens)
+            else:
+                self._compacted[key] = extractive_trim(text, target_tokens)
+        return self._compacted[key]
+
+    async def prepare(self, step_index: int, step: dict, user_vision: str,
+                      step_outputs: Dict[int, str]) -> Dict[int, str]:
+        """
+        Returns {i: text} for every {stepN} the step's template references, stripped and
+        compacted so the rendered prompt fits the budget. Records a report for step_index.
+        """
+        template = step["user_prompt_template"]
+        budget = step.get("input_token_budget", self.input_token_budget)
+        needed = sorted({int(n) for n in STEP_PLACEHOLDER.findall(template)})
+        raw = {i: step_outputs.get(i, "(No output)") for i in needed}
+        carried = {i: self.carry_forward(i, text) for i, text in raw.items()}
+
+        fixed = estimate_tokens(step["system_prompt"]) + estimate_tokens(STEP_PLACEHOLDER.sub("", template)) \
+            + estimate_tokens(user_vision)
+        sizes = {i: estimate_tokens(text) for i, text in carried.items()}
+        available = max(0, budget - fixed)
+
+        # Water-filling: small outputs stay whole, the largest ones share what's left
+        allowance = {}
+        remaining = dict(sizes)
+        pool = available
+        while remaining:
+            share = pool // len(remaining)
+            fitting = {i: n for i, n in remaining.items() if n <= share}
+            if not fitting:
+                for i in remaining:
+                    allowance[i] = share
+                break
+            for i, n in fitting.items():
+                allowance[i] = n
+                pool -= n
+                del remaining[i]
+
+        compacted = {}
+        dropped = []
+        for i, text in carried.items():
+            if sizes[i] <= allowance[i]:
+                compacted[i] = text
+            elif allowance[i] < MIN_CARRIED_TOKENS:
+                compacted[i] = DROPPED_OUTPUT
+                dropped.append(i)
+            else:
+                compacted[i] = await self._compact(i, text, allowance[i])
+
+        raw_tokens = sum(estimate_tokens(t) for t in raw.values())
+        stripped_tokens = sum(sizes.values())
+        final_tokens = sum(estimate_tokens(t) for t in compacted.values())
+        self.reports[step_index] = {
+            "raw_context_tokens": raw_tokens,
+            "reasoning_tokens_removed": raw_tokens - stripped_tokens,
+            "compaction_tokens_removed": stripped_tokens - final_tokens,
+            "context_tokens": final_tokens,
+            "prompt_tokens": fixed + final_tokens,
+            "budget": budget,
+            "dropped_steps": dropped,
+        }
+        return compacted
+
+    def describe(self, step_index: int) -> str:
+        report = self.reports.get(step_index)
+        if not report:
+            return ""
+        saved = report["raw_context_tokens"] - report["context_tokens"]
+        line = (f"Context: ~{report['raw_context_tokens']} -> ~{report['context_tokens']} tokens "
+                f"(saved ~{saved}: reasoning {report['reasoning_tokens_removed']}, "
+                f"compaction {report['compaction_tokens_removed']}; prompt ~{report['prompt_tokens']}"
+                f" / budget {report['budget']})")
+        if report["dropped_steps"]:
+            line += (f"; WARNING: budget too small, dropped step output(s) "
+                     f"{', '.join(str(i) for i in report['dropped_steps'])}")
+        return line
+
+    def total_saved(self) -> int:
+        return sum(r["raw_context_tokens"] - r["context_tokens"] for r in self.reports.values())
@@ -0,0 +1,172 @@
+"""
+hedging.py
+
+Hedged requests: send a call to a primary provider and, if it hasn't answered
+(or, for streams, produced its first delta) within a hedge delay, send the same
+call to a secondary provider as well. The first complete result wins and the
+other request is cancelled.
+
+The delay is a percentile (default p95) of the primary's own observed latency
+from the metrics registry: full request time for calls, time-to-first-token for
+streams. Until enough samples exist a fixed initial delay is used. This way
+only the slowest ~(100 - percentile)% of calls pay for a second request, which
+cuts tail latency without doubling cost.
+
+Env variables:
+  - LLM_HEDGE_PERCENTILE (optional, default 95)
+  - LLM_HEDGE_DELAY / LLM_HEDGE_TTFT_DELAY (optional, seconds; delay before
+    enough samples exist, default 30 / 10)
+  - LLM_HEDGE_MIN_DELAY (optional, seconds, default 0.5)
+"""
+
+import asyncio
+import os
+import threading
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from metrics import get_metrics
+
+# Observed calls needed before the percentile replaces the initial delay
+MIN_SAMPLES = 5
+
+
+class HedgePolicy:
+    def __init__(self, percentile: Optional[float] = None, initial_delay: Optional[float] = None,
+                 initial_ttft_delay: Optional[float] = None, min_delay: Optional[float] = None):
+        self.percentile = percentile if percentile is not None else float(os.environ.get("LLM_HEDGE_PERCENTILE", "95"))
+        self.initial_delay = (initial_delay if initial_delay is not None
+                              else float(os.environ.get("LLM_HEDGE_DELAY", "30")))
+        self.initial_ttft_delay = (initial_ttft_delay if initial_ttft_delay is not None
+                                   else float(os.environ.get("LLM_HEDGE_TTFT_DELAY", "10")))
+        self.min_delay = min_delay if min_delay is not None else float(os.environ.get("LLM_HEDGE_MIN_DELAY", "0.5"))
+
+    def delay(self, provider: str, model: str, stream: bool = False) -> float:
+        """
+        Seconds to wait for the primary before hedging, from its latency percentile so far.
+        """
+        name = "llm_time_to_first_token_seconds" if stream else "llm_request_seconds"
+        value, samples = get_metrics().quantile(name, {"provider": provider, "model": model}, self.percentile)
+        if samples < MIN_SAMPLES:
+            return self.initial_ttft_delay if stream else self.initial_delay
+        return max(self.min_delay, value)
+
+
+class HedgeStats:
+    """
+    Per-orchestrator counts: calls made, hedges fired, and which side won a fired hedge.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.fired = 0
+        self.primary_wins = 0
+        self.secondary_wins = 0
+        self._lock = threading.Lock()
+
+    def record(self, fired: bool, secondary_won: bool):
+        with self._lock:
+            self.calls += 1
+            if fired:
+                self.fired += 1
+                if secondary_won:
+                    self.secondary_wins += 1
+                else:
+                    self.primary_wins += 1
+
+    def describe(self) -> str:
+        with self._lock:
+            if not self.calls:
+                return "no hedged calls"
+            return (f"{self.calls} call(s), {self.fired} hedge(s) fired "
+                    f"({self.fired / self.calls * 100:.0f}%), secondary won {self.secondary_wins}, "
+                    f"primary won {self.primary_wins}")
+
+
+async def _cancel(task: "asyncio.Future"):
+    if not task.done():
+        task.cancel()
+    try:
+        await task
+    except BaseException:
+        pass
+
+
+async def hedged_call(primary: Callable[[], Awaitable[str]], secondary: Callable[[], Awaitable[str]],
+                      delay: float, on_outcome: Callable[[bool, bool], None]) -> str:
+    """
+    Awaits primary(); if it hasn't finished after delay seconds, starts secondary() too
+    and returns whichever completes successfully first, cancelling the other.
+    If both fail, the primary's error is raised. on_outcome(fired, secondary_won) is
+    called once a result is in.
+    """
+    first = asyncio.ensure_future(primary())
+    second = None
+    try:
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            result = first.result()
+            on_outcome(False, False)
+            return result
+        second = asyncio.ensure_future(secondary())
+        pending = {first, second}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in (first, second):
+                if task in done and task.exception() is None:
+                    on_outcome(True, task is second)
+                    return task.result()
+        # Both failed
+        on_outcome(True, False)
+        return first.result()
+    finally:
+        await _cancel(first)
+        if second is not None:
+            await _cancel(second)
+
+
+async def hedged_stream(primary: Callable[[], AsyncIterator], secondary: Callable[[], AsyncIterator],
+                        delay: float, on_outcome: Callable[[bool, bool], None]):
+    """
+    Streaming counterpart of hedged_call: the race is for the first event. Once one
+    stream has produced an event (or finished), the other is cancelled and the winner's
+    events are passed through. A stream that fails before its first event loses the race.
+    """
+    streams = {"primary": primary()}
+    tasks = {"primary": asyncio.ensure_future(streams["primary"].__anext__())}
+    winner = None
+    try:
+        done, _ = await asyncio.wait({tasks["primary"]}, timeout=delay)
+        if done:
+            winner = "primary"
+        else:
+            streams["secondary"] = secondary()
+            tasks["secondary"] = asyncio.ensure_future(streams["secondary"].__anext__())
+            pending = set(tasks.values())
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for name in ("primary", "secondary"):
+                    task = tasks[name]
+                    if task in done and (task.exception() is None or
+                                         isinstance(task.exception(), StopAsyncIteration)):
+                        winner = name
+                        break
+            if winner is None:
+                # Both failed before their first event
+                winner = "primary"
+        on_outcome("secondary" in tasks, winner == "secondary")
+        for name in list(tasks):
+            if name != winner:
+                await _cancel(tasks[name])
+                await streams.pop(name).aclose()
+        try:
+            first_event = tasks[winner].result()
+        except StopAsyncIteration:
+            return
+        yield first_event
+        async for event in streams[winner]:
+            yield event
+    finally:
+        for name, task in tasks.items():
+            await _cancel(task)
+        for stream in streams.values():
+            await stream.aclose()
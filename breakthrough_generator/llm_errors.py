@@ -0,0 +1,96 @@
+"""
+llm_errors.py
+
+Typed exceptions raised by the AI clients, replacing the old
+"ERROR from Claude: ..." sentinel strings.
+
+  LLMError               - any failed call (bad request, auth, ...); not retried
+  RetryableLLMError      - transient failure (connection, timeout, 5xx)
+    RateLimitError       - HTTP 429
+    OverloadedError      - HTTP 529 / 503 (provider overloaded)
+
+Retryable errors carry retry_after (seconds) when the provider sent a Retry-After header.
+"""
+
+import asyncio
+import email.utils
+import time
+from typing import Optional
+
+
+class LLMError(Exception):
+    def __init__(self, message: str, provider: str = "", status_code: Optional[int] = None,
+                 retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.provider = provider
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class RetryableLLMError(LLMError):
+    pass
+
+
+class RateLimitError(RetryableLLMError):
+    pass
+
+
+class OverloadedError(RetryableLLMError):
+    pass
+
+
+def parse_retry_after(headers) -> Optional[float]:
+    """
+    Returns the delay in seconds requested by retry-after-ms / retry-after headers, if any.
+    retry-after may be a number of seconds or an HTTP date.
+    """
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(0.0, float(value) / 1000.0)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+# SDK exception class names (same in anthropic and openai) that mean the request never completed
+_TRANSIENT_ERROR_NAMES = {"APIConnectionError", "APITimeoutError", "ConnectError", "ReadTimeout",
+                          "RemoteProtocolError", "ReadError", "PoolTimeout"}
+
+
+def classify_exception(provider: str, exc: BaseException) -> LLMError:
+    """
+    Maps an SDK / transport exception to the matching LLMError subclass.
+    """
+    if isinstance(exc, LLMError):
+        return exc
+    status = getattr(exc, "status_code", None)
+    response = getattr(exc, "response", None)
+    retry_after = parse_retry_after(getattr(response, "headers", None))
+    message = f"{provider}: {exc}"
+
+    if status == 429:
+        return RateLimitError(message, provider, status, retry_after)
+    if status in (503, 529):
+        return OverloadedError(message, provider, status, retry_after)
+    if status is not None and (status >= 500 or status in (408, 409)):
+        return RetryableLLMError(message, provider, status, retry_after)
+    if status is None and (
+        isinstance(exc, (ConnectionError, TimeoutError, asyncio.TimeoutError))
+        or type(exc).__name__ in _TRANSIENT_ERROR_NAMES
+    ):
+        return RetryableLLMError(message, provider)
+    return LLMError(message, provider, status)
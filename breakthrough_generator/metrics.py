@@ -0,0 +1,243 @@
+"""
+metrics.py
+
+In-process instrumentation for LLM calls and walkthrough steps.
+
+The AI clients record one "llm_call" event per request. It holds the wall time
+(retries included), time-to-first-token for streams, input/output/thinking/
+cache tokens, stop reason and retry count. The orchestrator records one "step"
+event per step with its wall time and bytes written. Events feed histograms and
+counters labelled by provider/model (calls) and step/model (steps).
+
+Exports:
+  - Prometheus text exposition format (to_prometheus / write(path.prom)),
+    suitable for the node_exporter textfile collector or a pushgateway
+  - JSON lines, one event per line (write(path.jsonl)); with LLM_METRICS_JSONL
+    set, events are also appended to that file as they happen. Only the most
+    recent EVENT_LOG_SIZE events are kept in memory for write(); the
+    LLM_METRICS_JSONL file has all of them
+  - summary(): p50 / p95 per step and per model, for quick console reports
+
+Histogram buckets, sums and counts cover every observation; percentiles
+(summary, quantile) are taken over the most recent HISTOGRAM_WINDOW samples of
+each series, so a long-running process keeps bounded memory and its p95 tracks
+current latency rather than the whole run.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+TOKEN_KINDS = ("input", "output", "thinking", "cache_read", "cache_write")
+
+# Raw samples kept per histogram series for percentiles
+HISTOGRAM_WINDOW = 1024
+# Events kept in memory for write(path.jsonl)
+EVENT_LOG_SIZE = 10000
+
+_HELP = {
+    "llm_request_seconds": ("histogram", "LLM request wall time including retries"),
+    "llm_time_to_first_token_seconds": ("histogram", "Time until the first streamed delta"),
+    "llm_output_tokens": ("histogram", "Output tokens per LLM request"),
+    "llm_requests_total": ("counter", "LLM requests by stop reason (or error type)"),
+    "llm_retries_total": ("counter", "Retried LLM attempts"),
+    "llm_tokens_total": ("counter", "LLM tokens by kind"),
+    "llm_response_cache_hits_total": ("counter", "Responses served from the local response cache"),
+    "llm_hedges_total": ("counter", "Hedged LLM calls by outcome (not_fired, primary_won, secondary_won)"),
+    "step_seconds": ("histogram", "Walkthrough step wall time"),
+    "step_bytes_written_total": ("counter", "Bytes written to the project by a step"),
+}
+
+
+def _labels_key(labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    Nearest-rank percentile (q in 0..100) of values; 0.0 for no values.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+        self.samples: deque = deque(maxlen=HISTOGRAM_WINDOW)
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        self.samples.append(value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class MetricsRegistry:
+    """
+    Thread-safe store of histograms, counters and the raw event log.
+    """
+
+    def __init__(self, jsonl_path: Optional[str] = None):
+        self.jsonl_path = jsonl_path
+        self.histograms: Dict[str, Dict[tuple, Histogram]] = {}
+        self.counters: Dict[str, Dict[tuple, float]] = {}
+        self.events: deque = deque(maxlen=EVENT_LOG_SIZE)
+        self._lock = threading.Lock()
+
+    def _observe(self, name: str, labels: Dict[str, str], value: float, buckets):
+        series = self.histograms.setdefault(name, {})
+        key = _labels_key(labels)
+        if key not in series:
+            series[key] = Histogram(buckets)
+        series[key].observe(value)
+
+    def _inc(self, name: str, labels: Dict[str, str], amount: float = 1):
+        series = self.counters.setdefault(name, {})
+        key = _labels_key(labels)
+        series[key] = series.get(key, 0) + amount
+
+    def _log(self, event: dict):
+        self.events.append(event)
+        if self.jsonl_path:
+            with open(self.jsonl_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+    def observe_llm_call(self, provider: str, model: str, seconds: float, stream: bool = False,
+                         ttft: Optional[float] = None, input_tokens: int = 0, output_tokens: int = 0,
+                         thinking_tokens: int = 0, cache_read_tokens: int = 0, cache_write_tokens: int = 0,
+                         stop_reason: Optional[str] = None, retries: int = 0, error: Optional[str] = None):
+        labels = {"provider": provider, "model": model}
+        tokens = dict(zip(TOKEN_KINDS, (input_tokens, output_tokens, thinking_tokens,
+                                        cache_read_tokens, cache_write_tokens)))
+        with self._lock:
+            self._observe("llm_request_seconds", labels, seconds, LATENCY_BUCKETS)
+            if ttft is not None:
+                self._observe("llm_time_to_first_token_seconds", labels, ttft, LATENCY_BUCKETS)
+            if not error:
+                self._observe("llm_output_tokens", labels, output_tokens, TOKEN_BUCKETS)
+            self._inc("llm_requests_total", {**labels, "stop_reason": error or stop_reason or "unknown"})
+            if retries:
+                self._inc("llm_retries_total", labels, retries)
+            for kind, count in tokens.items():
+                if count:
+                    self._inc("llm_tokens_total", {**labels, "kind": kind}, count)
+            self._log({
+                "type": "llm_call", "ts": time.time(), **labels, "stream": stream,
+                "seconds": round(seconds, 4), "ttft": round(ttft, 4) if ttft is not None else None,
+                **{f"{kind}_tokens": count for kind, count in tokens.items()},
+                "stop_reason": stop_reason, "retries": retries, "error": error,
+            })
+
+    def observe_cache_hit(self, provider: str, model: str):
+        with self._lock:
+            self._inc("llm_response_cache_hits_total", {"provider": provider, "model": model})
+
+    def observe_hedge(self, primary: str, secondary: str, fired: bool, secondary_won: bool):
+        outcome = "not_fired" if not fired else ("secondary_won" if secondary_won else "primary_won")
+        with self._lock:
+            self._inc("llm_hedges_total", {"primary": primary, "secondary": secondary, "outcome": outcome})
+
+    def quantile(self, name: str, labels: Dict[str, str], q: float) -> Tuple[float, int]:
+        """
+        (nearest-rank percentile q, sample count) over the recent window of one histogram
+        series; (0.0, 0) if it has no samples.
+        """
+        with self._lock:
+            hist = self.histograms.get(name, {}).get(_labels_key(labels))
+            samples = list(hist.samples) if hist else []
+        return percentile(samples, q), len(samples)
+
+    def observe_step(self, step: str, model: str, seconds: float, bytes_written: int = 0):
+        labels = {"step": step, "model": model}
+        with self._lock:
+            self._observe("step_seconds", labels, seconds, LATENCY_BUCKETS)
+            self._inc("step_bytes_written_total", labels, bytes_written)
+            self._log({"type": "step", "ts": time.time(), **labels,
+                       "seconds": round(seconds, 4), "bytes_written": bytes_written})
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.histograms.items()):
+                kind, help_text = _HELP.get(name, ("histogram", name))
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                for key, hist in sorted(series.items()):
+                    for bound, count in zip(hist.buckets, hist.counts):
+                        lines.append(f"{name}_bucket{_format_labels(key, ('le', str(bound)))} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(key, ('le', '+Inf'))} {hist.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {hist.sum:.6f}")
+                    lines.append(f"{name}_count{_format_labels(key)} {hist.count}")
+            for name, series in sorted(self.counters.items()):
+                kind, help_text = _HELP.get(name, ("counter", name))
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """
+        Writes Prometheus text for *.prom / *.txt paths, otherwise every event as JSON lines.
+        """
+        if path.endswith((".prom", ".txt")):
+            content = self.to_prometheus()
+        else:
+            with self._lock:
+                content = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in self.events)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+    def summary(self) -> str:
+        """
+        p50 / p95 latency per model (LLM calls) and per step, as console lines. n counts
+        every observation; the percentiles and max are over the recent window.
+        """
+        lines = []
+        with self._lock:
+            for name, title in (("llm_request_seconds", "LLM calls"), ("step_seconds", "Steps")):
+                series = self.histograms.get(name, {})
+                if not series:
+                    continue
+                lines.append(f"{title} (n / p50 / p95 / max seconds):")
+                for key, hist in sorted(series.items()):
+                    label = " ".join(v for _, v in key)
+                    lines.append(f"  {label}: {hist.count} / {percentile(hist.samples, 50):.2f} / "
+                                 f"{percentile(hist.samples, 95):.2f} / {max(hist.samples):.2f}")
+        return "\n".join(lines)
+
+
+_default_metrics = None
+_default_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> MetricsRegistry:
+    """
+    Returns the process-wide registry. LLM_METRICS_JSONL (optional) streams events to a file.
+    """
+    global _default_metrics
+    with _default_metrics_lock:
+        if _default_metrics is None:
+            _default_metrics = MetricsRegistry(os.environ.get("LLM_METRICS_JSONL") or None)
+    return _default_metrics
@@ -19,9 +19,15 @@ while still producing actionable or implementable ideas.
 """
 
 import os
+import re
 import sys
+import json
+import asyncio
+import hashlib
+import tempfile
+import time
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, Iterable, List
 import datetime
 
 # Try to load environment variables from .env file if it exists
@@ -31,17 +37,443 @@ try:
 except ImportError:
     print("python-dotenv not installed. Environment variables must be set manually.")
 
-from ai_clients import AIOrchestrator
+from ai_clients import AIOrchestrator, LLMError, format_response, model_available, run_sync
+from hedging import HedgePolicy
+from thinking_controller import ThinkingBudgetController, output_quality
+from tracing import enable as enable_tracing, get_tracer, span, traced_input
+from cassette import RECORD, REPLAY, get_cassette, use_cassette
+from response_cache import get_default_cache
+from step_scheduler import StepScheduler
+from prompt_template import compile_template
+from context_manager import DEFAULT_INPUT_TOKEN_BUDGET, StepContextManager
+from run_journal import JOURNAL_DIR, RunJournal, prompt_hash
+from metrics import get_metrics
+from project_scanner import ProjectScanner
+
+# Model tiers a step can ask for with "model" (any other value is a model name).
+# Both tiers default to the run's model from the command line, so routing only
+# changes which model runs a step once FAST_MODEL / STRONG_MODEL are set. A tier
+# whose API key is missing falls back to the run's model.
+MODEL_TIERS = {
+    "fast": os.environ.get("FAST_MODEL", ""),
+    "strong": os.environ.get("STRONG_MODEL", ""),
+}
+
+# Extended-thinking budgets for the steps that gain most from it, by step index.
+# Opt-in: applied with --thinking, and used as ceilings by --adaptive-thinking.
+STEP_THINKING_BUDGETS = {4: 2048, 5: 4096}
+
+# max_tokens for steps that don't set their own
+DEFAULT_STEP_MAX_TOKENS = 2048
+
+# Define our 8-stage Breakthrough-Idea Walkthrough Framework.
+# Optional per-step routing: "model" (a MODEL_TIERS tier or model name),
+# "max_tokens" and "thinking_budget" (Claude extended thinking tokens; see also
+# STEP_THINKING_BUDGETS).
+STEPS = [
+    {
+        "phase_name": "1) Context & Constraints Clarification",
+        "output_file": "doc/CONTEXT_CONSTRAINTS.md",
+        "model": "fast",
+        "max_tokens": 1536,
+        "system_prompt": (
+            "You are a specialized solutions architect. The user will describe a domain or challenge.\n"
+            "Step 1: Summarize the user's domain, goals, and constraints thoroughly. Then, confirm your understanding of them.\n"
+            "Additionally, collect any unusual references or lesser-known methods you can recall that might apply.\n"
+            "DO NOT disclaim feasibility. Provide a crisp summary of what the user wants, plus a short list of unique references from outside the mainstream."
+        ),
+        "user_prompt_template": (
+            "Domain/Challenge:\n{vision}\n\n"
+            "Step 1: Summarize my domain/goal and constraints. Also gather some obscure or cross-domain references that could help.\n"
+            "Keep it real and near-future, but do not disclaim feasibility. We want fresh synergy ideas.\n"
+        ),
+    },
+    {
+        "phase_name": "2) Divergent Brainstorm of Solutions",
+        "output_file": "doc/DIVERGENT_SOLUTIONS.md",
+        "max_tokens": 3072,
+        "system_prompt": (
+            "Step 2: Provide multiple new or radical solutions that incorporate the domain constraints and your cross-domain references.\n\n"
+            "Generate at least 5 distinct solutions.\n"
+            "Each solution must be novel, mixing known ideas in uncommon ways.\n"
+            "Avoid disclaimers like 'I'm only an AI' or 'This might not be feasible.' The user wants plausible near-future expansions.\n"
+            "Label them \"Solution A, B, C, etc.\""
+        ),
+        "user_prompt_template": (
+            "Domain/Challenge:\n{vision}\n\n"
+            "Context & Constraints (Step 1 Output):\n{step1}\n\n"
+            "Step 2: Show me 5 or more novel synergy solutions for my stated domain.\n"
+            "Don't disclaim feasibility. Just produce creative combos.\n"
+            "Title each solution briefly, then describe it in a paragraph or two.\n"
+        ),
+    },
+    {
+        "phase_name": "3) Deep-Dive on Each Idea's Mechanism",
+        "output_file": "doc/DEEP_DIVE_MECHANISMS.md",
+        "max_tokens": 4096,
+        "system_prompt": (
+            "Step 3: For each proposed solution, deep-dive into how it might work. This includes:\n\n"
+            "Underlying logic or theoretical basis.\n"
+            "Potential synergy with domain constraints.\n"
+            "A short example scenario or test application.\n"
+            "A rough list of pros/cons.\n"
+            "No disclaimers or feasibility disclaimers—remain solution-focused."
+        ),
+        "user_prompt_template": (
+            "Domain/Challenge:\n{vision}\n\n"
+            "Context & Constraints (Step 1 Output):\n{step1}\n\n"
+            "Proposed Solutions (Step 2 Output):\n{step2}\n\n"
+            "Step 3: For each solution A, B, C... do a deep-dive.\n"
+            "Show how it might actually function, how it ties back to the domain constraints, what example scenario it solves.\n"
+            "Keep the focus on actionable or near-future expansions—no disclaimers.\n"
+        ),
+        # Map/reduce mode (--fan-out): split the source step's output into its
+        # "Solution A, B, C..." sections and deep-dive each one in its own call.
+        "fan_out": {
+            "source_step": 2,
+            "max_tokens": 2048,
+            "user_prompt_template": (
+                "Domain/Challenge:\n{vision}\n\n"
+                "Context & Constraints (Step 1 Output):\n{step1}\n\n"
+                "Solution to Deep-Dive (from Step 2 Output):\n{solution}\n\n"
+                "Step 3: Do a deep-dive on the single solution above.\n"
+                "Show how it might actually function, how it ties back to the domain constraints, what example scenario it solves.\n"
+                "Keep the focus on actionable or near-future expansions—no disclaimers.\n"
+            ),
+        },
+    },
+    {
+        "phase_name": "4) Self-Critique for Gaps & Synergy",
+        "output_file": "doc/SELF_CRITIQUE_SYNERGY.md",
+        "model": "strong",
+        "max_tokens": 6144,
+        "system_prompt": (
+            "Step 4: Critically review each solution for missing details, potential synergy across solutions, or expansions.\n\n"
+            "Identify any incomplete sub-points.\n"
+            "Suggest expansions or merges that might create an even stronger approach.\n"
+            "No disclaimers about the entire project's feasibility—just refine or unify solutions."
+        ),
+        "user_prompt_template": (
+            "Domain/Challenge:\n{vision}\n\n"
+            "Context & Constraints (Step 1 Output):\n{step1}\n\n"
+            "Deep-Dive Solutions (Step 3 Output):\n{step3}\n\n"
+            "Step 4: Critique your solutions from Step 3. Note where each is lacking detail, or which synergy merges solutions effectively.\n"
+            "Then propose 1–2 merged solutions that might be even stronger.\n"
+        ),
+    },
+    {
+        "phase_name": "5) Merged Breakthrough Blueprint",
+        "output_file": "doc/BREAKTHROUGH_BLUEPRINT.md",
+        "model": "strong",
+        "max_tokens": 8192,
+        "system_prompt": (
+            "Step 5: Provide a final 'Merged Breakthrough Blueprint.' This blueprint is a synergy of the best or boldest features from the prior solutions, shaped into a coherent design.\n\n"
+            "Summarize the blueprint in 3–5 paragraphs, focusing on how it pushes beyond standard practice.\n"
+            "Emphasize real near-future expansions, not disclaimers.\n"
+            "Output the blueprint in `=== File: doc/BREAKTHROUGH_BLUEPRINT.md ===`"
+        ),
+        "user_prompt_template": (
+            "Domain/Challenge:\n{vision}\n\n"
+            "Context & Constraints (Step 1 Output):\n{step1}\n\n"
+            "Critique & Synergy (Step 4 Output):\n{step4}\n\n"
+            "Step 5: Merge your best solutions into one cohesive blueprint.\n"
+            "Aim for truly new synergy beyond typical references.\n"
+            "Provide enough detail so I can see how it might be genuinely game-changing.\n"
+            "Place the blueprint in `=== File: doc/BREAKTHROUGH_BLUEPRINT.md ===`\n"
+        ),
+    },
+    {
+        "phase_name": "6) Implementation Path & Risk Minimization",
+        "output_file": "doc/IMPLEMENTATION_PATH.md",
+        "max_tokens": 4096,
+        "system_prompt": (
+            "Step 6: Lay out an implementation or prototyping path. For each step, identify key resources needed.\n"
+            "No disclaimers about overall feasibility—just ways to mitigate risk or handle challenges.\n"
+            "Output the implementation path in `=== File: doc/IMPLEMENTATION_PATH.md ===`"
+        ),
+        "user_prompt_template": (
+            "Domain/Challenge:\n{vision}\n\n"
+            "Breakthrough Blueprint (Step 5 Output):\n{step5}\n\n"
+            "Step 6: Give me a development path. List each milestone or partial prototype.\n"
+            "Show how I'd start small, prove key parts of the blueprint, then expand. No disclaimers needed; just solution-oriented steps.\n"
+            "Place the implementation path in `=== File: doc/IMPLEMENTATION_PATH.md ===`\n"
+        ),
+    },
+    {
+        "phase_name": "7) Cross-Checking with Prior Knowledge",
+        "output_file": "doc/NOVELTY_CHECK.md",
+        "model": "fast",
+        "max_tokens": 2048,
+        "system_prompt": (
+            "Step 7: Attempt to cross-check if any known open-source or industrial projects come close to your blueprint, and highlight differences.\n\n"
+            "If no direct references exist, you can say it's presumably novel.\n"
+            "Avoid disclaimers; remain solution-based.\n"
+            "Output the cross-check in `=== File: doc/NOVELTY_CHECK.md ===`"
+        ),
+        "user_prompt_template": (
+            "Domain/Challenge:\n{vision}\n\n"
+            "Breakthrough Blueprint (Step 5 Output):\n{step5}\n\n"
+            "Implementation Path (Step 6 Output):\n{step6}\n\n"
+            "Step 7: Compare your blueprint with existing known projects. Are there partial overlaps? If so, how is this blueprint more advanced or new?\n"
+            "If none are close, then we label it as presumably novel. No disclaimers beyond that.\n"
+            "Place the cross-check in `=== File: doc/NOVELTY_CHECK.md ===`\n"
+        ),
+    },
+    {
+        "phase_name": "8) Q&A or Additional Elaborations",
+        "output_file": "doc/ELABORATIONS.md",
+        "max_tokens": 4096,
+        "system_prompt": (
+            "Step 8: The user may have specific follow-up questions. Provide direct expansions or clarifications, always focusing on near-future feasibility. Refrain from disclaimers. Always produce constructive expansions.\n"
+            "Output any elaborations in `=== File: doc/ELABORATIONS.md ===`"
+        ),
+        "user_prompt_template": (
+            "Domain/Challenge:\n{vision}\n\n"
+            "Breakthrough Blueprint (Step 5 Output):\n{step5}\n\n"
+            "Implementation Path (Step 6 Output):\n{step6}\n\n"
+            "Novelty Check (Step 7 Output):\n{step7}\n\n"
+            "Step 8: Let me ask any final clarifications about your final blueprint. Please keep it real near-future, no disclaimers.\n"
+            "Place any elaborations in `=== File: doc/ELABORATIONS.md ===`\n"
+            "Let me know what aspects you'd like me to elaborate on or explain further.\n"
+        ),
+    },
+]
+
+
+# With prompt caching, every step shares this system prompt and the step's own
+# instructions move after the context, so the vision and earlier step outputs
+# form an identical prefix across steps (and across Q&A turns).
+SHARED_SYSTEM_PROMPT = (
+    "You are a specialized solutions architect guiding the user through the Breakthrough-Idea Walkthrough, "
+    "an 8-step framework for developing novel, near-future, actionable ideas. "
+    "Each request gives you the domain/challenge and earlier step outputs first, then the instructions for the current step. "
+    "Follow those step instructions exactly. Never disclaim feasibility."
+)
+
+# A leading "Label:\n{vision}\n\n" or "Label:\n{stepN}\n\n" section of a template
+CONTEXT_SECTION = re.compile(r"[^\n]*:\n\{(?:vision|step\d+)\}\n\n?")
+
+
+# Placeholders a user_prompt_template may use; {solution} only in fan-out templates
+STEP_SLOTS = r"vision|step\d+|solution"
+
+# Filled in for a {stepN} whose step produced no output
+MISSING_OUTPUT = "(No output)"
+
+# user_prompt_template -> (compiled leading context sections, compiled rest)
+_step_templates: Dict[str, tuple] = {}
+
+
+def compile_step_template(template: str, name: str = None) -> tuple:
+    """
+    Parses a step's user_prompt_template once into (context section templates, rest
+    template), see build_prompt_parts. Raises TemplateError for unknown placeholders.
+    """
+    compiled = _step_templates.get(template)
+    if compiled is None:
+        sections = []
+        pos = 0
+        while True:
+            match = CONTEXT_SECTION.match(template, pos)
+            if not match:
+                break
+            sections.append(compile_template(match.group(), STEP_SLOTS, name))
+            pos = match.end()
+        compiled = (tuple(sections), compile_template(template[pos:], STEP_SLOTS, name))
+        _step_templates[template] = compiled
+    return compiled
+
+
+# Built-in templates are parsed at import, so a placeholder typo fails here rather than mid-run
+for _step in STEPS:
+    compile_step_template(_step["user_prompt_template"], _step["phase_name"])
+    if "fan_out" in _step:
+        compile_step_template(_step["fan_out"]["user_prompt_template"], _step["phase_name"])
+
+
+def _slot_values(user_vision: str, step_outputs: Dict[int, str], extra: Dict[str, str] = None) -> Dict[str, str]:
+    values = {f"step{i}": output for i, output in step_outputs.items()}
+    values["vision"] = user_vision
+    if extra:
+        values.update(extra)
+    return values
+
+
+def build_prompt_parts(step_info: dict, user_vision: str, step_outputs: Dict[int, str],
+                       extra: Dict[str, str] = None):
+    """
+    Splits a step's user prompt into (prefix_segments, rest). prefix_segments are the
+    rendered leading context sections ({vision}, {stepN}) - the part other steps share -
+    and rest is everything after them (the step-specific instructions). extra fills
+    other slots, e.g. {"solution": ...} for a fan-out deep dive.
+    """
+    sections, rest = compile_step_template(step_info["user_prompt_template"], step_info.get("phase_name"))
+    values = _slot_values(user_vision, step_outputs, extra)
+    segments = [section.render(values, MISSING_OUTPUT) for section in sections]
+    return segments, rest.render(values, MISSING_OUTPUT)
+
+
+def prompt_slot_report(step_info: dict, user_vision: str, step_outputs: Dict[int, str],
+                       extra: Dict[str, str] = None) -> List[dict]:
+    """
+    Bytes and estimated tokens each slot ({vision}, {stepN}, ...) adds to the step's
+    user prompt, plus the template's own text as "(literal)"; see PromptTemplate.report.
+    """
+    sections, rest = compile_step_template(step_info["user_prompt_template"], step_info.get("phase_name"))
+    values = _slot_values(user_vision, step_outputs, extra)
+    totals = {}
+    for template in (*sections, rest):
+        for entry in template.report(values, MISSING_OUTPUT):
+            total = totals.setdefault(entry["slot"], {"slot": entry["slot"], "bytes": 0, "tokens": 0})
+            total["bytes"] += entry["bytes"]
+            total["tokens"] += entry["tokens"]
+    return list(totals.values())
+
+
+def _trace_slots(prompt_span, step_info: dict, user_vision: str, step_outputs: Dict[int, str],
+                 extra: Dict[str, str] = None):
+    # The report costs a pass over every slot value; only pay for it when tracing
+    if get_tracer() is not None:
+        prompt_span.set(slots={entry["slot"]: [entry["bytes"], entry["tokens"]]
+                               for entry in prompt_slot_report(step_info, user_vision, step_outputs, extra)})
+
+
+def build_user_prompt(step_index: int, step_info: dict, user_vision: str, step_outputs: Dict[int, str]) -> str:
+    """
+    Takes the step index and step definition, returns the user prompt
+    with prior step outputs inserted for context.
+    """
+    with span("build_user_prompt", cat="prompt", step=step_info.get("phase_name")) as prompt_span:
+        segments, rest = build_prompt_parts(step_info, user_vision, step_outputs)
+        _trace_slots(prompt_span, step_info, user_vision, step_outputs)
+        return "".join(segments) + rest
+
+
+def build_step_request(step_info: dict, user_vision: str, step_outputs: Dict[int, str], prompt_cache: bool = True,
+                       extra: Dict[str, str] = None):
+    """
+    Returns (system_prompt, user_prompt, prompt_prefix) for AIOrchestrator.call_llm.
+    With prompt_cache, the shared system prompt is used, the context sections become
+    cacheable prefix segments and the step's system prompt leads the remaining text.
+    extra fills non-step slots, as in build_prompt_parts.
+    """
+    if not prompt_cache:
+        with span("build_user_prompt", cat="prompt", step=step_info.get("phase_name")) as prompt_span:
+            segments, rest = build_prompt_parts(step_info, user_vision, step_outputs, extra)
+            _trace_slots(prompt_span, step_info, user_vision, step_outputs, extra)
+        return step_info["system_prompt"], "".join(segments) + rest, None
+    with span("build_step_request", cat="prompt", step=step_info.get("phase_name")) as prompt_span:
+        segments, rest = build_prompt_parts(step_info, user_vision, step_outputs, extra)
+        _trace_slots(prompt_span, step_info, user_vision, step_outputs, extra)
+        user_prompt = f"Instructions for this step:\n{step_info['system_prompt']}\n\n{rest}"
+        return SHARED_SYSTEM_PROMPT, user_prompt, segments
+
+
+async def aprepare_outputs(step_index: int, step_info: dict, user_vision: str, step_outputs: Dict[int, str],
+                           context_manager: StepContextManager = None) -> Dict[int, str]:
+    """
+    Returns the prior outputs to paste into this step's prompt: passed through the
+    context manager (reasoning stripped, oversized outputs compacted to the step's
+    token budget) when one is given, else step_outputs unchanged.
+    """
+    if context_manager is None:
+        return step_outputs
+    carried = await context_manager.prepare(step_index, step_info, user_vision, step_outputs)
+    print(context_manager.describe(step_index))
+    return carried
+
+
+def make_llm_summarizer(orchestrator: AIOrchestrator):
+    """
+    Returns an async (text, target_tokens) -> summary callable for StepContextManager,
+    backed by a short LLM call.
+    """
+    async def summarize(text: str, target_tokens: int) -> str:
+        return await orchestrator.acall_llm(
+            "You condense documents. Keep every named solution, mechanism, decision and number; drop repetition.",
+            f"Condense the following to at most about {target_tokens} tokens. Output only the condensed text.\n\n{text}",
+            max_tokens=min(max(256, int(target_tokens * 1.2)), 4096),
+        )
+    return summarize
+
 
 class ProjectFile:
-    def __init__(self, path: str, content: str):
+    """
+    In-memory copy of a project file. Tracks the hash of the content last written
+    to (or read from) disk, so unchanged files can be skipped when flushing.
+
+    Files found on disk are created with ProjectFile.on_disk(...) and read lazily,
+    on first access to their content; until then they are clean by definition.
+    If the scanner already knows the disk hash, replacing the content does not
+    need to read the old one.
+    """
+
+    def __init__(self, path: str, content: str, dirty: bool = True):
         self.path = path
-        self.content = content
+        self._content = content
+        self._source = None
+        self._hash = None
+        self.disk_hash = None if dirty else self.content_hash
+
+    @classmethod
+    def on_disk(cls, path: str, source: Path, disk_hash: str = None) -> "ProjectFile":
+        pf = cls.__new__(cls)
+        pf.path = path
+        pf._content = None
+        pf._source = source
+        pf._hash = None
+        pf.disk_hash = disk_hash
+        return pf
+
+    @property
+    def loaded(self) -> bool:
+        return self._content is not None
+
+    def _load(self):
+        try:
+            self._content = self._source.read_text(encoding="utf-8")
+        except Exception as e:
+            print(f"Skipping {self.path}: {e}")
+            self._content = ""
+        self._source = None
+        self._hash = None
+        self.disk_hash = self.content_hash
+
+    @property
+    def content(self) -> str:
+        if self._content is None:
+            self._load()
+        return self._content
+
+    @content.setter
+    def content(self, value: str):
+        if self._content is None and self.disk_hash is None:
+            # Load first so disk_hash reflects what is actually on disk
+            self._load()
+        self._source = None
+        self._content = value
+        self._hash = None
+
+    @property
+    def content_hash(self) -> str:
+        if self._hash is None:
+            self._hash = hashlib.sha256(self.content.encode("utf-8")).hexdigest()
+        return self._hash
+
+    @property
+    def dirty(self) -> bool:
+        if self._content is None:
+            return False
+        return self.disk_hash != self.content_hash
+
+    def mark_clean(self):
+        self.disk_hash = self.content_hash
 
 def read_project_files(project_root: str) -> Dict[str, "ProjectFile"]:
     """
-    Reads text files from project_root, ignoring .git or obvious binaries.
-    Returns a dict: { "relative/path": ProjectFile(...) }
+    Lists text files under project_root via the incremental scanner (ignored
+    directories like .git are pruned, binaries are sniffed and skipped).
+    Returns a dict: { "relative/path": ProjectFile(...) }; contents are read on first access.
     """
     file_map = {}
     root = Path(project_root)
@@ -49,53 +481,245 @@ def read_project_files(project_root: str) -> Dict[str, "ProjectFile"]:
         print(f"Warning: {project_root} is not a directory.")
         return file_map
 
-    for p in root.rglob("*"):
-        if p.is_file():
-            # Use Path's methods to get platform-independent relative path
-            rel_path = str(p.relative_to(root))
-            # skip .git or some binaries
-            if ".git" in rel_path:
-                continue
-            if p.suffix in [".png", ".jpg", ".exe", ".dll"]:
-                continue
-            try:
-                content = p.read_text(encoding="utf-8")
-                file_map[rel_path] = ProjectFile(rel_path, content)
-            except Exception as e:
-                print(f"Skipping {rel_path}: {e}")
+    scanner = ProjectScanner(project_root)
+    for rel_path, entry in scanner.scan().items():
+        if entry.binary:
+            continue
+        file_map[rel_path] = ProjectFile.on_disk(rel_path, root / rel_path, disk_hash=entry.hash)
+    stats = scanner.stats
+    print(f"Scanned {stats['files']} project file(s): {stats['reused']} unchanged, "
+          f"{stats['hashed']} (re)hashed, {stats['binary']} binary skipped.")
     return file_map
 
-def write_project_file(project_root: str, pf: ProjectFile):
+def _fsync_dir(directory: Path):
     """
-    Ensures the parent directory exists and writes updated content.
-    Added robust error handling and extra debugging.
+    Persists directory entries (renames) to disk. Not supported on Windows, where it's a no-op.
     """
-    # Use pathlib for cross-platform path handling
-    target = Path(project_root) / pf.path
-    print(f"DEBUG: Attempting to write to {target}")
-    
+    if os.name == "nt":
+        return
+    fd = os.open(str(directory), os.O_RDONLY)
     try:
-        # Create all parent directories
-        target.parent.mkdir(parents=True, exist_ok=True)
-        print(f"DEBUG: Ensured parent directory exists: {target.parent}")
-        
-        # Write the file
-        target.write_text(pf.content, encoding="utf-8")
-        print(f"DEBUG: Successfully wrote {len(pf.content)} characters to {target}")
-        
-        # Verify file exists
-        if target.exists():
-            print(f"DEBUG: File exists verification passed for {target}")
-            print(f"DEBUG: File size: {target.stat().st_size} bytes")
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_project_file(project_root: str, pf: ProjectFile, debug_io: bool = True, fsync_dir: bool = True) -> int:
+    """
+    Ensures the parent directory exists and atomically writes updated content:
+    the data goes to a temp file in the same directory, is fsynced, then renamed
+    over the target. Returns the number of bytes written (0 on failure).
+
+    debug_io=False skips the per-file DEBUG prints and the exists/stat verification.
+    fsync_dir=False leaves the directory fsync to the caller (see flush_project_files).
+    """
+    with span("write_project_file", cat="io", path=pf.path):
+        # Use pathlib for cross-platform path handling
+        target = Path(project_root) / pf.path
+        if debug_io:
+            print(f"DEBUG: Attempting to write to {target}")
+
+        try:
+            # Create all parent directories
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if debug_io:
+                print(f"DEBUG: Ensured parent directory exists: {target.parent}")
+
+            # Write to a temp file next to the target, then atomically replace it
+            data = pf.content.encode("utf-8")
+            fd, tmp_name = tempfile.mkstemp(dir=str(target.parent), prefix=f".{target.name}.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                # mkstemp creates 0600 files; keep the existing mode, or use a regular 0644
+                mode = target.stat().st_mode & 0o777 if target.exists() else 0o644
+                os.chmod(tmp_name, mode)
+                os.replace(tmp_name, target)
+            except BaseException:
+                try:
+                    os.unlink(tmp_name)
+                except OSError:
+                    pass
+                raise
+            if fsync_dir:
+                _fsync_dir(target.parent)
+            pf.mark_clean()
+            if debug_io:
+                print(f"DEBUG: Successfully wrote {len(pf.content)} characters to {target}")
+
+                # Verify file exists
+                if target.exists():
+                    print(f"DEBUG: File exists verification passed for {target}")
+                    print(f"DEBUG: File size: {target.stat().st_size} bytes")
+                else:
+                    print(f"ERROR: File should exist but doesn't: {target}")
+            return len(data)
+
+        except Exception as e:
+            print(f"ERROR writing to {target}: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            return 0
+
+
+def flush_project_files(project_root: str, file_map: Dict[str, ProjectFile], debug_io: bool = True) -> List[str]:
+    """
+    Writes only the files whose content changed since they were last read or written,
+    then fsyncs each touched directory once. Returns the relative paths written.
+    """
+    written = []
+    touched_dirs = set()
+    for rel_path, pf in file_map.items():
+        if not pf.dirty:
+            continue
+        write_project_file(project_root, pf, debug_io=debug_io, fsync_dir=False)
+        if not pf.dirty:
+            written.append(rel_path)
+            touched_dirs.add((Path(project_root) / pf.path).parent)
+    for directory in touched_dirs:
+        try:
+            _fsync_dir(directory)
+        except OSError as e:
+            print(f"ERROR syncing directory {directory}: {e}")
+    return written
+
+
+class StreamingFileParser:
+    """
+    Single-pass incremental parser for the `=== File: path ===` block format.
+
+    Text can be fed in arbitrary chunks (e.g. streamed deltas). Each chunk is only
+    checked for a marker around its own boundary; the chunks of the current block
+    are joined once, when the next marker arrives, and the file body is taken as a
+    slice of that buffer (no per-line lists). As soon as a file block is closed by
+    the next marker, it is stored in file_map and passed to the optional
+    on_file(ProjectFile) callback (write-through). The last block is committed by close().
+    """
+
+    MARKER = "=== File: "
+    # A marker only counts at the start of a line
+    _NEEDLE = "\n" + MARKER
+    _LINE_END_CR = re.compile(r"\r+$", re.MULTILINE)
+
+    def __init__(self, file_map: Dict[str, ProjectFile], on_file=None):
+        self.file_map = file_map
+        self.on_file = on_file
+        self.current_file = None
+        # Unconsumed text (current body so far, or an unfinished marker line), as chunks;
+        # the leading "\n" makes a marker on the very first line match _NEEDLE too
+        self._parts: List[str] = ["\n"]
+        # Last len(_NEEDLE) - 1 characters seen, to catch markers split across chunks
+        self._tail = "\n"
+        self._marker_open = False
+
+    def feed(self, chunk: str):
+        """
+        Consumes a chunk of response text, committing every file block it closes.
+        """
+        if not chunk:
+            return
+        self._parts.append(chunk)
+        if self._marker_open:
+            if "\n" not in chunk:
+                return
         else:
-            print(f"ERROR: File should exist but doesn't: {target}")
-            
-    except Exception as e:
-        print(f"ERROR writing to {target}: {str(e)}")
-        import traceback
-        traceback.print_exc()
+            window = self._tail + chunk
+            self._tail = window[-(len(self._NEEDLE) - 1):]
+            if self._NEEDLE not in window:
+                if self.current_file is None and len(self._parts) > 1:
+                    # Text before the first marker is never used
+                    self._parts = [self._tail]
+                return
+        self._parts = [self._consume("".join(self._parts))]
+
+    def parse(self, text: str):
+        """
+        Parses a complete response in one pass (equivalent to feed(text) + close()).
+        """
+        if self._parts == ["\n"]:
+            # Nothing buffered yet: scan text in place instead of copying it into a buffer
+            self._parts = [self._consume(text, at_line_start=True)]
+        else:
+            self.feed(text)
+        self.close()
 
-def parse_ai_response_and_apply(ai_text: str, file_map: Dict[str, ProjectFile]):
+    def close(self):
+        """
+        Commits the last file block (or a trailing marker line with no body).
+        """
+        data = "".join(self._parts)
+        self._parts = ["\n"]
+        self._tail = "\n"
+        if self._marker_open:
+            self._marker_open = False
+            self._open_file(data[len(self._NEEDLE):])
+            if self.current_file is not None:
+                self._commit_file("")
+        elif self.current_file is not None:
+            body = data[1:]
+            self._commit_file(body[:-1] if body.endswith("\n") else body)
+        self.current_file = None
+
+    def _consume(self, data: str, at_line_start: bool = False) -> str:
+        """
+        Commits every block closed within data; returns the text still pending.
+        at_line_start means data[0] begins a line (so a marker there counts).
+        A pending body is kept with the newline that ended its marker line in front,
+        so a marker right at the start of the next chunk is still preceded by "\n".
+        """
+        body_start = 1 if self.current_file is not None else 0
+        self._marker_open = False
+        if at_line_start and data.startswith(self.MARKER):
+            # The newline "before" data is virtual: the marker line starts at 0
+            marker, found = -1, True
+        else:
+            marker = data.find(self._NEEDLE)
+            found = marker != -1
+        while found:
+            if self.current_file is not None:
+                self._commit_file(data[body_start:marker])
+                self.current_file = None
+            line_start = marker + 1
+            line_end = data.find("\n", line_start)
+            if line_end == -1:
+                # Marker line not finished yet: keep it (with its leading newline) for later
+                self._marker_open = True
+                self._tail = data[-(len(self._NEEDLE) - 1):]
+                return data[marker:] if marker >= 0 else "\n" + data
+            self._open_file(data[line_start + len(self.MARKER):line_end])
+            body_start = line_end + 1
+            # The body's terminating "\n" is the first char of the next _NEEDLE
+            marker = data.find(self._NEEDLE, line_end)
+            found = marker != -1
+        self._tail = data[-(len(self._NEEDLE) - 1):]
+        if self.current_file is None:
+            return self._tail
+        return data[body_start - 1:]
+
+    def _open_file(self, marker_rest: str):
+        path = marker_rest.rstrip("\r").strip()
+        # Drop the closing "===" of the marker line so it doesn't end up in the path
+        if path.endswith("==="):
+            path = path[:-3].rstrip()
+        self.current_file = path or None
+
+    def _commit_file(self, body: str):
+        if "\r" in body:
+            body = self._LINE_END_CR.sub("", body)
+        # Normalize path separators for cross-platform compatibility
+        normalized_path = self.current_file.replace('/', os.path.sep)
+        if normalized_path not in self.file_map:
+            # Create a new entry if it doesn't exist
+            self.file_map[normalized_path] = ProjectFile(normalized_path, "")
+        self.file_map[normalized_path].content = body
+        print(f"DEBUG: Processed file {normalized_path}")
+        if self.on_file is not None:
+            self.on_file(self.file_map[normalized_path])
+
+
+def parse_ai_response_and_apply(ai_text: str, file_map: Dict[str, ProjectFile], on_file=None):
     """
     Looks for lines of the form:
       === File: path/to/file ===
@@ -104,36 +728,355 @@ def parse_ai_response_and_apply(ai_text: str, file_map: Dict[str, ProjectFile]):
     Then we store that content in file_map[path].
     If path not in file_map, we create a new entry (new file).
     Makes sure to normalize paths for cross-platform compatibility.
+    on_file(ProjectFile), if given, is called as each file block is completed.
     """
-    lines = ai_text.splitlines()
-    current_file = None
-    content_buffer: List[str] = []
-
-    def commit_file():
-        nonlocal current_file, content_buffer
-        if current_file:
-            # Normalize path separators for cross-platform compatibility
-            normalized_path = current_file.replace('/', os.path.sep)
-            if normalized_path not in file_map:
-                # Create a new entry if it doesn't exist
-                file_map[normalized_path] = ProjectFile(normalized_path, "")
-            file_map[normalized_path].content = "\n".join(content_buffer)
-            print(f"DEBUG: Processed file {normalized_path}")
+    with span("parse_ai_response_and_apply", cat="parse", chars=len(ai_text)):
+        StreamingFileParser(file_map, on_file=on_file).parse(ai_text)
 
-    for line in lines:
-        if line.startswith("=== File: "):
-            # commit previous file
-            commit_file()
-            current_file = line.replace("=== File: ", "").strip()
-            content_buffer = []
+
+def parse_ai_response_chunks(chunks: Iterable[str], file_map: Dict[str, ProjectFile], on_file=None):
+    """
+    Same as parse_ai_response_and_apply, for a response arriving as an iterator of text chunks.
+    Markers split across chunk boundaries are recognised.
+    """
+    parser = StreamingFileParser(file_map, on_file=on_file)
+    for chunk in chunks:
+        parser.feed(chunk)
+    parser.close()
+
+
+def stream_llm_and_apply(orchestrator: AIOrchestrator, system_prompt: str, user_prompt: str,
+                         file_map: Dict[str, ProjectFile], on_file=None, refresh: bool = False,
+                         prompt_prefix: List[str] = None, max_tokens: int = DEFAULT_STEP_MAX_TOKENS,
+                         thinking_budget: int = None) -> str:
+    """
+    Streams a step's response to stdout while feeding the answer text through
+    StreamingFileParser, so file blocks land in file_map (and on_file) as soon as
+    their marker closes. Returns the full response, formatted like call_llm's.
+    """
+    parser = StreamingFileParser(file_map, on_file=on_file)
+    thinking_parts: List[str] = []
+    answer_parts: List[str] = []
+    in_thinking = False
+
+    print("\nAI Response (streaming):")
+    for kind, delta in orchestrator.stream_llm(system_prompt, user_prompt, max_tokens=max_tokens, refresh=refresh,
+                                               prompt_prefix=prompt_prefix, thinking_budget=thinking_budget):
+        if kind == "thinking":
+            if not in_thinking:
+                print("[thinking]")
+                in_thinking = True
+            thinking_parts.append(delta)
         else:
-            # accumulate lines for this file
-            content_buffer.append(line)
+            if in_thinking:
+                print("\n[answer]")
+                in_thinking = False
+            answer_parts.append(delta)
+            parser.feed(delta)
+        print(delta, end="", flush=True)
+    print()
+    parser.close()
+
+    label = "Reasoning" if orchestrator.model_name == "deepseekr1" else "Thinking"
+    return format_response("".join(thinking_parts), "".join(answer_parts), label)
+
+SOLUTION_HEADER = re.compile(r"^[ \t#*>_-]*Solution\s+([A-Z])\b", re.MULTILINE)
+
+# Upper bound on concurrent per-solution calls in fan-out mode
+FAN_OUT_CONCURRENCY = 4
+
+
+def split_solutions(text: str) -> List[tuple]:
+    """
+    Splits a step 2 response into [(label, section_text), ...] using its
+    "Solution A", "Solution B"... headers. Any reasoning preamble and text
+    before the first header are dropped. Repeated labels keep the first section.
+    """
+    if "\n\nAnswer:\n" in text:
+        text = text.split("\n\nAnswer:\n", 1)[1]
+    matches = list(SOLUTION_HEADER.finditer(text))
+    sections = []
+    seen = set()
+    for n, match in enumerate(matches):
+        label = match.group(1)
+        if label in seen:
+            continue
+        seen.add(label)
+        end = matches[n + 1].start() if n + 1 < len(matches) else len(text)
+        sections.append((label, text[match.start():end].strip()))
+    return sections
+
+
+async def fan_out_step(orchestrator: AIOrchestrator, step: dict, user_vision: str,
+                       step_outputs: Dict[int, str], max_concurrency: int = FAN_OUT_CONCURRENCY,
+                       context_outputs: Dict[int, str] = None, prompt_cache: bool = True,
+                       refresh: bool = False):
+    """
+    Map/reduce execution of a step with a "fan_out" spec: one call per solution
+    section of the source step, run in parallel (bounded by max_concurrency), then
+    stitched back together in label order. Returns None when the source output
+    has fewer than two solutions, so the caller can fall back to a single call.
+    context_outputs (e.g. reasoning-stripped outputs) fill the {stepN} slots
+    of each per-solution prompt instead of the raw step_outputs. refresh bypasses the
+    response cache for every deep-dive call (as when retrying the step).
+    """
+    spec = step["fan_out"]
+    solutions = split_solutions(step_outputs.get(spec["source_step"], ""))
+    if len(solutions) < 2:
+        return None
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+    map_step = {"system_prompt": step["system_prompt"], "user_prompt_template": spec["user_prompt_template"]}
+
+    async def deep_dive(label: str, section: str) -> str:
+        system_prompt, user_prompt, prompt_prefix = build_step_request(
+            map_step, user_vision, context_outputs or step_outputs, prompt_cache, extra={"solution": section})
+        async with semaphore:
+            print(f"Fan-out: deep-diving Solution {label}...")
+            return await orchestrator.acall_llm(
+                system_prompt, user_prompt, refresh=refresh,
+                max_tokens=spec.get("max_tokens", 2048), prompt_prefix=prompt_prefix,
+            )
+
+    results = await asyncio.gather(*(deep_dive(label, section) for label, section in solutions))
+    return "\n\n".join(
+        f"## Solution {label}\n\n{result.strip()}" for (label, _), result in zip(solutions, results)
+    )
+
+
+_routing_fallbacks = set()
+
+
+def with_step_thinking(steps: List[dict]) -> List[dict]:
+    """
+    steps with the STEP_THINKING_BUDGETS applied; a step's own thinking_budget wins.
+    """
+    return [{**step, "thinking_budget": STEP_THINKING_BUDGETS[index]}
+            if index in STEP_THINKING_BUDGETS and "thinking_budget" not in step else step
+            for index, step in enumerate(steps, start=1)]
+
+
+def step_model(step: dict, default_model: str) -> str:
+    """
+    The model a step runs on: its "model" (a MODEL_TIERS tier or a model name), else
+    default_model. A routed model without an API key falls back to default_model.
+    """
+    model = step.get("model")
+    if not model:
+        return default_model
+    model = (MODEL_TIERS.get(model, model) or default_model).lower()
+    if model != default_model and not model_available(model):
+        if model not in _routing_fallbacks:
+            _routing_fallbacks.add(model)
+            print(f"No API key for {model}; steps routed to it use {default_model} instead.")
+        return default_model
+    return model
+
+
+def orchestrator_for_step(orchestrator: AIOrchestrator, step: dict) -> AIOrchestrator:
+    """
+    The orchestrator for the step's model (see step_model); siblings share hedging and clients.
+    """
+    model = step_model(step, orchestrator.model_name)
+    return orchestrator if model == orchestrator.model_name else orchestrator.sibling(model)
+
+
+def describe_route(orchestrator: AIOrchestrator, step: dict, thinking_budget: int = None) -> str:
+    thinking = thinking_budget if thinking_budget is not None else step.get("thinking_budget")
+    return (f"{orchestrator.model_name}, max_tokens {step.get('max_tokens', DEFAULT_STEP_MAX_TOKENS)}"
+            + (f", thinking {thinking}" if thinking and orchestrator.model_name == "claude37sonnet" else ""))
+
+
+async def acall_step(orchestrator: AIOrchestrator, step: dict, user_vision: str, step_outputs: Dict[int, str],
+                     prompt_outputs: Dict[int, str] = None, fan_out: bool = False, refresh: bool = False,
+                     prompt_cache: bool = True, thinking_budget: int = None) -> str:
+    """
+    Runs one step on its routed model (see orchestrator_for_step): fan-out map/reduce
+    when enabled and the step supports it, otherwise a single call. prompt_outputs (see aprepare_outputs) fill the
+    prompt's {stepN} slots; step_outputs is used to find the fan-out solutions.
+    thinking_budget overrides the step's own (0 = no thinking).
+    """
+    prompt_outputs = prompt_outputs if prompt_outputs is not None else step_outputs
+    if thinking_budget is None:
+        thinking_budget = step.get("thinking_budget")
+    orchestrator = orchestrator_for_step(orchestrator, step)
+    if fan_out and "fan_out" in step:
+        stitched = await fan_out_step(orchestrator, step, user_vision, step_outputs,
+                                      context_outputs=prompt_outputs, prompt_cache=prompt_cache, refresh=refresh)
+        if stitched is not None:
+            return stitched
+        print("Fan-out: fewer than two solutions found, falling back to a single call.")
+    system_prompt, user_prompt, prompt_prefix = build_step_request(step, user_vision, prompt_outputs, prompt_cache)
+    return await orchestrator.acall_llm(system_prompt, user_prompt, refresh=refresh, prompt_prefix=prompt_prefix,
+                                        max_tokens=step.get("max_tokens", DEFAULT_STEP_MAX_TOKENS),
+                                        thinking_budget=thinking_budget)
+
+
+def write_step_output(project_dir: str, step: dict, ai_response: str,
+                      file_map: Dict[str, ProjectFile], debug_io: bool = True) -> List[str]:
+    """
+    Stores the step's full response in its output_file (if it has one) and flushes
+    every file the step changed. Returns the relative paths written.
+    """
+    output_file = step.get("output_file")
+    if output_file:
+        print(f"DIRECT WRITE: Creating {output_file} regardless of file markers...")
+        # Create file contents with step name header and AI response
+        content = f"# {step['phase_name']}\n\n{ai_response}"
+        file_map[output_file] = ProjectFile(output_file, content)
+
+    # Write only the files this step changed
+    written = flush_project_files(project_dir, file_map, debug_io=debug_io)
+    print(f"Flushed {len(written)} changed file(s).")
+    if output_file:
+        print(f"DIRECT WRITE: Successfully wrote {output_file} to {project_dir}/{output_file}")
+    return written
+
+
+async def aapply_step_output(project_dir: str, step: dict, ai_response: str, file_map: Dict[str, ProjectFile],
+                             lock: asyncio.Lock, debug_io: bool = True) -> List[str]:
+    """
+    parse_ai_response_and_apply + write_step_output on a worker thread, so parsing a
+    large response and flushing its files doesn't stall other steps' calls on the
+    event loop. lock serializes steps sharing file_map (a flush writes every dirty file).
+    """
+    def apply() -> List[str]:
+        parse_ai_response_and_apply(ai_response, file_map)
+        return write_step_output(project_dir, step, ai_response, file_map, debug_io=debug_io)
+
+    async with lock:
+        return await asyncio.to_thread(apply)
+
+
+def observe_step(step: dict, model_name: str, started: float, file_map: Dict[str, ProjectFile], written: List[str]):
+    """
+    Reports a finished step (wall time since started, bytes it wrote) to the metrics registry.
+    """
+    bytes_written = sum(len(file_map[p].content.encode("utf-8")) for p in written if p in file_map)
+    get_metrics().observe_step(step["phase_name"], model_name, time.time() - started, bytes_written)
+
+
+def observe_step_thinking(orchestrator: AIOrchestrator, step: dict, thinking_budget: int, seconds: float,
+                          ai_response: str, usage_before: dict, user_quality: float = 1.0):
+    """
+    Feeds a step call's latency and quality to the adaptive thinking controller, if any.
+    Quality is output_quality(...) capped by user_quality (the user's verdict, when asked).
+    Responses served from the response cache are skipped: they say nothing about latency.
+    """
+    if orchestrator.thinking_controller is None or not step.get("thinking_budget"):
+        return
+    if orchestrator.client.usage_snapshot()["requests"] == usage_before["requests"]:
+        return
+    quality = min(user_quality, output_quality(ai_response, step.get("max_tokens", DEFAULT_STEP_MAX_TOKENS),
+                                               thinking_budget))
+    orchestrator.observe_thinking(step["phase_name"], thinking_budget, seconds, quality)
+
+
+def load_extra_steps(path: str) -> List[dict]:
+    """
+    Loads user-defined steps from a JSON list. Each entry needs phase_name, system_prompt
+    and user_prompt_template ({vision}/{stepN} placeholders); output_file, model,
+    max_tokens and thinking_budget are optional.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        extra = json.load(f)
+    for step in extra:
+        missing = {"phase_name", "system_prompt", "user_prompt_template"} - step.keys()
+        if missing:
+            raise ValueError(f"Extra step {step.get('phase_name', '?')} is missing {sorted(missing)}")
+        model = step.get("model")
+        if model and model not in MODEL_TIERS and model.lower() not in ("claude37sonnet", "deepseekr1"):
+            raise ValueError(f"Extra step {step['phase_name']} has unknown model {model!r}")
+        # Parses (and caches) the template; an unknown placeholder raises TemplateError
+        compile_step_template(step["user_prompt_template"], step["phase_name"])
+    return extra
+
+
+async def run_walkthrough_async(orchestrator: AIOrchestrator, user_vision: str, project_dir: str,
+                                file_map: Dict[str, ProjectFile], steps: List[dict] = None,
+                                step_outputs: Dict[int, str] = None, debug_io: bool = True,
+                                max_concurrency: int = None, fan_out: bool = False,
+                                context_manager: StepContextManager = None,
+                                prompt_cache: bool = True, journal: RunJournal = None) -> StepScheduler:
+    """
+    Non-interactive walkthrough: runs the steps as a dependency DAG, with every step
+    whose {stepN} inputs are ready in flight concurrently, and applies each output
+    as soon as it arrives. Returns the scheduler for timing / critical-path reporting.
+
+    Steps already present in step_outputs (e.g. restored from a run journal) are not
+    re-run. With a journal, each finished step is recorded before it counts as done.
+    """
+    steps = steps if steps is not None else STEPS
+    step_outputs = step_outputs if step_outputs is not None else {}
+    completed = set(step_outputs)
+    scheduler = StepScheduler(steps, max_concurrency=max_concurrency)
+    apply_lock = asyncio.Lock()
+
+    async def execute(index: int, step: dict) -> str:
+        if index in completed:
+            print(f"\n=== {step['phase_name']} === (already completed, resumed from journal)")
+            return step_outputs[index]
+        step_orchestrator = orchestrator_for_step(orchestrator, step)
+        with span(step["phase_name"], cat="step", step=step["phase_name"], model=step_orchestrator.model_name):
+            thinking_budget = step_orchestrator.thinking_budget_for(step["phase_name"], step.get("thinking_budget"))
+            print(f"\n=== {step['phase_name']} === "
+                  f"(started on {describe_route(step_orchestrator, step, thinking_budget)})")
+            started = time.time()
+            prompt_outputs = await aprepare_outputs(index, step, user_vision, step_outputs, context_manager)
+            # Concurrent steps on the same client can hide a cache hit here; good enough for the controller
+            usage_before = step_orchestrator.client.usage_snapshot()
+            call_started = time.time()
+            ai_response = await acall_step(step_orchestrator, step, user_vision, step_outputs, prompt_outputs,
+                                           fan_out=fan_out, prompt_cache=prompt_cache, thinking_budget=thinking_budget)
+            observe_step_thinking(step_orchestrator, step, thinking_budget, time.time() - call_started,
+                                  ai_response, usage_before)
+            print(f"\n=== {step['phase_name']} === (done, {len(ai_response)} chars)")
+            written = await aapply_step_output(project_dir, step, ai_response, file_map, apply_lock,
+                                               debug_io=debug_io)
+            observe_step(step, step_orchestrator.model_name, started, file_map, written)
+            step_outputs[index] = ai_response
+            if journal is not None:
+                journal.record_step(index, step, ai_response, step_orchestrator.model_name,
+                                    prompt_hash(*build_step_request(step, user_vision, prompt_outputs, prompt_cache)),
+                                    started, time.time())
+            return ai_response
+
+    await scheduler.run(execute)
+    return scheduler
 
-    # commit last file
-    commit_file()
 
 def main():
+    """
+    Entry point: --trace-out F records the whole run as a Chrome trace (see tracing.py);
+    --record-cassette F / --replay-cassette F record or replay its LLM calls (see cassette.py).
+    """
+    if '--trace-out' in sys.argv:
+        pos = sys.argv.index('--trace-out')
+        if pos + 1 >= len(sys.argv):
+            print("--trace-out requires a file path for the trace JSON")
+            sys.exit(1)
+        enable_tracing(sys.argv[pos + 1])
+        del sys.argv[pos:pos + 2]
+    replay_latency = '--replay-latency' in sys.argv
+    if replay_latency:
+        sys.argv.remove('--replay-latency')
+    for flag, mode in (('--record-cassette', RECORD), ('--replay-cassette', REPLAY)):
+        if flag in sys.argv:
+            pos = sys.argv.index(flag)
+            if pos + 1 >= len(sys.argv):
+                print(f"{flag} requires a cassette file path")
+                sys.exit(1)
+            try:
+                use_cassette(sys.argv[pos + 1], mode, recorded_timing=replay_latency)
+            except (OSError, ValueError) as e:
+                print(f"Cannot open cassette {sys.argv[pos + 1]}: {e}")
+                sys.exit(1)
+            del sys.argv[pos:pos + 2]
+    with span("main", cat="run"):
+        _main()
+
+
+def _main():
     # Platform check
     if sys.platform == 'win32':
         print("INFO: Running on Windows. Using platform-compatible path handling.")
@@ -143,6 +1086,116 @@ def main():
     # Check for auto-yes flag
     auto_yes = False
     args = sys.argv.copy()
+    stream_mode = False
+    if '--stream' in args:
+        stream_mode = True
+        args.remove('--stream')
+    debug_io = True
+    if '--no-debug-io' in args:
+        debug_io = False
+        args.remove('--no-debug-io')
+    context_budget = DEFAULT_INPUT_TOKEN_BUDGET
+    if '--context-budget' in args:
+        pos = args.index('--context-budget')
+        if pos + 1 >= len(args) or not args[pos + 1].isdigit():
+            print("--context-budget requires a number of tokens")
+            sys.exit(1)
+        context_budget = int(args[pos + 1])
+        del args[pos:pos + 2]
+    use_context_manager = True
+    if '--no-context-manager' in args:
+        use_context_manager = False
+        args.remove('--no-context-manager')
+    summarize_context = False
+    if '--summarize-context' in args:
+        summarize_context = True
+        args.remove('--summarize-context')
+    fan_out = False
+    if '--fan-out' in args:
+        fan_out = True
+        args.remove('--fan-out')
+    prompt_cache = True
+    if '--no-prompt-cache' in args:
+        prompt_cache = False
+        args.remove('--no-prompt-cache')
+    parallel = False
+    if '--parallel' in args:
+        parallel = True
+        args.remove('--parallel')
+    metrics_out = None
+    if '--metrics-out' in args:
+        pos = args.index('--metrics-out')
+        if pos + 1 >= len(args):
+            print("--metrics-out requires a file path (.prom for Prometheus text, otherwise JSON lines)")
+            sys.exit(1)
+        metrics_out = args[pos + 1]
+        del args[pos:pos + 2]
+    single_model = False
+    if '--single-model' in args:
+        single_model = True
+        args.remove('--single-model')
+    hedge = False
+    if '--hedge' in args:
+        hedge = True
+        args.remove('--hedge')
+    thinking = False
+    if '--thinking' in args:
+        thinking = True
+        args.remove('--thinking')
+    adaptive_thinking = False
+    if '--adaptive-thinking' in args:
+        adaptive_thinking = True
+        args.remove('--adaptive-thinking')
+    latency_target = None
+    if '--latency-target' in args:
+        pos = args.index('--latency-target')
+        try:
+            latency_target = float(args[pos + 1])
+        except (IndexError, ValueError):
+            latency_target = None
+        if latency_target is None or not latency_target > 0:
+            print("--latency-target requires a positive number of seconds per call")
+            sys.exit(1)
+        del args[pos:pos + 2]
+    deadline = None
+    if '--deadline' in args:
+        pos = args.index('--deadline')
+        try:
+            deadline_seconds = float(args[pos + 1])
+        except (IndexError, ValueError):
+            deadline_seconds = None
+        if deadline_seconds is None or not deadline_seconds > 0:
+            print("--deadline requires a positive number of seconds for the whole run")
+            sys.exit(1)
+        deadline = time.time() + deadline_seconds
+        del args[pos:pos + 2]
+    hedge_percentile = None
+    if '--hedge-percentile' in args:
+        pos = args.index('--hedge-percentile')
+        try:
+            hedge_percentile = float(args[pos + 1])
+        except (IndexError, ValueError):
+            hedge_percentile = None
+        if hedge_percentile is None or not 0 < hedge_percentile <= 100:
+            print("--hedge-percentile requires a percentile between 0 and 100 (e.g. 95)")
+            sys.exit(1)
+        del args[pos:pos + 2]
+    resume_id = None
+    if '--resume' in args:
+        pos = args.index('--resume')
+        if pos + 1 >= len(args):
+            print("--resume requires a run id (see some_project/.runs/)")
+            sys.exit(1)
+        resume_id = args[pos + 1]
+        del args[pos:pos + 2]
+    steps = list(STEPS)
+    if '--extra-steps' in args:
+        pos = args.index('--extra-steps')
+        if pos + 1 >= len(args):
+            print("--extra-steps requires a path to a JSON file")
+            sys.exit(1)
+        steps += load_extra_steps(args[pos + 1])
+        del args[pos:pos + 2]
     if '--auto-yes' in args:
         auto_yes = True
         args.remove('--auto-yes')
@@ -150,16 +1203,69 @@ def main():
         auto_yes = True
         args.remove('-y')
     
-    if len(args) < 2:
-        print("Usage: python orchestrator.py [--auto-yes|-y] <claude37sonnet|deepseekr1> [domain_challenge_description]")
+    # Prepare "some_project" folder - use pathlib for cross-platform compatibility
+    PROJECT_DIR = "some_project"
+
+    journal = None
+    if resume_id:
+        try:
+            journal = RunJournal.load(PROJECT_DIR, resume_id)
+        except (OSError, ValueError) as e:
+            print(f"Cannot resume run {resume_id}: {e}")
+            sys.exit(1)
+
+    if '--help' in args or '-h' in args or (len(args) < 2 and journal is None):
+        print("Usage: python orchestrator.py [--auto-yes|-y] [--stream] <claude37sonnet|deepseekr1> [domain_challenge_description]")
         print("  --auto-yes, -y : Automatically answer 'yes' to all prompts")
-        sys.exit(1)
+        print("  --stream       : Print responses as they arrive and write file blocks as soon as they close")
+        print("  --no-debug-io  : Skip the per-file DEBUG prints and write verification")
+        print("  --parallel     : (with --auto-yes) Run steps as a dependency DAG, concurrently where possible")
+        print("  --extra-steps F: Append user-defined steps from JSON file F")
+        print("  --fan-out      : Deep-dive each Step 2 solution in its own parallel call (Step 3)")
+        print(f"  --context-budget N  : Input-token budget per step prompt (default {DEFAULT_INPUT_TOKEN_BUDGET}; 0 drops prior outputs)")
+        print("  --summarize-context : Compact oversized prior outputs with an LLM summary instead of trimming")
+        print("  --no-context-manager: Paste prior step outputs verbatim, reasoning traces included")
+        print("  --no-prompt-cache   : Send each step's own system prompt and no provider cache breakpoints")
+        print("  --resume RUN_ID     : Continue a run from its journal (model and challenge optional)")
+        print("  --metrics-out F     : Write call/step metrics to F (.prom = Prometheus text, else JSON lines)")
+        print("  --single-model      : Run every step on the given model (ignore per-step model routing)")
+        print("  --hedge             : Re-send a call to the other model when it runs past the primary's p95 latency")
+        print("  --hedge-percentile P: Latency percentile that triggers a hedge (default 95)")
+        print("  --thinking          : Give steps 4 and 5 extended-thinking budgets (Claude; STEP_THINKING_BUDGETS)")
+        print("  --adaptive-thinking : Like --thinking, but pick each budget (up to the step's) from latency/quality history")
+        print("  --latency-target S  : (with --adaptive-thinking) Per-call latency target in seconds (default 120)")
+        print("  --deadline S        : (with --adaptive-thinking) Turn thinking off when the run nears S seconds")
+        print("  --trace-out F       : Write a Chrome trace of the run to F (open in ui.perfetto.dev)")
+        print("  --record-cassette F : Record every LLM call and its timing to cassette F")
+        print("  --replay-cassette F : Serve LLM calls from cassette F instead of the network")
+        print("  --replay-latency    : (with --replay-cassette) Replay at the recorded latencies, not full speed")
+        sys.exit(0 if '--help' in args or '-h' in args else 1)
 
-    model_name = args[1].lower()
-    orchestrator = AIOrchestrator(model_name)
+    model_name = args[1].lower() if len(args) > 1 else journal.model
+    if single_model:
+        # Keep per-step token budgets, but run every step on the chosen model
+        steps = [{k: v for k, v in step.items() if k != "model"} for step in steps]
+    if thinking or adaptive_thinking:
+        steps = with_step_thinking(steps)
+    hedge_model = None
+    if hedge:
+        # The other provider is the secondary
+        hedge_model = "deepseekr1" if model_name == "claude37sonnet" else "claude37sonnet"
+    thinking_controller = None
+    if adaptive_thinking:
+        thinking_controller = ThinkingBudgetController(
+            history_path=str(Path(PROJECT_DIR) / JOURNAL_DIR / "thinking_history.jsonl"),
+            latency_target=latency_target, deadline=deadline,
+        )
+    orchestrator = AIOrchestrator(model_name, hedge_model=hedge_model,
+                                  hedge_policy=HedgePolicy(percentile=hedge_percentile),
+                                  thinking_controller=thinking_controller)
     
     # Check if domain/challenge was provided as a command line argument
     user_vision = " ".join(args[2:]) if len(args) > 2 else ""
+    if journal is not None:
+        # The resumed steps were built on the journaled challenge (clarifications included)
+        user_vision = journal.vision
 
     # Step 0) Check for user_prompt.txt and offer to use it
     prompt_file_path = "user_prompt.txt"
@@ -181,7 +1287,7 @@ def main():
                     print("Auto-yes enabled: Using user_prompt.txt as domain/challenge.")
                     user_vision = file_content
                 else:
-                    use_file = input("Use this content as your domain/challenge? (y/n): ").strip().lower()
+                    use_file = traced_input("Use this content as your domain/challenge? (y/n): ").strip().lower()
                     if use_file == 'y':
                         user_vision = file_content
                         print("Using user_prompt.txt as domain/challenge.")
@@ -191,14 +1297,16 @@ def main():
     # Step 0) Ask user for project vision if not already set
     if not user_vision:
         print("=== INITIAL DOMAIN OR CHALLENGE ===")
-        user_vision = input("Describe the domain or challenge you want breakthrough ideas for (a line or paragraph): ")
+        user_vision = traced_input("Describe the domain or challenge you want breakthrough ideas for (a line or paragraph): ")
 
     # Step 0.5) Offer to ask follow-up questions
-    if auto_yes:
+    if journal is not None:
+        ask_q = 'n'
+    elif auto_yes:
         print("Auto-yes enabled: Skipping follow-up questions.")
         ask_q = 'n'
     else:
-        ask_q = input("Should the AI ask follow-up questions about your domain/challenge? (y/n): ").strip().lower()
+        ask_q = traced_input("Should the AI ask follow-up questions about your domain/challenge? (y/n): ").strip().lower()
     
     if ask_q == 'y':
         conversation = [
@@ -213,9 +1321,14 @@ def main():
         ]
         while True:
             # let AI ask a question
-            question = orchestrator.client.run(conversation, max_tokens=1024)
+            try:
+                # The growing conversation is a shared prefix: let the provider cache it
+                question = orchestrator.client.run(conversation, max_tokens=1024, cache_conversation=prompt_cache)
+            except LLMError as e:
+                print(f"\nFollow-up questions unavailable, continuing without them: {e}")
+                break
             print("\nAI asks:\n", question)
-            user_ans = input("Your answer (type 'done' to finish Q&A): ")
+            user_ans = traced_input("Your answer (type 'done' to finish Q&A): ")
             if user_ans.strip().lower() == 'done':
                 break
             conversation.append({"role": "assistant", "content": question})
@@ -226,9 +1339,6 @@ def main():
             [f"{msg['role']}: {msg['content']}" for msg in conversation if msg['role'] == 'user']
         )
 
-    # Prepare "some_project" folder - use pathlib for cross-platform compatibility
-    PROJECT_DIR = "some_project"
-    
     # Pre-check to ensure we can create and write to the directories
     try:
         print("PRE-CHECK: Verifying we can create and write to directories...")
@@ -246,6 +1356,9 @@ def main():
         # Try reading the test file
         test_content = test_file.read_text(encoding="utf-8")
         print(f"PRE-CHECK: Successfully read test file content: '{test_content[:20]}...'")
+        # Remove the probe so its timestamp doesn't end up in step prompts (which
+        # would defeat the response cache and cassette replay)
+        test_file.unlink()
         
     except Exception as e:
         print(f"ERROR in pre-check: {str(e)}")
@@ -262,247 +1375,202 @@ def main():
     # We'll store step outputs to feed them as context into subsequent steps
     step_outputs = {}
 
-    # Define our 8-stage Breakthrough-Idea Walkthrough Framework
-    STEPS = [
-        {
-            "phase_name": "1) Context & Constraints Clarification",
-            "system_prompt": (
-                "You are a specialized solutions architect. The user will describe a domain or challenge.\n"
-                "Step 1: Summarize the user's domain, goals, and constraints thoroughly. Then, confirm your understanding of them.\n"
-                "Additionally, collect any unusual references or lesser-known methods you can recall that might apply.\n"
-                "DO NOT disclaim feasibility. Provide a crisp summary of what the user wants, plus a short list of unique references from outside the mainstream."
-            ),
-            "user_prompt_template": (
-                "Step 1: Summarize my domain/goal and constraints. Also gather some obscure or cross-domain references that could help.\n"
-                "Keep it real and near-future, but do not disclaim feasibility. We want fresh synergy ideas.\n\n"
-                "Domain/Challenge:\n{vision}\n"
-            ),
-        },
-        {
-            "phase_name": "2) Divergent Brainstorm of Solutions",
-            "system_prompt": (
-                "Step 2: Provide multiple new or radical solutions that incorporate the domain constraints and your cross-domain references.\n\n"
-                "Generate at least 5 distinct solutions.\n"
-                "Each solution must be novel, mixing known ideas in uncommon ways.\n"
-                "Avoid disclaimers like 'I'm only an AI' or 'This might not be feasible.' The user wants plausible near-future expansions.\n"
-                "Label them \"Solution A, B, C, etc.\""
-            ),
-            "user_prompt_template": (
-                "Step 2: Show me 5 or more novel synergy solutions for my stated domain.\n"
-                "Don't disclaim feasibility. Just produce creative combos.\n"
-                "Title each solution briefly, then describe it in a paragraph or two.\n\n"
-                "Domain/Challenge:\n{vision}\n\n"
-                "Context & Constraints (Step 1 Output):\n{step1}\n"
-            ),
-        },
-        {
-            "phase_name": "3) Deep-Dive on Each Idea's Mechanism",
-            "system_prompt": (
-                "Step 3: For each proposed solution, deep-dive into how it might work. This includes:\n\n"
-                "Underlying logic or theoretical basis.\n"
-                "Potential synergy with domain constraints.\n"
-                "A short example scenario or test application.\n"
-                "A rough list of pros/cons.\n"
-                "No disclaimers or feasibility disclaimers—remain solution-focused."
-            ),
-            "user_prompt_template": (
-                "Step 3: For each solution A, B, C... do a deep-dive.\n"
-                "Show how it might actually function, how it ties back to the domain constraints, what example scenario it solves.\n"
-                "Keep the focus on actionable or near-future expansions—no disclaimers.\n\n"
-                "Domain/Challenge:\n{vision}\n\n"
-                "Context & Constraints (Step 1 Output):\n{step1}\n\n"
-                "Proposed Solutions (Step 2 Output):\n{step2}\n"
-            ),
-        },
-        {
-            "phase_name": "4) Self-Critique for Gaps & Synergy",
-            "system_prompt": (
-                "Step 4: Critically review each solution for missing details, potential synergy across solutions, or expansions.\n\n"
-                "Identify any incomplete sub-points.\n"
-                "Suggest expansions or merges that might create an even stronger approach.\n"
-                "No disclaimers about the entire project's feasibility—just refine or unify solutions."
-            ),
-            "user_prompt_template": (
-                "Step 4: Critique your solutions from Step 3. Note where each is lacking detail, or which synergy merges solutions effectively.\n"
-                "Then propose 1–2 merged solutions that might be even stronger.\n\n"
-                "Domain/Challenge:\n{vision}\n\n"
-                "Context & Constraints (Step 1 Output):\n{step1}\n\n"
-                "Deep-Dive Solutions (Step 3 Output):\n{step3}\n"
-            ),
-        },
-        {
-            "phase_name": "5) Merged Breakthrough Blueprint",
-            "system_prompt": (
-                "Step 5: Provide a final 'Merged Breakthrough Blueprint.' This blueprint is a synergy of the best or boldest features from the prior solutions, shaped into a coherent design.\n\n"
-                "Summarize the blueprint in 3–5 paragraphs, focusing on how it pushes beyond standard practice.\n"
-                "Emphasize real near-future expansions, not disclaimers.\n"
-                "Output the blueprint in `=== File: doc/BREAKTHROUGH_BLUEPRINT.md ===`"
-            ),
-            "user_prompt_template": (
-                "Step 5: Merge your best solutions into one cohesive blueprint.\n"
-                "Aim for truly new synergy beyond typical references.\n"
-                "Provide enough detail so I can see how it might be genuinely game-changing.\n"
-                "Place the blueprint in `=== File: doc/BREAKTHROUGH_BLUEPRINT.md ===`\n\n"
-                "Domain/Challenge:\n{vision}\n\n"
-                "Context & Constraints (Step 1 Output):\n{step1}\n\n"
-                "Critique & Synergy (Step 4 Output):\n{step4}\n"
-            ),
-        },
-        {
-            "phase_name": "6) Implementation Path & Risk Minimization",
-            "system_prompt": (
-                "Step 6: Lay out an implementation or prototyping path. For each step, identify key resources needed.\n"
-                "No disclaimers about overall feasibility—just ways to mitigate risk or handle challenges.\n"
-                "Output the implementation path in `=== File: doc/IMPLEMENTATION_PATH.md ===`"
-            ),
-            "user_prompt_template": (
-                "Step 6: Give me a development path. List each milestone or partial prototype.\n"
-                "Show how I'd start small, prove key parts of the blueprint, then expand. No disclaimers needed; just solution-oriented steps.\n"
-                "Place the implementation path in `=== File: doc/IMPLEMENTATION_PATH.md ===`\n\n"
-                "Domain/Challenge:\n{vision}\n\n"
-                "Breakthrough Blueprint (Step 5 Output):\n{step5}\n"
-            ),
-        },
-        {
-            "phase_name": "7) Cross-Checking with Prior Knowledge",
-            "system_prompt": (
-                "Step 7: Attempt to cross-check if any known open-source or industrial projects come close to your blueprint, and highlight differences.\n\n"
-                "If no direct references exist, you can say it's presumably novel.\n"
-                "Avoid disclaimers; remain solution-based.\n"
-                "Output the cross-check in `=== File: doc/NOVELTY_CHECK.md ===`"
-            ),
-            "user_prompt_template": (
-                "Step 7: Compare your blueprint with existing known projects. Are there partial overlaps? If so, how is this blueprint more advanced or new?\n"
-                "If none are close, then we label it as presumably novel. No disclaimers beyond that.\n"
-                "Place the cross-check in `=== File: doc/NOVELTY_CHECK.md ===`\n\n"
-                "Domain/Challenge:\n{vision}\n\n"
-                "Breakthrough Blueprint (Step 5 Output):\n{step5}\n\n"
-                "Implementation Path (Step 6 Output):\n{step6}\n"
-            ),
-        },
-        {
-            "phase_name": "8) Q&A or Additional Elaborations",
-            "system_prompt": (
-                "Step 8: The user may have specific follow-up questions. Provide direct expansions or clarifications, always focusing on near-future feasibility. Refrain from disclaimers. Always produce constructive expansions.\n"
-                "Output any elaborations in `=== File: doc/ELABORATIONS.md ===`"
-            ),
-            "user_prompt_template": (
-                "Step 8: Let me ask any final clarifications about your final blueprint. Please keep it real near-future, no disclaimers.\n"
-                "Place any elaborations in `=== File: doc/ELABORATIONS.md ===`\n\n"
-                "Domain/Challenge:\n{vision}\n\n"
-                "Breakthrough Blueprint (Step 5 Output):\n{step5}\n\n"
-                "Implementation Path (Step 6 Output):\n{step6}\n\n"
-                "Novelty Check (Step 7 Output):\n{step7}\n\n"
-                "Let me know what aspects you'd like me to elaborate on or explain further."
-            ),
-        },
-    ]
+    # Every completed step is journaled so a crashed run can be resumed
+    if journal is None:
+        journal = RunJournal.create(PROJECT_DIR, model_name, user_vision, [s["phase_name"] for s in steps])
+        print(f"Run id: {journal.run_id} (resume with --resume {journal.run_id})")
+    else:
+        step_outputs.update(journal.completed_outputs())
+        first = journal.first_incomplete(len(steps))
+        print(f"Resuming run {journal.run_id}: {len(step_outputs)} step(s) restored, "
+              f"continuing at step {first if first is not None else '(none left)'}")
 
-    def build_user_prompt(step_index: int, step_info: dict) -> str:
-        """
-        Takes the step index and step definition, returns the user prompt
-        with prior step outputs inserted for context.
-        """
-        prompt = step_info["user_prompt_template"]
-        prompt = prompt.replace("{vision}", user_vision)
-        for i in range(1, step_index):
-            placeholder = f"{{step{i}}}"
-            prompt = prompt.replace(placeholder, step_outputs.get(i, "(No output)"))
-        return prompt
+    # Strips reasoning traces from carried-forward context (archived under reasoning/)
+    # and compacts prior outputs that would push a prompt over its token budget
+    context_manager = None
+    if use_context_manager:
+        context_manager = StepContextManager(
+            input_token_budget=context_budget,
+            summarizer=make_llm_summarizer(orchestrator) if summarize_context else None,
+            archive_dir=str(Path(PROJECT_DIR) / "reasoning"),
+        )
+
+    if parallel:
+        if not auto_yes:
+            print("--parallel runs non-interactively; enabling --auto-yes.")
+        try:
+            scheduler = asyncio.run(run_walkthrough_async(
+                orchestrator, user_vision, PROJECT_DIR, file_map,
+                steps=steps, step_outputs=step_outputs, debug_io=debug_io, fan_out=fan_out,
+                context_manager=context_manager, prompt_cache=prompt_cache, journal=journal,
+            ))
+        except LLMError as e:
+            print(f"\nERROR: LLM call failed after retries: {e}")
+            print("Completed steps were saved; later steps were not run.")
+            print(f"Continue with: --resume {journal.run_id}")
+            sys.exit(1)
+        print("\n" + scheduler.report())
+        steps = []
 
     # Run the steps
-    for i, step in enumerate(STEPS, start=1):
+    for i, step in enumerate(steps, start=1):
         phase_name = step["phase_name"]
-        system_prompt = step["system_prompt"]
-        user_prompt = build_user_prompt(i, step)
+        if i in step_outputs:
+            print(f"\n=== {phase_name} === (already completed in run {journal.run_id})")
+            continue
+        prompt_outputs = run_sync(aprepare_outputs(i, step, user_vision, step_outputs, context_manager))
+        system_prompt, user_prompt, prompt_prefix = build_step_request(step, user_vision, prompt_outputs, prompt_cache)
+        step_orchestrator = orchestrator_for_step(orchestrator, step)
+        max_tokens = step.get("max_tokens", DEFAULT_STEP_MAX_TOKENS)
+        # A retry must hit the model again instead of replaying the cached response
+        refresh = False
 
-        while True:
-            print(f"\n=== {phase_name} ===")
+        with span(phase_name, cat="step", step=phase_name, model=step_orchestrator.model_name):
+            while True:
+                thinking_budget = step_orchestrator.thinking_budget_for(phase_name, step.get("thinking_budget"))
+                print(f"\n=== {phase_name} === ({describe_route(step_orchestrator, step, thinking_budget)})")
             
-            if auto_yes:
-                print("Auto-yes enabled: Proceeding with this step.")
-                do_it = 'y'
-            else:
-                do_it = input("Proceed with this step? (y = proceed, s = skip, q = quit): ").strip().lower()
-
-            if do_it == 'q':
-                # Quit entirely
-                print("Exiting.")
-                sys.exit(0)
-            elif do_it == 's':
-                # Skip step
-                print(f"Skipping {phase_name}.")
-                break
-            elif do_it == 'y':
-                # Call the LLM
-                ai_response = orchestrator.call_llm(system_prompt, user_prompt)
-                print("\nAI Response:\n", ai_response)
-                
-                # Let user decide to apply, retry, or skip
                 if auto_yes:
-                    print("Auto-yes enabled: Applying changes.")
-                    apply_yn = 'y'
+                    print("Auto-yes enabled: Proceeding with this step.")
+                    do_it = 'y'
                 else:
-                    apply_yn = input(
-                        "Apply changes (create/update files in some_project)? "
-                        "(y = apply, r = retry step, n = skip step): "
-                    ).strip().lower()
+                    do_it = traced_input("Proceed with this step? (y = proceed, s = skip, q = quit): ").strip().lower()
+
+                if do_it == 'q':
+                    # Quit entirely
+                    print("Exiting.")
+                    sys.exit(0)
+                elif do_it == 's':
+                    # Skip step
+                    print(f"Skipping {phase_name}.")
+                    break
+                elif do_it == 'y':
+                    # Call the LLM
+                    usage_before = step_orchestrator.client.usage_snapshot()
+                    step_started = time.time()
+                    try:
+                        streamed_files = None
+                        if fan_out and "fan_out" in step:
+                            # On the shared background loop, so every step reuses one connection pool
+                            ai_response = run_sync(acall_step(
+                                step_orchestrator, step, user_vision, step_outputs, prompt_outputs,
+                                fan_out=True, refresh=refresh, prompt_cache=prompt_cache, thinking_budget=thinking_budget,
+                            ))
+                            print("\nAI Response:\n", ai_response)
+                        elif stream_mode:
+                            # With auto-yes, file blocks are written the moment they close;
+                            # otherwise they are staged until the user approves the step.
+                            if auto_yes:
+                                ai_response = stream_llm_and_apply(
+                                    step_orchestrator, system_prompt, user_prompt, file_map,
+                                    on_file=lambda pf: write_project_file(PROJECT_DIR, pf, debug_io=debug_io),
+                                    refresh=refresh, prompt_prefix=prompt_prefix,
+                                    max_tokens=max_tokens, thinking_budget=thinking_budget,
+                                )
+                            else:
+                                streamed_files = {}
+                                ai_response = stream_llm_and_apply(
+                                    step_orchestrator, system_prompt, user_prompt, streamed_files, refresh=refresh,
+                                    prompt_prefix=prompt_prefix, max_tokens=max_tokens, thinking_budget=thinking_budget,
+                                )
+                        else:
+                            ai_response = step_orchestrator.call_llm(system_prompt, user_prompt, refresh=refresh,
+                                                                     prompt_prefix=prompt_prefix, max_tokens=max_tokens,
+                                                                     thinking_budget=thinking_budget)
+                            print("\nAI Response:\n", ai_response)
+                    except LLMError as e:
+                        print(f"\nERROR: LLM call failed after retries: {e}")
+                        if auto_yes:
+                            # Don't feed an error into later steps; completed steps are already saved
+                            print("Stopping so later steps don't run without this step's output.")
+                            print(f"Continue with: --resume {journal.run_id}")
+                            sys.exit(1)
+                        # Back to the proceed/skip/quit prompt
+                        continue
+                    call_seconds = time.time() - step_started
+                    print(f"Provider usage: {step_orchestrator.client.describe_usage(since=usage_before)}")
                 
-                if apply_yn == 'y':
-                    # First attempt normal parsing (for backward compatibility)
-                    print("Attempting to parse file markers from response...")
-                    parse_ai_response_and_apply(ai_response, file_map)
-                    
-                    # FORCE DIRECT WRITING: Always write a file for each step regardless of parsing result
-                    output_file = None
-                    file_written = False
-                    
-                    # Define direct mapping from step index to output file
-                    if i == 1:
-                        output_file = "doc/CONTEXT_CONSTRAINTS.md"
-                    elif i == 2:
-                        output_file = "doc/DIVERGENT_SOLUTIONS.md"
-                    elif i == 3:
-                        output_file = "doc/DEEP_DIVE_MECHANISMS.md"
-                    elif i == 4:
-                        output_file = "doc/SELF_CRITIQUE_SYNERGY.md"
-                    elif i == 5:
-                        output_file = "doc/BREAKTHROUGH_BLUEPRINT.md"
-                    elif i == 6:
-                        output_file = "doc/IMPLEMENTATION_PATH.md"
-                    elif i == 7:
-                        output_file = "doc/NOVELTY_CHECK.md"
-                    elif i == 8:
-                        output_file = "doc/ELABORATIONS.md"
-                    
-                    if output_file:
-                        print(f"DIRECT WRITE: Creating {output_file} regardless of file markers...")
-                        # Create file contents with step name header and AI response
-                        content = f"# {phase_name}\n\n{ai_response}"
-                        file_map[output_file] = ProjectFile(output_file, content)
-                        file_written = True
-                    
-                    # Write all files
-                    for rel_path, pf in file_map.items():
-                        write_project_file(PROJECT_DIR, pf)
+                    # Let user decide to apply, retry, or skip
+                    if auto_yes:
+                        print("Auto-yes enabled: Applying changes.")
+                        apply_yn = 'y'
+                    else:
+                        apply_yn = traced_input(
+                            "Apply changes (create/update files in some_project)? "
+                            "(y = apply, r = retry step, n = skip step): "
+                        ).strip().lower()
+                    # The user's verdict is a quality signal: a retry means the output wasn't good enough
+                    observe_step_thinking(step_orchestrator, step, thinking_budget, call_seconds, ai_response,
+                                          usage_before, user_quality={'y': 1.0, 'r': 0.0}.get(apply_yn, 0.5))
+                
+                    if apply_yn == 'y':
+                        if streamed_files is not None:
+                            # File markers were already parsed while streaming
+                            file_map.update(streamed_files)
+                        elif not stream_mode:
+                            # First attempt normal parsing (for backward compatibility)
+                            print("Attempting to parse file markers from response...")
+                            parse_ai_response_and_apply(ai_response, file_map)
                     
-                    if file_written:
-                        print(f"DIRECT WRITE: Successfully wrote {output_file} to some_project/{output_file}")
+                        # FORCE DIRECT WRITING: Always write a file for each step regardless of parsing result
+                        written = write_step_output(PROJECT_DIR, step, ai_response, file_map, debug_io=debug_io)
+                        observe_step(step, step_orchestrator.model_name, step_started, file_map, written)
                     
-                    print("Changes saved to some_project/.")
-                    # Store step output in step_outputs
-                    step_outputs[i] = ai_response
-                    # Done with this step
-                    break
-                elif apply_yn == 'r':
-                    print("Repeating this step...\n")
-                else:  # 'n' or anything else
-                    print("Skipping file changes.")
-                    # Optionally still store the AI text as the step output
-                    step_outputs[i] = ai_response
-                    break
-            else:
-                print("Invalid choice. Please enter 'y', 's', or 'q'.")
+                        print("Changes saved to some_project/.")
+                        # Store step output in step_outputs
+                        step_outputs[i] = ai_response
+                        journal.record_step(i, step, ai_response, step_orchestrator.model_name,
+                                            prompt_hash(system_prompt, user_prompt, prompt_prefix),
+                                            step_started, time.time())
+                        # Done with this step
+                        break
+                    elif apply_yn == 'r':
+                        print("Repeating this step...\n")
+                        refresh = True
+                    else:  # 'n' or anything else
+                        print("Skipping file changes.")
+                        # Optionally still store the AI text as the step output
+                        step_outputs[i] = ai_response
+                        journal.record_step(i, step, ai_response, step_orchestrator.model_name,
+                                            prompt_hash(system_prompt, user_prompt, prompt_prefix),
+                                            step_started, time.time())
+                        break
+                else:
+                    print("Invalid choice. Please enter 'y', 's', or 'q'.")
+
+    if context_manager is not None and context_manager.reports:
+        print(f"\nContext manager saved ~{context_manager.total_saved()} input tokens across steps.")
+
+    clients = {}
+    for routed in orchestrator.orchestrators():
+        clients[routed.model_name] = routed.client
+        if routed.hedge_client is not None:
+            clients.setdefault(routed.hedge_model, routed.hedge_client)
+    print()
+    for name, client in clients.items():
+        print(f"Provider usage ({name}): {client.describe_usage()}")
+    if orchestrator.hedge_client is not None:
+        print(f"Hedging: {orchestrator.hedge_stats.describe()}")
+    if thinking_controller is not None:
+        print(thinking_controller.describe())
+    metrics = get_metrics()
+    if metrics.events:
+        print("\n" + metrics.summary())
+    if metrics_out:
+        metrics.write(metrics_out)
+        print(f"Metrics written to {metrics_out}")
+    tracer = get_tracer()
+    if tracer is not None:
+        print(f"\nTraced time by category: {tracer.summary()}")
+    cassette = get_cassette()
+    if cassette is not None:
+        print(f"\n{cassette.describe()}")
+
+    cache = get_default_cache()
+    if cache is not None:
+        stats = cache.stats()
+        print(f"\nResponse cache: {stats['hits']} hits, {stats['misses']} misses "
+              f"({stats['entries']} entries, {stats['bytes']} bytes)")
 
     print("\n=== Breakthrough Idea Process Completed ===")
     print("You can check 'some_project/doc/' for your breakthrough blueprint files.")
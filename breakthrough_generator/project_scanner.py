@@ -0,0 +1,194 @@
+"""
+project_scanner.py
+
+Incremental scanner for the project directory.
+
+A manifest of (mtime_ns, size, content hash, binary flag) per file is kept in
+<project>/.scan_manifest.json. On the next scan, a file whose mtime and size
+still match its manifest entry is not opened at all. Only new or changed files
+are read, hashed and checked for binary content. The binary check looks at the
+first bytes (a NUL byte or invalid UTF-8), not at the file suffix.
+
+Directories are listed in parallel on a thread pool, and so are changed files.
+Ignored directories (.git, __pycache__, ...) are pruned without descending
+into them.
+
+Hashes are sha256 of the text as Python reads it (UTF-8, universal newlines),
+the same value ProjectFile.content_hash computes, so a manifest hash can stand
+in for the file content when checking whether a file is dirty.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+MANIFEST_NAME = ".scan_manifest.json"
+MANIFEST_VERSION = 1
+IGNORED_DIRS = {".git", ".hg", ".svn", "__pycache__", "node_modules", ".venv", "venv", ".runs", ".llm_cache"}
+SNIFF_BYTES = 8192
+SCAN_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+
+class ScanEntry:
+    __slots__ = ("rel_path", "abs_path", "mtime_ns", "size", "hash", "binary")
+
+    def __init__(self, rel_path: str, abs_path: str, mtime_ns: int, size: int,
+                 hash: Optional[str] = None, binary: bool = False):
+        self.rel_path = rel_path
+        self.abs_path = abs_path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.hash = hash
+        self.binary = binary
+
+    def to_manifest(self) -> dict:
+        return {"mtime_ns": self.mtime_ns, "size": self.size, "hash": self.hash, "binary": self.binary}
+
+
+def looks_binary(head: bytes) -> bool:
+    """
+    Sniffs the first bytes of a file: NUL bytes or invalid UTF-8 mean binary.
+    A multi-byte character cut off at the end of head is not counted as invalid.
+    """
+    if b"\0" in head:
+        return True
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        return e.start < len(head) - 3
+    return False
+
+
+def text_hash(data: bytes) -> Optional[str]:
+    """
+    Returns the sha256 of data decoded as UTF-8 with universal newlines, or None if not UTF-8.
+    """
+    try:
+        text = data.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _list_dir(root: str, rel_dir: str) -> Tuple[List[ScanEntry], List[str]]:
+    """
+    Lists one directory: returns (file entries with stat info, relative subdirectories to scan).
+    """
+    files, subdirs = [], []
+    abs_dir = os.path.join(root, rel_dir) if rel_dir else root
+    try:
+        with os.scandir(abs_dir) as it:
+            for entry in it:
+                rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in IGNORED_DIRS:
+                            subdirs.append(rel_path)
+                    elif entry.is_file():
+                        if not rel_dir and entry.name == MANIFEST_NAME:
+                            continue
+                        st = entry.stat()
+                        files.append(ScanEntry(rel_path, entry.path, st.st_mtime_ns, st.st_size))
+                except OSError as e:
+                    print(f"Skipping {rel_path}: {e}")
+    except OSError as e:
+        print(f"Skipping directory {rel_dir or abs_dir}: {e}")
+    return files, subdirs
+
+
+def _hash_file(entry: ScanEntry) -> ScanEntry:
+    try:
+        with open(entry.abs_path, 'rb') as f:
+            head = f.read(SNIFF_BYTES)
+            if looks_binary(head):
+                entry.binary = True
+                return entry
+            data = head + f.read()
+    except OSError as e:
+        print(f"Skipping {entry.rel_path}: {e}")
+        entry.binary = True
+        return entry
+    entry.hash = text_hash(data)
+    entry.binary = entry.hash is None
+    return entry
+
+
+class ProjectScanner:
+    """
+    Scans project_root, reusing the persisted manifest for files whose mtime and size are unchanged.
+    After scan(), .stats holds how many files were reused, (re)hashed and skipped as binary.
+    """
+
+    def __init__(self, project_root: str, workers: int = SCAN_WORKERS, use_manifest: bool = True):
+        self.root = os.path.abspath(project_root)
+        self.workers = max(1, workers)
+        self.use_manifest = use_manifest
+        self.manifest_path = os.path.join(self.root, MANIFEST_NAME)
+        self.stats = {"files": 0, "reused": 0, "hashed": 0, "binary": 0}
+
+    def _load_manifest(self) -> Dict[str, dict]:
+        if not self.use_manifest:
+            return {}
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get("version") != MANIFEST_VERSION:
+            return {}
+        return data.get("files", {})
+
+    def _save_manifest(self, entries: Dict[str, ScanEntry]):
+        data = {"version": MANIFEST_VERSION, "files": {p: e.to_manifest() for p, e in entries.items()}}
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".scan_manifest.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp, self.manifest_path)
+        except OSError as e:
+            print(f"Could not save scan manifest: {e}")
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+    def _walk(self, pool: ThreadPoolExecutor) -> List[ScanEntry]:
+        files: List[ScanEntry] = []
+        pending = [pool.submit(_list_dir, self.root, "")]
+        while pending:
+            found, subdirs = pending.pop().result()
+            files.extend(found)
+            pending.extend(pool.submit(_list_dir, self.root, d) for d in subdirs)
+        return files
+
+    def scan(self) -> Dict[str, ScanEntry]:
+        """
+        Returns {relative path: ScanEntry} for every file (binaries included, flagged).
+        """
+        if not os.path.isdir(self.root):
+            return {}
+        manifest = self._load_manifest()
+        entries: Dict[str, ScanEntry] = {}
+        changed: List[ScanEntry] = []
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="scan") as pool:
+            for entry in self._walk(pool):
+                known = manifest.get(entry.rel_path)
+                if known and known["mtime_ns"] == entry.mtime_ns and known["size"] == entry.size:
+                    entry.hash = known["hash"]
+                    entry.binary = known["binary"]
+                    self.stats["reused"] += 1
+                else:
+                    changed.append(entry)
+                entries[entry.rel_path] = entry
+            for entry in pool.map(_hash_file, changed):
+                self.stats["hashed"] += 1
+        self.stats["files"] = len(entries)
+        self.stats["binary"] = sum(1 for e in entries.values() if e.binary)
+        if self.use_manifest and (changed or len(manifest) != len(entries)):
+            self._save_manifest(entries)
+        return entries
@@ -0,0 +1,140 @@
+"""
+prompt_template.py
+
+Precompiled prompt templates.
+
+A template is parsed once into literal text and {name} slots. Rendering drops
+the slot values into a copy of the parsed pieces and joins them in one pass,
+instead of rescanning the whole (growing) prompt once per placeholder with
+str.replace. Slot values are inserted verbatim: a value that itself contains
+"{step1}" is not substituted again.
+
+  template = compile_template("Domain:\n{vision}\n\nStep 1:\n{step1}\n", allowed=r"vision|step\d+")
+  prompt = template.render({"vision": vision, "step1": output}, default="(No output)")
+
+Placeholders are validated when the template is compiled: with allowed (a regex
+the slot name must fully match), an unknown {name} raises TemplateError right
+away rather than leaking into a prompt. Braces that don't enclose a plain name
+(JSON examples, "{ }") are literal text.
+
+compile_template caches compiled templates by text, so a template is parsed once
+per process however many runs render it. report(...) gives each slot's byte and
+token contribution to a rendered prompt.
+"""
+
+import re
+import threading
+from typing import Dict, List, Mapping, Optional
+
+from rate_limiter import estimate_tokens
+
+PLACEHOLDER = re.compile(r"\{([A-Za-z_][A-Za-z0-9_]*)\}")
+
+
+class TemplateError(ValueError):
+    """
+    A template uses a placeholder it isn't allowed to, or is rendered without a value for one.
+    """
+
+
+class PromptTemplate:
+    """
+    A template parsed into literal and slot pieces. Immutable and safe to share between threads.
+    """
+
+    def __init__(self, text: str, allowed: Optional[str] = None, name: Optional[str] = None):
+        self.text = text
+        self.name = name
+        # Literal pieces with None where a slot goes; slot_positions[i] is (piece index, slot name)
+        self.parts: List[Optional[str]] = []
+        self.slot_positions = []
+        pos = 0
+        for match in PLACEHOLDER.finditer(text):
+            if match.start() > pos:
+                self.parts.append(text[pos:match.start()])
+            self.slot_positions.append((len(self.parts), match.group(1)))
+            self.parts.append(None)
+            pos = match.end()
+        if pos < len(text):
+            self.parts.append(text[pos:])
+        self.slot_names = tuple(dict.fromkeys(slot for _, slot in self.slot_positions))
+        literal = "".join(part for part in self.parts if part is not None)
+        self.literal_bytes = len(literal.encode("utf-8"))
+        self.literal_tokens = estimate_tokens(literal) if literal else 0
+        if allowed is not None:
+            pattern = re.compile(allowed)
+            unknown = [slot for slot in self.slot_names if not pattern.fullmatch(slot)]
+            if unknown:
+                label = f"Template {name}" if name else "Template"
+                raise TemplateError(f"{label} has unknown placeholder(s) "
+                                    f"{', '.join('{' + slot + '}' for slot in unknown)}")
+
+    def _value(self, values: Mapping[str, str], slot: str, default: Optional[str]) -> str:
+        value = values.get(slot, default)
+        if value is None:
+            label = f" {self.name}" if self.name else ""
+            raise TemplateError(f"No value for {{{slot}}} in template{label}")
+        return value
+
+    def render(self, values: Mapping[str, str], default: Optional[str] = None) -> str:
+        """
+        Fills every slot from values (default for slots without one; with no default a
+        missing value raises TemplateError) and returns the prompt. A value may also be
+        a list of strings, e.g. many documents, which is joined in the same pass.
+        """
+        parts = self.parts.copy()
+        pieces = False
+        for index, slot in self.slot_positions:
+            value = parts[index] = self._value(values, slot, default)
+            pieces = pieces or not isinstance(value, str)
+        if pieces:
+            # A slot given as a list of pieces joins with the rest, without a copy of its own
+            flat = []
+            for part in parts:
+                if isinstance(part, str):
+                    flat.append(part)
+                else:
+                    flat.extend(part)
+            parts = flat
+        return "".join(parts)
+
+    def report(self, values: Mapping[str, str], default: Optional[str] = None) -> List[dict]:
+        """
+        Per-slot contribution to the rendered prompt, in template order:
+        [{"slot", "bytes", "tokens"}], a slot used twice counted twice. The template's
+        own text is the "(literal)" entry.
+        """
+        totals: Dict[str, List[int]] = {}
+        for _, slot in self.slot_positions:
+            value = self._value(values, slot, default)
+            entry = totals.setdefault(slot, [0, 0])
+            for piece in ([value] if isinstance(value, str) else value):
+                entry[0] += len(piece.encode("utf-8"))
+                entry[1] += estimate_tokens(piece) if piece else 0
+        report = [{"slot": slot, "bytes": size, "tokens": tokens} for slot, (size, tokens) in totals.items()]
+        report.append({"slot": "(literal)", "bytes": self.literal_bytes, "tokens": self.literal_tokens})
+        return report
+
+
+_compiled: Dict[tuple, PromptTemplate] = {}
+_compiled_lock = threading.Lock()
+
+
+def compile_template(text: str, allowed: Optional[str] = None, name: Optional[str] = None) -> PromptTemplate:
+    """
+    The compiled template for text, parsed and validated on first use and cached after that.
+    """
+    key = (text, allowed)
+    template = _compiled.get(key)
+    if template is None:
+        template = PromptTemplate(text, allowed, name)
+        with _compiled_lock:
+            template = _compiled.setdefault(key, template)
+    return template
+
+
+def describe_report(report: List[dict]) -> str:
+    """
+    A report(...) as one console line, e.g. "step2 5120B/~1281 tok, vision 96B/~25 tok, ...".
+    """
+    return ", ".join(f"{entry['slot']} {entry['bytes']}B/~{entry['tokens']} tok" for entry in report)
@@ -0,0 +1,184 @@
+"""
+rate_limiter.py
+
+Process-wide rate limiting and retries for LLM calls.
+
+Every provider gets one ProviderRateLimiter (two token buckets: requests per
+minute and tokens per minute) shared by all clients and event loops in the
+process. call_with_retries(...) wraps a request with jittered exponential
+backoff that honors Retry-After; a 429 also pauses the provider's limiter so
+concurrent callers back off together instead of stampeding.
+
+Env variables (unset or 0 means unlimited):
+  - ANTHROPIC_RPM, ANTHROPIC_TPM
+  - DEEPSEEK_RPM, DEEPSEEK_TPM
+  - LLM_MAX_RETRIES (optional, default 5)
+  - LLM_RETRY_BASE_DELAY / LLM_RETRY_MAX_DELAY (optional, seconds, default 1 / 60)
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Optional
+
+from llm_errors import RateLimitError, RetryableLLMError, classify_exception
+
+
+class TokenBucket:
+    """
+    Classic token bucket refilled continuously at rate_per_minute. Thread-safe and
+    not bound to any event loop; waiting is done with asyncio.sleep by the caller.
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.refill_per_second = rate_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_per_second)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        """
+        Takes `amount` tokens (possibly going negative) and returns how long the caller
+        must wait before the reservation is covered. Requests larger than the bucket
+        are clamped to its capacity so they can still proceed.
+        """
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.refill_per_second
+
+    def refund(self, amount: float):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class ProviderRateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute limits for one provider.
+    """
+
+    def __init__(self, provider: str, rpm: Optional[float] = None, tpm: Optional[float] = None):
+        self.provider = provider
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self._paused_until = 0.0
+
+    async def acquire(self, estimated_tokens: int = 0):
+        """
+        Waits until one request and `estimated_tokens` tokens fit within the limits.
+        """
+        wait = self._paused_until - time.monotonic()
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None and estimated_tokens:
+            wait = max(wait, self.tokens.reserve(estimated_tokens))
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def refund_tokens(self, amount: int):
+        """
+        Gives back tokens reserved by acquire() but not actually used.
+        """
+        if self.tokens is not None and amount > 0:
+            self.tokens.refund(amount)
+
+    def pause(self, seconds: float):
+        """
+        Holds every caller of this provider for `seconds` (e.g. after a 429 with Retry-After).
+        """
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def _env_rate(name: str) -> Optional[float]:
+    value = float(os.environ.get(name, "0") or 0)
+    return value if value > 0 else None
+
+
+def get_rate_limiter(provider: str) -> ProviderRateLimiter:
+    """
+    Returns the process-wide limiter for provider ("anthropic" or "deepseek"),
+    configured from <PROVIDER>_RPM / <PROVIDER>_TPM.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            prefix = provider.upper()
+            limiter = ProviderRateLimiter(provider, _env_rate(f"{prefix}_RPM"), _env_rate(f"{prefix}_TPM"))
+            _limiters[provider] = limiter
+    return limiter
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count (~4 characters per token), good enough for rate budgeting.
+    """
+    return len(text) // 4 + 1
+
+
+class RetryPolicy:
+    def __init__(self, max_retries: Optional[int] = None, base_delay: Optional[float] = None,
+                 max_delay: Optional[float] = None):
+        self.max_retries = max_retries if max_retries is not None else int(os.environ.get("LLM_MAX_RETRIES", "5"))
+        self.base_delay = base_delay if base_delay is not None else float(os.environ.get("LLM_RETRY_BASE_DELAY", "1"))
+        self.max_delay = max_delay if max_delay is not None else float(os.environ.get("LLM_RETRY_MAX_DELAY", "60"))
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Full-jitter exponential backoff; a server-provided Retry-After is a lower bound.
+        """
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            return max(retry_after, backoff)
+        return backoff
+
+
+async def backoff_or_raise(provider: str, exc: Exception, attempt: int, policy: RetryPolicy,
+                           on_retry: Optional[Callable[[int, Exception, float], None]] = None):
+    """
+    Handles one failed attempt: raises it as an LLMError subclass if it is not retryable
+    (or retries are exhausted), otherwise sleeps for the backoff delay.
+    """
+    error = classify_exception(provider, exc)
+    if not isinstance(error, RetryableLLMError) or attempt >= policy.max_retries:
+        if error is exc:
+            raise error
+        raise error from exc
+    delay = policy.delay(attempt, error.retry_after)
+    if isinstance(error, RateLimitError):
+        get_rate_limiter(provider).pause(delay)
+    if on_retry is not None:
+        on_retry(attempt + 1, error, delay)
+    print(f"Retrying {provider} call in {delay:.1f}s after: {error}")
+    await asyncio.sleep(delay)
+
+
+async def call_with_retries(call: Callable[[], Awaitable], provider: str, policy: Optional[RetryPolicy] = None,
+                            on_retry: Optional[Callable[[int, Exception, float], None]] = None):
+    """
+    Awaits call() and retries RetryableLLMErrors with backoff. Every failure is raised
+    as an LLMError subclass (chained to the original SDK exception).
+    """
+    policy = policy or RetryPolicy()
+    attempt = 0
+    while True:
+        try:
+            return await call()
+        except Exception as exc:
+            await backoff_or_raise(provider, exc, attempt, policy, on_retry)
+            attempt += 1
@@ -0,0 +1,166 @@
+"""
+response_cache.py
+
+Persistent, content-addressed cache for LLM responses.
+
+Entries are keyed by a SHA-256 hash of everything that determines a response
+(provider, model name, messages, max_tokens, temperature and thinking settings,
+plus the endpoint when a client talks to a non-default base URL such as a proxy
+or a mock server) and stored in a single SQLite file. The cache is bounded by total size; when it
+grows past the limit the least recently used entries are evicted.
+
+Env variables:
+  - LLM_CACHE_PATH (optional, default ".llm_cache/responses.sqlite")
+  - LLM_CACHE_MAX_BYTES (optional, default 256 MiB)
+  - LLM_CACHE_DISABLE (optional, set to "1" to bypass the cache entirely)
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+DEFAULT_CACHE_PATH = ".llm_cache/responses.sqlite"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def make_cache_key(provider: str, model_name: str, messages, max_tokens: int,
+                   temperature: float, thinking=None) -> str:
+    """
+    Returns a stable hex digest for a request. Messages are serialized canonically
+    so logically equal requests hash to the same key.
+    """
+    payload = {
+        "provider": provider,
+        "model": model_name,
+        "messages": messages,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "thinking": thinking,
+    }
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def endpoint_cache_key(key: str, endpoint: Optional[str]) -> str:
+    """
+    The cache key for a make_cache_key(...) request key sent to endpoint. None stands
+    for the provider's default endpoint and keeps the key as is; any other base URL
+    gets keys of its own, so its responses never mix with the real API's.
+    """
+    if endpoint is None:
+        return key
+    return hashlib.sha256(f"{endpoint}\n{key}".encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    SQLite-backed LRU cache with hit/miss counters. Safe to share between threads.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)")
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Returns the cached response for key, or None. Touches the entry for LRU ordering.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        """
+        Stores a response and evicts least recently used entries if over max_bytes.
+        """
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        victims = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC"):
+            if total - freed <= self.max_bytes:
+                break
+            victims.append((key,))
+            freed += size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+
+    def stats(self) -> dict:
+        """
+        Returns hit/miss counters plus current entry count and size.
+        """
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "entries": entries,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> Optional[ResponseCache]:
+    """
+    Returns the process-wide cache configured from the environment, or None if disabled.
+    """
+    global _default_cache
+    if os.environ.get("LLM_CACHE_DISABLE", "") == "1":
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache(
+                path=os.environ.get("LLM_CACHE_PATH", DEFAULT_CACHE_PATH),
+                max_bytes=int(os.environ.get("LLM_CACHE_MAX_BYTES", str(DEFAULT_MAX_BYTES))),
+            )
+    return _default_cache
@@ -0,0 +1,143 @@
+"""
+run_journal.py
+
+Append-only, crash-safe journal of one walkthrough run.
+
+Every run gets a run id and a JSONL file, <project>/.runs/<run-id>.jsonl. The
+first record describes the run (model, domain/challenge). Each completed step
+then appends one record with its prompt hash, full output, model and timings.
+Each record is flushed and fsync'ed before the step counts as done. If the
+process dies mid-write, only the torn last line is lost: loading truncates the
+file back to the end of the last complete record, so later appends start on a
+line of their own.
+
+`orchestrator.py --resume <run-id>` reloads the completed outputs into
+step_outputs and continues at the first step without a record.
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import secrets
+from pathlib import Path
+from typing import Dict, List, Optional
+
+JOURNAL_DIR = ".runs"
+
+
+def prompt_hash(system_prompt: str, user_prompt: str, prompt_prefix: Optional[List[str]] = None) -> str:
+    """
+    Stable sha256 of everything sent for a step, to tell whether a resumed step saw the same prompt.
+    """
+    payload = json.dumps([system_prompt, prompt_prefix or [], user_prompt], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def new_run_id() -> str:
+    return datetime.datetime.now().strftime("%Y%m%d-%H%M%S-") + secrets.token_hex(3)
+
+
+class RunJournal:
+    """
+    One run's journal. Use RunJournal.create(...) for a new run and RunJournal.load(...) to resume.
+    """
+
+    def __init__(self, path: Path, records: List[dict]):
+        self.path = path
+        self.run_id = path.stem
+        self.records = records
+
+    @classmethod
+    def create(cls, project_dir: str, model_name: str, user_vision: str, step_names: List[str]) -> "RunJournal":
+        path = Path(project_dir) / JOURNAL_DIR / f"{new_run_id()}.jsonl"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        journal = cls(path, [])
+        journal._append({
+            "type": "run",
+            "run_id": journal.run_id,
+            "model": model_name,
+            "vision": user_vision,
+            "steps": step_names,
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        })
+        return journal
+
+    @classmethod
+    def load(cls, project_dir: str, run_id: str) -> "RunJournal":
+        """
+        Reads an existing journal. Raises FileNotFoundError for an unknown run id.
+        A torn final line (crash during the write) is dropped from the file.
+        """
+        path = Path(project_dir) / JOURNAL_DIR / f"{run_id}.jsonl"
+        records = []
+        with open(path, 'rb') as f:
+            data = f.read()
+        # Byte offset just past the last complete record
+        valid_end = 0
+        while valid_end < len(data):
+            newline = data.find(b"\n", valid_end)
+            end = len(data) if newline < 0 else newline + 1
+            try:
+                records.append(json.loads(data[valid_end:end].decode("utf-8")))
+            except (UnicodeDecodeError, json.JSONDecodeError):
+                print(f"Run journal {path}: dropping incomplete record")
+                break
+            valid_end = end
+        if not records or records[0].get("type") != "run":
+            raise ValueError(f"{path} is not a run journal")
+        if valid_end < len(data) or not data.endswith(b"\n"):
+            with open(path, 'r+b') as f:
+                f.truncate(valid_end)
+                if not data[:valid_end].endswith(b"\n"):
+                    # A complete last record that lost only its newline
+                    f.seek(valid_end)
+                    f.write(b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+        journal = cls(path, records)
+        journal._append({"type": "resume", "at": datetime.datetime.now().isoformat(timespec="seconds")})
+        return journal
+
+    def _append(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        self.records.append(record)
+
+    @property
+    def model(self) -> str:
+        return self.records[0]["model"]
+
+    @property
+    def vision(self) -> str:
+        return self.records[0]["vision"]
+
+    def record_step(self, index: int, step: dict, output: str, model: str, prompt_sha: str,
+                    started: float, finished: float):
+        """
+        Appends a completed step. started/finished are time.time() timestamps.
+        """
+        self._append({
+            "type": "step",
+            "index": index,
+            "phase_name": step["phase_name"],
+            "model": model,
+            "prompt_hash": prompt_sha,
+            "started": started,
+            "finished": finished,
+            "seconds": round(finished - started, 3),
+            "output": output,
+        })
+
+    def completed_outputs(self) -> Dict[int, str]:
+        """
+        Returns {step_index: output} for every step with a record (the latest one wins).
+        """
+        return {r["index"]: r["output"] for r in self.records if r.get("type") == "step"}
+
+    def first_incomplete(self, step_count: int) -> Optional[int]:
+        done = self.completed_outputs()
+        return next((i for i in range(1, step_count + 1) if i not in done), None)
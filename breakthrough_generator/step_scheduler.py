@@ -0,0 +1,145 @@
+"""
+step_scheduler.py
+
+Dependency-aware scheduler for the walkthrough STEPS.
+
+Each step template declares its inputs through {stepN} placeholders. The
+scheduler turns those into a DAG, runs every step whose inputs are ready
+concurrently on the current event loop, and reports the critical path
+(the chain of steps that determined end-to-end latency).
+"""
+
+import asyncio
+import re
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+STEP_PLACEHOLDER = re.compile(r"\{step(\d+)\}")
+
+
+def step_dependencies(steps: List[dict]) -> Dict[int, Set[int]]:
+    """
+    Returns {step_index: {indices it depends on}} for 1-based step indices,
+    derived from the {stepN} placeholders in each user_prompt_template.
+    """
+    deps = {}
+    for index, step in enumerate(steps, start=1):
+        referenced = {int(n) for n in STEP_PLACEHOLDER.findall(step["user_prompt_template"])}
+        for dep in referenced:
+            if dep < 1 or dep > len(steps):
+                raise ValueError(f"Step {index} references unknown step {{step{dep}}}")
+            if dep == index:
+                raise ValueError(f"Step {index} references its own output")
+        deps[index] = referenced
+    return deps
+
+
+class StepScheduler:
+    """
+    Runs STEPS as a DAG. Use run(execute) where execute(step_index, step) is a
+    coroutine returning that step's output; independent steps run concurrently.
+    """
+
+    def __init__(self, steps: List[dict], max_concurrency: Optional[int] = None):
+        self.steps = steps
+        self.deps = step_dependencies(steps)
+        self.max_concurrency = max_concurrency
+        self.started: Dict[int, float] = {}
+        self.finished: Dict[int, float] = {}
+        self.order = self.topological_order()
+
+    def topological_order(self) -> List[int]:
+        """
+        Returns step indices in a dependency-respecting order (ties by index). Raises on cycles.
+        """
+        remaining = {i: set(d) for i, d in self.deps.items()}
+        order = []
+        while remaining:
+            ready = sorted(i for i, d in remaining.items() if not d)
+            if not ready:
+                raise ValueError(f"Dependency cycle between steps {sorted(remaining)}")
+            for i in ready:
+                order.append(i)
+                del remaining[i]
+            for d in remaining.values():
+                d.difference_update(ready)
+        return order
+
+    async def run(self, execute: Callable[[int, dict], Awaitable[str]]) -> Dict[int, str]:
+        """
+        Executes all steps, starting each one as soon as its dependencies have finished.
+        If a step raises, the steps still running are cancelled and the error is re-raised.
+        """
+        outputs: Dict[int, str] = {}
+        pending = list(self.order)
+        running: Dict[asyncio.Task, int] = {}
+        semaphore = asyncio.Semaphore(self.max_concurrency) if self.max_concurrency else None
+
+        async def run_one(index: int) -> str:
+            if semaphore is None:
+                return await self._timed(index, execute)
+            async with semaphore:
+                return await self._timed(index, execute)
+
+        try:
+            while pending or running:
+                for index in [i for i in pending if self.deps[i] <= outputs.keys()]:
+                    pending.remove(index)
+                    running[asyncio.ensure_future(run_one(index))] = index
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    index = running.pop(task)
+                    outputs[index] = task.result()
+        finally:
+            for task in running:
+                task.cancel()
+        return outputs
+
+    async def _timed(self, index: int, execute) -> str:
+        self.started[index] = time.perf_counter()
+        try:
+            return await execute(index, self.steps[index - 1])
+        finally:
+            self.finished[index] = time.perf_counter()
+
+    def durations(self) -> Dict[int, float]:
+        return {i: self.finished[i] - self.started[i] for i in self.finished if i in self.started}
+
+    def critical_path(self, durations: Optional[Dict[int, float]] = None) -> Tuple[List[int], float]:
+        """
+        Returns (step indices on the longest dependency chain, its total duration).
+        Uses measured durations from the last run unless durations is given.
+        """
+        durations = durations if durations is not None else self.durations()
+        finish: Dict[int, float] = {}
+        via: Dict[int, Optional[int]] = {}
+        for i in self.order:
+            parent = max(self.deps[i], key=lambda d: finish[d], default=None)
+            finish[i] = durations.get(i, 0.0) + (finish[parent] if parent is not None else 0.0)
+            via[i] = parent
+        if not finish:
+            return [], 0.0
+        node = max(finish, key=finish.get)
+        total = finish[node]
+        path = []
+        while node is not None:
+            path.append(node)
+            node = via[node]
+        return list(reversed(path)), total
+
+    def report(self) -> str:
+        """
+        Human-readable summary of per-step durations and the critical path.
+        """
+        durations = self.durations()
+        path, total = self.critical_path(durations)
+        lines = ["Step timings:"]
+        for i in self.order:
+            deps = ", ".join(str(d) for d in sorted(self.deps[i])) or "-"
+            took = f"{durations[i]:.2f}s" if i in durations else "not run"
+            lines.append(f"  {self.steps[i - 1]['phase_name']}: {took} (needs: {deps})")
+        lines.append(f"Critical path: {' -> '.join(str(i) for i in path)} ({total:.2f}s)")
+        if path and durations:
+            slowest = max(path, key=lambda i: durations.get(i, 0.0))
+            lines.append(f"Optimize first: {self.steps[slowest - 1]['phase_name']}")
+        return "\n".join(lines)
@@ -0,0 +1,60 @@
+import asyncio
+
+from context_manager import DROPPED_OUTPUT, StepContextManager, split_reasoning
+from rate_limiter import estimate_tokens
+
+STEP = {"phase_name": "3) Step 3", "system_prompt": "You are terse.",
+        "user_prompt_template": "Vision: {vision}\nOne: {step1}\nTwo: {step2}\n"}
+LONG = "# Heading\n\n" + "A first sentence about the mechanism. And a much longer follow-up. " * 400
+
+
+def prepare(manager, outputs, step=STEP):
+    return asyncio.run(manager.prepare(3, step, "vision", outputs))
+
+
+def test_reasoning_is_stripped_and_archived(tmp_path):
+    manager = StepContextManager(archive_dir=str(tmp_path))
+    carried = prepare(manager, {1: "Thinking:\nlet me see\n\nAnswer:\nthe answer", 2: "plain"})
+    assert carried == {1: "the answer", 2: "plain"}
+    assert (tmp_path / "STEP_1_REASONING.md").read_text(encoding="utf-8").endswith("let me see")
+    assert manager.reports[3]["reasoning_tokens_removed"] > 0
+    assert split_reasoning("no preamble") == ("", "no preamble")
+
+
+def test_outputs_within_budget_are_untouched():
+    manager = StepContextManager(input_token_budget=100000)
+    assert prepare(manager, {1: LONG, 2: "short"}) == {1: LONG, 2: "short"}
+    assert manager.reports[3]["compaction_tokens_removed"] == 0
+
+
+def test_largest_output_is_compacted_to_fit():
+    manager = StepContextManager(input_token_budget=2000)
+    carried = prepare(manager, {1: LONG, 2: "short"})
+    assert carried[2] == "short"
+    assert carried[1] != LONG and carried[1].startswith("# Heading")
+    report = manager.reports[3]
+    assert report["prompt_tokens"] <= 2000 * 1.1
+    assert report["dropped_steps"] == []
+    assert estimate_tokens(carried[1]) < estimate_tokens(LONG)
+
+
+def test_zero_budget_drops_carried_context():
+    manager = StepContextManager(input_token_budget=0)
+    carried = prepare(manager, {1: LONG, 2: "a few words that still do not fit"})
+    assert carried == {1: DROPPED_OUTPUT, 2: DROPPED_OUTPUT}
+    assert manager.reports[3]["dropped_steps"] == [1, 2]
+    assert "dropped step output(s) 1, 2" in manager.describe(3)
+
+
+def test_summarizer_replaces_trimming():
+    calls = []
+
+    async def summarize(text, target_tokens):
+        calls.append(target_tokens)
+        return "summary"
+
+    manager = StepContextManager(input_token_budget=2000, summarizer=summarize)
+    assert prepare(manager, {1: LONG, 2: "short"})[1] == "summary"
+    # Compactions are memoized per (step, text, target)
+    prepare(manager, {1: LONG, 2: "short"})
+    assert len(calls) == 1
@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+from hedging import MIN_SAMPLES, HedgePolicy, hedged_call, hedged_stream
+from metrics import MetricsRegistry
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def make_call(result, delay, log, name):
+    async def call():
+        log.append(f"{name} started")
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            log.append(f"{name} cancelled")
+            raise
+        if isinstance(result, Exception):
+            raise result
+        return result
+    return call
+
+
+def test_fast_primary_never_fires_the_hedge():
+    log, outcomes = [], []
+    result = run(hedged_call(make_call("primary", 0, log, "primary"), make_call("secondary", 0, log, "secondary"),
+                             0.5, lambda *o: outcomes.append(o)))
+    assert result == "primary"
+    assert outcomes == [(False, False)]
+    assert log == ["primary started"]
+
+
+def test_slow_primary_loses_to_the_secondary_and_is_cancelled():
+    log, outcomes = [], []
+    result = run(hedged_call(make_call("primary", 5, log, "primary"), make_call("secondary", 0.01, log, "secondary"),
+                             0.01, lambda *o: outcomes.append(o)))
+    assert result == "secondary"
+    assert outcomes == [(True, True)]
+    assert "primary cancelled" in log
+
+
+def test_failed_secondary_falls_back_to_the_primary():
+    log, outcomes = [], []
+    result = run(hedged_call(make_call("primary", 0.05, log, "primary"),
+                             make_call(RuntimeError("down"), 0, log, "secondary"),
+                             0.01, lambda *o: outcomes.append(o)))
+    assert result == "primary"
+    assert outcomes == [(True, False)]
+
+
+def test_both_failing_raises_the_primary_error():
+    log = []
+    with pytest.raises(ValueError):
+        run(hedged_call(make_call(ValueError("primary"), 0.02, log, "primary"),
+                        make_call(RuntimeError("secondary"), 0, log, "secondary"), 0.01, lambda *o: None))
+
+
+def make_stream(events, first_delay, log, name):
+    async def stream():
+        log.append(f"{name} started")
+        try:
+            await asyncio.sleep(first_delay)
+            for event in events:
+                yield event
+        finally:
+            log.append(f"{name} closed")
+    return stream
+
+
+def collect(agen):
+    async def drain():
+        return [event async for event in agen]
+    return run(drain())
+
+
+def test_stream_race_is_decided_by_the_first_event():
+    log, outcomes = [], []
+    events = collect(hedged_stream(make_stream([("text", "slow")], 5, log, "primary"),
+                                   make_stream([("text", "a"), ("text", "b")], 0, log, "secondary"),
+                                   0.01, lambda *o: outcomes.append(o)))
+    assert events == [("text", "a"), ("text", "b")]
+    assert outcomes == [(True, True)]
+    assert "primary closed" in log
+
+
+def test_stream_without_hedge_passes_events_through():
+    log, outcomes = [], []
+    events = collect(hedged_stream(make_stream([("text", "a"), ("text", "b")], 0, log, "primary"),
+                                   make_stream([("text", "x")], 0, log, "secondary"),
+                                   0.5, lambda *o: outcomes.append(o)))
+    assert events == [("text", "a"), ("text", "b")]
+    assert outcomes == [(False, False)]
+    assert "secondary started" not in log
+
+
+def test_delay_uses_the_percentile_once_enough_samples_exist(monkeypatch):
+    registry = MetricsRegistry()
+    monkeypatch.setattr("hedging.get_metrics", lambda: registry)
+    policy = HedgePolicy(percentile=50, initial_delay=30, min_delay=0.5)
+    for seconds in [1, 2, 3, 4, 100][:MIN_SAMPLES - 1]:
+        registry.observe_llm_call("p", "m", seconds)
+    assert policy.delay("p", "m") == 30
+    registry.observe_llm_call("p", "m", 100)
+    assert policy.delay("p", "m") == 3
@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+import pytest
+
+import rate_limiter
+from ai_clients import _AsyncSDKMixin
+from llm_errors import LLMError, RateLimitError
+from rate_limiter import ProviderRateLimiter, RetryPolicy, TokenBucket, backoff_or_raise, estimate_tokens
+
+PROVIDER = "test-provider"
+MESSAGES = [{"role": "user", "content": "x" * 4000}]
+MAX_TOKENS = 5000
+RESERVED = estimate_tokens('[{"role": "user", "content": "' + "x" * 4000 + '"}]') + MAX_TOKENS
+
+
+class FakeClient(_AsyncSDKMixin):
+    provider = PROVIDER
+    model_name = "test-model"
+
+    def _make_async_client(self, http_client):
+        return None
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    limiter = ProviderRateLimiter(PROVIDER, tpm=100000)
+    monkeypatch.setitem(rate_limiter._limiters, PROVIDER, limiter)
+    monkeypatch.setenv("LLM_MAX_RETRIES", "0")
+    return limiter
+
+
+def test_bucket_reserve_goes_into_debt_and_refund_is_capped():
+    bucket = TokenBucket(60)
+    assert bucket.reserve(60) == 0.0
+    # 30 tokens short at 1 token/second
+    assert bucket.reserve(30) == pytest.approx(30, rel=0.01)
+    bucket.refund(1000)
+    assert bucket.tokens == pytest.approx(60)
+
+
+def test_unused_tokens_are_refunded_after_a_call(limiter):
+    async def call(stats):
+        stats["total"] = 100
+        return "ok"
+
+    assert asyncio.run(FakeClient()._limited(MESSAGES, MAX_TOKENS, call)) == "ok"
+    assert limiter.tokens.tokens == pytest.approx(100000 - 100, abs=1)
+
+
+def test_reservation_is_refunded_when_a_call_fails(limiter):
+    async def call(stats):
+        raise ValueError("boom")
+
+    with pytest.raises(LLMError):
+        asyncio.run(FakeClient()._limited(MESSAGES, MAX_TOKENS, call))
+    assert limiter.tokens.tokens == pytest.approx(100000, abs=1)
+
+
+def test_reservation_is_refunded_when_a_stream_fails(limiter):
+    async def open_stream(stats):
+        yield ("text", "partial")
+        raise ValueError("dropped")
+
+    async def consume():
+        async for _ in FakeClient()._limited_stream(MESSAGES, MAX_TOKENS, open_stream):
+            pass
+
+    with pytest.raises(LLMError):
+        asyncio.run(consume())
+    assert limiter.tokens.tokens == pytest.approx(100000, abs=1)
+
+
+def test_rate_limit_error_pauses_the_limiter(limiter, monkeypatch):
+    waits = []
+
+    async def sleep(seconds):
+        waits.append(seconds)
+
+    monkeypatch.setattr(rate_limiter.asyncio, "sleep", sleep)
+    error = RateLimitError("429", PROVIDER, status_code=429, retry_after=2.0)
+    asyncio.run(backoff_or_raise(PROVIDER, error, 0, RetryPolicy(max_retries=3, base_delay=0, max_delay=0)))
+    assert limiter._paused_until - time.monotonic() == pytest.approx(2.0, abs=0.5)
+
+    # Every other caller of the provider now waits out the pause too
+    waits.clear()
+    asyncio.run(limiter.acquire(10))
+    assert waits and waits[0] == pytest.approx(2.0, abs=0.5)
+
+
+def test_last_attempt_raises_instead_of_pausing(limiter):
+    error = RateLimitError("429", PROVIDER, status_code=429, retry_after=2.0)
+    with pytest.raises(RateLimitError):
+        asyncio.run(backoff_or_raise(PROVIDER, error, 3, RetryPolicy(max_retries=3)))
+    assert limiter._paused_until < time.monotonic()
@@ -0,0 +1,56 @@
+import itertools
+
+import response_cache
+from ai_clients import ANTHROPIC_DEFAULT_BASE_URL, Claude37SonnetClient
+from response_cache import ResponseCache, endpoint_cache_key, make_cache_key
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+def test_request_key_is_canonical():
+    key = make_cache_key("anthropic", "m", [{"content": "hello", "role": "user"}], 100, 0.0)
+    assert key == make_cache_key("anthropic", "m", MESSAGES, 100, 0.0)
+    assert key != make_cache_key("anthropic", "m", MESSAGES, 101, 0.0)
+
+
+def test_endpoint_scopes_the_key():
+    key = make_cache_key("anthropic", "m", MESSAGES, 100, 0.0)
+    assert endpoint_cache_key(key, None) == key
+    proxied = endpoint_cache_key(key, "http://127.0.0.1:8080")
+    assert proxied != key
+    assert proxied != endpoint_cache_key(key, "http://127.0.0.1:8081")
+
+
+def test_client_keys_follow_the_base_url(monkeypatch):
+    key = make_cache_key("anthropic", "m", MESSAGES, 100, 0.0)
+    client = Claude37SonnetClient()
+    monkeypatch.delenv("ANTHROPIC_BASE_URL", raising=False)
+    assert client._cache_key(key) == key
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", ANTHROPIC_DEFAULT_BASE_URL + "/")
+    assert client._cache_key(key) == key
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", "http://127.0.0.1:8080")
+    assert client._cache_key(key) == endpoint_cache_key(key, "http://127.0.0.1:8080")
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    # A strictly increasing clock, so access order never ties
+    clock = itertools.count(1000)
+    monkeypatch.setattr(response_cache.time, "time", lambda: next(clock))
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_bytes=30)
+    cache.put("a", "a" * 10)
+    cache.put("b", "b" * 10)
+    cache.put("c", "c" * 10)
+    assert cache.get("a") == "a" * 10
+
+    cache.put("d", "d" * 10)
+    assert cache.get("b") is None
+    assert [cache.get(k) for k in "acd"] == ["a" * 10, "c" * 10, "d" * 10]
+    assert cache.stats()["bytes"] == 30
+
+
+def test_oversized_value_is_not_stored(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_bytes=10)
+    cache.put("small", "ok")
+    cache.put("big", "x" * 11)
+    assert cache.get("big") is None
+    assert cache.get("small") == "ok"
@@ -0,0 +1,52 @@
+import json
+
+from run_journal import JOURNAL_DIR, RunJournal
+
+STEPS = [{"phase_name": f"{i}) Step {i}"} for i in range(1, 5)]
+
+
+def record(journal, index):
+    journal.record_step(index, STEPS[index - 1], f"output {index}", "claude37sonnet", "sha", 0.0, 1.0)
+
+
+def tear(journal):
+    # A crash halfway through writing a step record
+    with open(journal.path, 'a', encoding='utf-8') as f:
+        f.write('{"type": "step", "index": 9, "out')
+
+
+def test_torn_record_is_ignored(tmp_path):
+    journal = RunJournal.create(str(tmp_path), "claude37sonnet", "vision", [s["phase_name"] for s in STEPS])
+    record(journal, 1)
+    tear(journal)
+
+    resumed = RunJournal.load(str(tmp_path), journal.run_id)
+    assert resumed.completed_outputs() == {1: "output 1"}
+    assert resumed.first_incomplete(len(STEPS)) == 2
+
+
+def test_second_resume_after_torn_write_keeps_later_steps(tmp_path):
+    journal = RunJournal.create(str(tmp_path), "claude37sonnet", "vision", [s["phase_name"] for s in STEPS])
+    record(journal, 1)
+    tear(journal)
+
+    first = RunJournal.load(str(tmp_path), journal.run_id)
+    record(first, 2)
+    record(first, 3)
+
+    second = RunJournal.load(str(tmp_path), journal.run_id)
+    assert second.completed_outputs() == {1: "output 1", 2: "output 2", 3: "output 3"}
+    assert second.first_incomplete(len(STEPS)) == 4
+    lines = (tmp_path / JOURNAL_DIR / f"{journal.run_id}.jsonl").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["type"] for line in lines] == ["run", "step", "resume", "step", "step", "resume"]
+
+
+def test_record_missing_only_its_newline_is_kept(tmp_path):
+    journal = RunJournal.create(str(tmp_path), "claude37sonnet", "vision", [s["phase_name"] for s in STEPS])
+    record(journal, 1)
+    data = journal.path.read_bytes()
+    journal.path.write_bytes(data.rstrip(b"\n"))
+
+    resumed = RunJournal.load(str(tmp_path), journal.run_id)
+    record(resumed, 2)
+    assert RunJournal.load(str(tmp_path), journal.run_id).completed_outputs() == {1: "output 1", 2: "output 2"}
@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+
+from step_scheduler import StepScheduler, step_dependencies
+
+
+def make_steps(*templates):
+    return [{"phase_name": f"{i}) Step {i}", "user_prompt_template": t} for i, t in enumerate(templates, start=1)]
+
+
+# 1 -> 2 -> 4 and 1 -> 3 -> 4: a diamond
+DIAMOND = make_steps("{vision}", "{step1}", "{step1}", "{step2} {step3}")
+
+
+def test_dependencies_come_from_placeholders():
+    assert step_dependencies(DIAMOND) == {1: set(), 2: {1}, 3: {1}, 4: {2, 3}}
+    with pytest.raises(ValueError):
+        step_dependencies(make_steps("{step2}", "{vision}", "{step9}"))
+
+
+def test_critical_path_follows_the_slower_branch():
+    scheduler = StepScheduler(DIAMOND)
+    assert scheduler.critical_path({1: 1.0, 2: 5.0, 3: 2.0, 4: 1.0}) == ([1, 2, 4], 7.0)
+    assert scheduler.critical_path({1: 1.0, 2: 2.0, 3: 5.0, 4: 1.0}) == ([1, 3, 4], 7.0)
+
+
+def test_critical_path_of_independent_steps_is_the_slowest_one():
+    scheduler = StepScheduler(make_steps("{vision}", "{vision}", "{vision}"))
+    assert scheduler.critical_path({1: 1.0, 2: 3.0, 3: 2.0}) == ([2], 3.0)
+
+
+def test_run_starts_independent_steps_together():
+    scheduler = StepScheduler(DIAMOND)
+    running = set()
+    overlapped = []
+
+    async def execute(index, step):
+        running.add(index)
+        await asyncio.sleep(0.01)
+        if running >= {2, 3}:
+            overlapped.append(index)
+        running.discard(index)
+        return f"out {index}"
+
+    outputs = asyncio.run(scheduler.run(execute))
+    assert outputs == {i: f"out {i}" for i in range(1, 5)}
+    assert overlapped
+    path, total = scheduler.critical_path()
+    assert path[0] == 1 and path[-1] == 4
+    assert total > 0
@@ -0,0 +1,88 @@
+import contextlib
+import io
+import os
+import random
+
+import pytest
+
+from orchestrator import parse_ai_response_and_apply, parse_ai_response_chunks
+
+MARKER = "=== File: "
+
+# Lines the fuzzer builds responses from: markers (well-formed, unclosed, indented, empty),
+# content, CRLF line ends and long lines that chunk boundaries land inside
+PIECES = [
+    "=== File: a.py ===", "=== File: dir/b.txt ===", "x = 1", "", "  === File: no ===", "== File: q",
+    "=== File: c", "hello\r", "=== File: d ===\r", "z" * 30, "=== File:    e.md   ===",
+    "=== File: ===", "# heading with a {brace}",
+]
+
+
+def line_list_parse(text: str) -> dict:
+    """
+    The original splitlines() parser, as the reference. It kept a closing " ===" in the
+    path; that is normalized away here, since the streaming parser strips it. It also
+    broke lines at a bare "\r", which the streaming parser doesn't (only "\n" and
+    "\r\n"), so the fuzzed responses only have "\r" right before a "\n" or at the end.
+    """
+    file_map, current, lines = {}, None, []
+
+    def commit():
+        if current:
+            file_map[current.replace('/', os.path.sep)] = "\n".join(lines)
+
+    for line in text.splitlines():
+        if line.startswith(MARKER):
+            commit()
+            current = line.replace(MARKER, "").strip()
+            if current.endswith("==="):
+                current = current[:-3].rstrip()
+            lines = []
+        else:
+            lines.append(line)
+    commit()
+    return file_map
+
+
+def contents(file_map: dict) -> dict:
+    return {path: f.content for path, f in file_map.items()}
+
+
+def parse_whole(text: str) -> dict:
+    file_map = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        parse_ai_response_and_apply(text, file_map)
+    return contents(file_map)
+
+
+def parse_chunked(chunks) -> dict:
+    file_map = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        parse_ai_response_chunks(chunks, file_map)
+    return contents(file_map)
+
+
+def random_chunks(rnd: random.Random, text: str) -> list:
+    cuts = sorted(rnd.sample(range(len(text) + 1), min(len(text) + 1, rnd.randint(0, 8))))
+    return [text[i:j] for i, j in zip([0] + cuts, cuts + [len(text)])]
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_whole_chunked_and_line_list_parsers_agree(seed):
+    rnd = random.Random(seed)
+    for _ in range(500):
+        text = "\n".join(rnd.choice(PIECES) for _ in range(rnd.randint(0, 12)))
+        text += rnd.choice(["", "\n", "\n\n"])
+        reference = line_list_parse(text)
+        assert parse_whole(text) == reference, text
+        chunks = random_chunks(rnd, text)
+        assert parse_chunked(chunks) == reference, chunks
+        assert parse_chunked(list(text)) == reference, text
+
+
+def test_marker_split_across_chunks():
+    text = "Intro\n=== File: doc/a.md ===\n# A\nbody\n=== File: b.md ===\nlast"
+    expected = {os.path.join("doc", "a.md"): "# A\nbody", "b.md": "last"}
+    assert line_list_parse(text) == expected
+    for size in (1, 2, 3, 7, 11):
+        assert parse_chunked([text[i:i + size] for i in range(0, len(text), size)]) == expected
@@ -0,0 +1,185 @@
+"""
+thinking_controller.py
+
+Adaptive extended-thinking budgets.
+
+A step's "thinking_budget" is treated as a ceiling. ThinkingBudgetController
+keeps a history of (step, model, budget) -> call latency and output quality and,
+for each call, picks the smallest budget from THINKING_BUDGETS (0 = no thinking)
+whose quality is within tolerance of the best budget seen for that step and whose
+latency percentile meets the latency target:
+
+  - with no history a step runs at its ceiling,
+  - once a budget has MIN_SAMPLES good results, the next smaller budget is probed,
+    so the search walks down until quality drops,
+  - when a run deadline is close (the remaining time wouldn't cover the chosen
+    budget's expected latency), thinking is switched off.
+
+Quality is a score in 0..1 from the caller: output_quality(...) is a cheap
+heuristic (empty or truncated answers score low); interactive runs also fold in
+the user's apply / retry decision. The history is appended to a JSON lines file
+so later runs start from what earlier runs learned.
+
+Only Claude's thinking has a budget; DeepSeek R1 always reasons and is not
+controlled.
+
+Env variables:
+  - THINKING_LATENCY_TARGET (optional, seconds per call, default 120)
+  - THINKING_LATENCY_PERCENTILE (optional, default 90)
+  - THINKING_MIN_SAMPLES (optional, default 3)
+  - THINKING_QUALITY_TOLERANCE (optional, fraction of the best quality, default 0.95)
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from context_manager import split_reasoning
+from metrics import percentile
+from rate_limiter import estimate_tokens
+
+# Candidate budgets; Anthropic's minimum thinking budget is 1024 tokens
+THINKING_BUDGETS = (0, 1024, 2048, 4096, 8192, 16384)
+
+# Only the most recent observations per (step, model, budget) count
+HISTORY_WINDOW = 20
+
+# Remaining time must cover this multiple of a budget's expected latency
+DEADLINE_MARGIN = 1.5
+
+# Output (thinking included) this close to max_tokens is treated as truncated
+TRUNCATION_RATIO = 0.97
+
+
+def output_quality(text: str, max_tokens: int, thinking_budget: Optional[int] = None) -> float:
+    """
+    Heuristic quality of a response: 0.0 for an empty answer, 0.5 when the output ran
+    into max_tokens (likely truncated), otherwise 1.0.
+    """
+    reasoning, answer = split_reasoning(text)
+    if not answer.strip():
+        return 0.0
+    used = estimate_tokens(answer) + (estimate_tokens(reasoning) if reasoning else 0)
+    if used >= TRUNCATION_RATIO * max_tokens:
+        return 0.5
+    return 1.0
+
+
+class ThinkingBudgetController:
+    """
+    Picks per-call thinking budgets from recorded latency/quality history. Thread-safe;
+    one controller is shared by an orchestrator and its siblings.
+    """
+
+    def __init__(self, history_path: Optional[str] = None, latency_target: Optional[float] = None,
+                 deadline: Optional[float] = None, min_samples: Optional[int] = None,
+                 quality_tolerance: Optional[float] = None, latency_percentile: Optional[float] = None):
+        """
+        deadline is an absolute time.time() by which the run should finish (None = no deadline).
+        """
+        self.history_path = Path(history_path) if history_path else None
+        self.latency_target = (latency_target if latency_target is not None
+                               else float(os.environ.get("THINKING_LATENCY_TARGET", "120")))
+        self.deadline = deadline
+        self.min_samples = min_samples if min_samples is not None else int(os.environ.get("THINKING_MIN_SAMPLES", "3"))
+        self.quality_tolerance = (quality_tolerance if quality_tolerance is not None
+                                  else float(os.environ.get("THINKING_QUALITY_TOLERANCE", "0.95")))
+        self.latency_percentile = (latency_percentile if latency_percentile is not None
+                                   else float(os.environ.get("THINKING_LATENCY_PERCENTILE", "90")))
+        # (step, model, budget) -> [(seconds, quality)]
+        self.history: Dict[Tuple[str, str, int], List[Tuple[float, float]]] = {}
+        # step -> budgets picked this run, for the report
+        self.choices: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+        if self.history_path is not None and self.history_path.exists():
+            self._load()
+
+    def _load(self):
+        with open(self.history_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    self._add(record["step"], record["model"], int(record["budget"]),
+                              float(record["seconds"]), float(record["quality"]))
+                except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+                    # A torn or foreign line; the rest of the history is still usable
+                    continue
+
+    def _add(self, step: str, model: str, budget: int, seconds: float, quality: float):
+        samples = self.history.setdefault((step, model, budget), [])
+        samples.append((seconds, quality))
+        del samples[:-HISTORY_WINDOW]
+
+    def record(self, step: str, model: str, budget: int, seconds: float, quality: float):
+        """
+        Adds one observed call: the budget it ran with, its latency and its quality (0..1).
+        """
+        budget = budget or 0
+        with self._lock:
+            self._add(step, model, budget, seconds, quality)
+            if self.history_path is not None:
+                self.history_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.history_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps({"ts": time.time(), "step": step, "model": model, "budget": budget,
+                                        "seconds": round(seconds, 3), "quality": quality}) + "\n")
+
+    def _stats(self, step: str, model: str, budget: int) -> Optional[Tuple[float, float]]:
+        """
+        (latency percentile, mean quality) for a budget with enough samples, else None.
+        """
+        samples = self.history.get((step, model, budget), [])
+        if len(samples) < self.min_samples:
+            return None
+        return (percentile([s for s, _ in samples], self.latency_percentile),
+                sum(q for _, q in samples) / len(samples))
+
+    def _pick(self, step: str, model: str, ceiling: int) -> int:
+        candidates = [b for b in THINKING_BUDGETS if b < ceiling] + [ceiling]
+        stats = {b: self._stats(step, model, b) for b in candidates}
+        known = {b: s for b, s in stats.items() if s is not None}
+        if not known:
+            return ceiling
+        best_quality = max(quality for _, quality in known.values())
+        good = [b for b in candidates if b in known and known[b][1] >= best_quality * self.quality_tolerance]
+        if not good:
+            return ceiling
+        fast = [b for b in good if known[b][0] <= self.latency_target]
+        chosen = fast[0] if fast else good[0]
+        # Probe the next smaller budget until it has a track record of its own
+        smaller = [b for b in candidates if b < chosen]
+        if smaller and smaller[-1] not in known:
+            return smaller[-1]
+        return chosen
+
+    def choose(self, step: str, model: str, ceiling: Optional[int], now: Optional[float] = None) -> int:
+        """
+        Thinking budget (0 = off) for the next call of step on model, at most ceiling.
+        """
+        if not ceiling:
+            return 0
+        now = now if now is not None else time.time()
+        with self._lock:
+            budget = self._pick(step, model, ceiling)
+            if budget and self.deadline is not None:
+                stats = self._stats(step, model, budget)
+                # Without a track record, assume the call may take the whole latency target
+                expected = stats[0] if stats else self.latency_target
+                if self.deadline - now < expected * DEADLINE_MARGIN:
+                    budget = 0
+            self.choices.setdefault(step, []).append(budget)
+        return budget
+
+    def describe(self) -> str:
+        """
+        Budgets picked per step this run, as console lines.
+        """
+        with self._lock:
+            if not self.choices:
+                return "Adaptive thinking: no budgets chosen"
+            lines = ["Adaptive thinking budgets (per call):"]
+            for step, budgets in self.choices.items():
+                lines.append(f"  {step}: {', '.join(str(b) if b else 'off' for b in budgets)}")
+        return "\n".join(lines)
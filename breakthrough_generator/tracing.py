@@ -0,0 +1,236 @@
+"""
+tracing.py
+
+Span-based timeline tracing, exported as Chrome trace-event JSON (load the file
+in https://ui.perfetto.dev or chrome://tracing).
+
+  with span("parse_ai_response_and_apply", cat="parse", step=phase_name):
+      ...
+
+Spans nest: a span opened inside another one is drawn beneath it, and inherits
+its "step" and "model" attributes. Each thread gets its own track, and so does
+each asyncio task, so concurrent LLM calls show up side by side instead of
+overlapping on one row. Categories used across the pipeline:
+
+  run     - whole programs (orchestrator main, generate_ai_proposal)
+  step    - one walkthrough step / proposal section
+  llm     - a client call; "http" and "rate_limit" spans inside it split
+            network wait from time spent queued behind the rate limiter
+  prompt  - prompt building
+  parse   - response parsing
+  io      - project file writes
+  idle    - waiting for the user at an interactive prompt
+
+Tracing is off unless enabled with enable(path) or LLM_TRACE_OUT; span() is then
+a no-op. The trace is written at interpreter exit (spans still open are closed
+at that moment).
+
+Env variables:
+  - LLM_TRACE_OUT (optional, path of the trace JSON file)
+"""
+
+import asyncio
+import atexit
+import contextvars
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Attributes a child span inherits from its parent
+INHERITED_ATTRS = ("step", "model")
+
+# Categories that only group other spans; left out of summary()
+CONTAINER_CATEGORIES = ("run", "step", "llm")
+
+_current_attrs: contextvars.ContextVar = contextvars.ContextVar("trace_span_attrs", default={})
+
+
+def _now_us() -> float:
+    return time.perf_counter_ns() / 1000
+
+
+class Tracer:
+    """
+    Collects complete ("X") trace events. Thread-safe.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.events: List[dict] = []
+        self.pid = os.getpid()
+        self._tracks: Dict[tuple, int] = {}
+        self._track_names: Dict[int, str] = {}
+        self._open: Dict[int, "_Span"] = {}
+        self._lock = threading.Lock()
+
+    def track(self) -> int:
+        """
+        Trace tid for the caller: one per thread, and one per asyncio task within it.
+        """
+        thread = threading.current_thread()
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        key = (thread.ident, id(task) if task is not None else None)
+        with self._lock:
+            tid = self._tracks.get(key)
+            if tid is None:
+                tid = len(self._tracks) + 1
+                self._tracks[key] = tid
+                name = thread.name if task is None else f"{thread.name} / {task.get_name()}"
+                self._track_names[tid] = name
+        return tid
+
+    def _record(self, name: str, cat: str, tid: int, start: float, end: float, args: dict):
+        event = {"name": name, "cat": cat, "ph": "X", "ts": round(start, 3), "dur": round(end - start, 3),
+                 "pid": self.pid, "tid": tid, "args": args}
+        with self._lock:
+            self.events.append(event)
+
+    def to_chrome_trace(self) -> dict:
+        """
+        The trace as a Chrome trace-event document; spans still open end now.
+        """
+        now = _now_us()
+        with self._lock:
+            open_spans = list(self._open.values())
+        for open_span in open_spans:
+            self._record(open_span.name, open_span.cat, open_span.tid, open_span.start, now,
+                         {**open_span.args, "unfinished": True})
+        with self._lock:
+            metadata = [{"name": "process_name", "ph": "M", "pid": self.pid, "tid": 0,
+                         "args": {"name": "breakthrough_generator"}}]
+            metadata += [{"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}}
+                         for tid, name in sorted(self._track_names.items())]
+            events = sorted(self.events, key=lambda e: (e["ts"], -e["dur"]))
+        return {"traceEvents": metadata + events, "displayTimeUnit": "ms"}
+
+    def write(self, path: Optional[str] = None):
+        path = path or self.path
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_chrome_trace(), f)
+        print(f"Trace written to {path} (open it in https://ui.perfetto.dev)")
+
+    def summary(self) -> str:
+        """
+        Wall-clock seconds during which at least one span of each category was open
+        (overlapping spans count once), for the leaf categories: network, rate limiting,
+        local I/O, parsing, prompt building and idle prompts.
+        """
+        intervals: Dict[str, List[tuple]] = {}
+        with self._lock:
+            for event in self.events:
+                if event["cat"] not in CONTAINER_CATEGORIES:
+                    intervals.setdefault(event["cat"], []).append((event["ts"], event["ts"] + event["dur"]))
+        totals = {}
+        for cat, spans in intervals.items():
+            covered, end = 0.0, float("-inf")
+            for start, finish in sorted(spans):
+                if finish > end:
+                    covered += finish - max(start, end)
+                    end = finish
+            totals[cat] = covered / 1e6
+        return ", ".join(f"{cat} {seconds:.2f}s" for cat, seconds in sorted(totals.items()))
+
+
+class _Span:
+    def __init__(self, tracer: Tracer, name: str, cat: str, attrs: dict):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.attrs = attrs
+
+    def __enter__(self):
+        self._parent = _current_attrs.get()
+        self.args = {**{k: self._parent[k] for k in INHERITED_ATTRS if k in self._parent},
+                     **{k: v for k, v in self.attrs.items() if v is not None}}
+        self._token = _current_attrs.set(self.args)
+        self.tid = self.tracer.track()
+        self.start = _now_us()
+        with self.tracer._lock:
+            self.tracer._open[id(self)] = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = _now_us()
+        with self.tracer._lock:
+            self.tracer._open.pop(id(self), None)
+        try:
+            _current_attrs.reset(self._token)
+        except ValueError:
+            # Exited in another context (an async generator resumed by a different task)
+            _current_attrs.set(self._parent)
+        args = self.args if exc_type is None else {**self.args, "error": exc_type.__name__}
+        self.tracer._record(self.name, self.cat, self.tid, self.start, end, args)
+        return False
+
+    def set(self, **attrs):
+        """
+        Adds attributes known only once the span is running (e.g. the chosen model).
+        """
+        self.args.update({k: v for k, v in attrs.items() if v is not None})
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+_tracer: Optional[Tracer] = None
+_env_checked = False
+_tracer_lock = threading.Lock()
+
+
+def enable(path: str) -> Tracer:
+    """
+    Starts tracing for this process; the trace is written to path at exit.
+    """
+    global _tracer, _env_checked
+    with _tracer_lock:
+        _env_checked = True
+        if _tracer is None:
+            _tracer = Tracer(path)
+            atexit.register(lambda: _tracer.write())
+        else:
+            _tracer.path = path
+    return _tracer
+
+
+def get_tracer() -> Optional[Tracer]:
+    """
+    The process-wide tracer, or None when tracing is off.
+    """
+    global _env_checked
+    if not _env_checked:
+        _env_checked = True
+        if os.environ.get("LLM_TRACE_OUT"):
+            enable(os.environ["LLM_TRACE_OUT"])
+    return _tracer
+
+
+def span(name: str, cat: str = "", **attrs):
+    """
+    Context manager timing a block as one span. None-valued attributes are dropped.
+    """
+    tracer = get_tracer()
+    if tracer is None:
+        return _NO_SPAN
+    return _Span(tracer, name, cat, attrs)
+
+
+def traced_input(prompt: str = "") -> str:
+    """
+    input() recorded as an "idle" span, so time spent waiting for the user shows up in the trace.
+    """
+    with span("input", cat="idle"):
+        return input(prompt)